@@ -0,0 +1,400 @@
+"""
+Load and query benchmark
+
+Loads synthetic data (generate_data.py) into the local PostgreSQL with each
+upload_db.py mode, then measures p50/p95/p99 latency of the MCP tools
+(called in-process, with a cold and a warm result cache) and, optionally, of
+the REST routes of `server.py --https`. Results are written as JSON so runs on
+different versions can be compared.
+
+WARNING: every load run truncates all HR tables. Use a scratch database.
+
+    python benchmark.py --employees 10k 100k --serve
+"""
+import os
+import sys
+import io
+import ssl
+import json
+import time
+import platform
+import asyncio
+import inspect
+import argparse
+import subprocess
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+
+import schema
+import generate_data
+from upload_db import connect_raw
+
+# Set Windows console output encoding to UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(generate_data.OUTPUT_ROOT, "results")
+
+# upload_db.py arguments for each load mode
+LOAD_MODES = {
+    "insert": [],
+    "copy": ["--copy"],
+    "parallel": ["--parallel", "4"],
+    "incremental": ["--incremental"],
+}
+DEFAULT_MODES = ["copy", "parallel", "incremental"]
+DEFAULT_ITERATIONS = 100
+SERVER_URLS = ["https://localhost:8443", "http://localhost:8443"]
+SERVER_START_TIMEOUT = 30
+
+# REST routes that only accept POST; their scenarios send JSON bodies
+POST_ROUTES = {"/query/batch"}
+
+# search_employees queries, with the typos and partial words agents send
+SEARCH_QUERIES = ["sales managr", "finanse director", "driver licence", "operations", "forklfit"]
+
+
+# -------------------------------
+# Query scenarios
+# -------------------------------
+# (name, MCP tool, REST route or None, arguments for iteration i). `ids` is
+# a sample of employee IDs and `managers` of employees with direct reports,
+# so per-employee scenarios look up a different employee on every iteration.
+def query_scenarios(ids, middle_token, managers):
+    return [
+        ("query_first_page", "query_employees", "/query",
+         lambda i: {"table": "employee_master", "limit": 10}),
+        ("query_by_employee", "query_employees", "/query",
+         lambda i: {"table": "employee_master", "employee_id": ids[i % len(ids)]}),
+        ("query_department_page", "query_employees", "/query",
+         lambda i: {"table": "employee_master", "department": "Sales", "limit": 100}),
+        ("query_deep_page", "query_employees", "/query",
+         lambda i: {"table": "employee_master", "limit": 100, "page_token": middle_token}),
+        ("query_compact_1000", "query_employees", "/query",
+         lambda i: {"table": "performance", "limit": 1000, "format": "compact",
+                    "columns": ["employee_id", "review_date", "performance_rating"]}),
+        ("aggregate_headcount", "aggregate_employees", "/aggregate",
+         lambda i: {"table": "employee_master", "group_by": ["department"]}),
+        ("aggregate_salary_p90", "aggregate_employees", "/aggregate",
+         lambda i: {"table": "remuneration", "metrics": ["count", "avg:base_salary", "p90:base_salary"],
+                    "group_by": ["employee_master.department"]}),
+        ("view_department_summary", "query_employees", "/query",
+         lambda i: {"table": "department_summary", "limit": 100}),
+        ("profiles_10", "get_employee_profiles", "/profile",
+         lambda i: {"employee_ids": [ids[(i * 10 + k) % len(ids)] for k in range(10)]}),
+        ("batch_5_lookups", "query_employees_batch", "/query/batch",
+         lambda i: {"queries": [{"table": table, "employee_id": ids[i % len(ids)]}
+                                for table in ("employee_master", "remuneration", "position_details",
+                                              "performance", "engagement_retention")]}),
+        ("reporting_chain", "get_reporting_chain", None,
+         lambda i: {"employee_id": ids[i % len(ids)]}),
+        ("direct_reports", "get_subordinates", None,
+         lambda i: {"manager_id": managers[i % len(managers)], "max_depth": 1}),
+        ("all_subordinates_100", "get_subordinates", None,
+         lambda i: {"manager_id": managers[i % len(managers)], "limit": 100}),
+        ("span_of_control_top", "get_span_of_control", None,
+         lambda i: {"limit": 20}),
+        ("span_of_control_department", "get_span_of_control", None,
+         lambda i: {"department": "Sales", "order_by": "total_reports"}),
+        ("search_fuzzy", "search_employees", None,
+         lambda i: {"query": SEARCH_QUERIES[i % len(SEARCH_QUERIES)]}),
+    ]
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile of an already sorted list"""
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(timings, sizes):
+    timings = sorted(t * 1000 for t in timings)
+    return {
+        "iterations": len(timings),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "max_ms": round(timings[-1], 3),
+        "response_bytes": round(sum(sizes) / len(sizes)),
+    }
+
+
+# -------------------------------
+# Database helpers
+# -------------------------------
+def reset_tables():
+    """Empty every HR table and the incremental load manifest"""
+    conn = connect_raw()
+    try:
+        cursor = conn.cursor()
+        tables = list(schema.TABLES) + ["load_manifest_files", "load_manifest_rows"]
+        cursor.execute(f"TRUNCATE {', '.join(tables)} CASCADE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def table_row_counts():
+    conn = connect_raw()
+    try:
+        cursor = conn.cursor()
+        counts = {}
+        for table_name in schema.TABLES:
+            cursor.execute(f"SELECT count(*) FROM {table_name}")
+            counts[table_name] = cursor.fetchone()[0]
+        return counts
+    finally:
+        conn.close()
+
+
+def sample_employee_ids(limit):
+    """Evenly spaced employee IDs, and the ID in the middle of the key order"""
+    conn = connect_raw()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT count(*) FROM employee_master")
+        total = cursor.fetchone()[0]
+        step = max(1, total // limit)
+        cursor.execute(
+            "SELECT employee_id FROM (SELECT employee_id, row_number() OVER (ORDER BY employee_id) AS n "
+            "FROM employee_master) ranked WHERE n %% %s = 0 ORDER BY employee_id",
+            (step,)
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        return ids, ids[len(ids) // 2] if ids else None
+    finally:
+        conn.close()
+
+
+def sample_manager_ids(limit):
+    """IDs of up to `limit` employees with direct reports, largest teams first"""
+    conn = connect_raw()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT manager_id FROM employee_master WHERE manager_id IS NOT NULL "
+            "GROUP BY manager_id ORDER BY count(*) DESC, manager_id LIMIT %s",
+            (limit,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+# -------------------------------
+# Benchmarks
+# -------------------------------
+def benchmark_load(mode, data_dir, workers):
+    """Run one upload_db.py load from empty tables; returns seconds and rows loaded"""
+    arguments = list(LOAD_MODES[mode])
+    if mode == "parallel":
+        arguments[1] = str(workers)
+    command = [sys.executable, os.path.join(PROJECT_DIR, "upload_db.py"), *arguments, "--data-dir", data_dir]
+    started = time.perf_counter()
+    completed = subprocess.run(command, cwd=PROJECT_DIR, capture_output=True, text=True, encoding="utf-8")
+    seconds = time.perf_counter() - started
+    failed = completed.returncode != 0 or "failed" in completed.stdout.lower()
+    return seconds, failed, completed.stdout[-2000:] + completed.stderr[-2000:]
+
+
+def benchmark_tools(scenarios, iterations):
+    """Latency of each MCP tool scenario, in-process, with a cold and a warm cache"""
+    import server
+    loop = asyncio.new_event_loop()   # Runs the async tools (query_employees_batch)
+    results = []
+    for name, tool, _, arguments in scenarios:
+        function = getattr(server, tool)
+        if inspect.iscoroutinefunction(function):
+            function = lambda tool_function=function, **kwargs: loop.run_until_complete(tool_function(**kwargs))
+        for cache in ("cold", "warm"):
+            timings, sizes = [], []
+            function(**arguments(0))   # Warm up connections and prepared statements
+            for i in range(iterations):
+                if cache == "cold":
+                    server.query_cache.invalidate()
+                kwargs = arguments(i if cache == "cold" else 0)
+                started = time.perf_counter()
+                response = function(**kwargs)
+                timings.append(time.perf_counter() - started)
+                sizes.append(len(response.encode("utf-8")))
+            error = json.loads(response).get("error") if response.startswith("{") else None
+            result = {"name": name, "tool": tool, "cache": cache, **summarize(timings, sizes)}
+            if error:
+                result["error"] = error
+            results.append(result)
+            print(f"   {name:<26} {cache:<5} p50 {result['p50_ms']:>9.3f} ms   "
+                  f"p95 {result['p95_ms']:>9.3f} ms   p99 {result['p99_ms']:>9.3f} ms")
+    loop.close()
+    server.close_db_pool()
+    return results
+
+
+def rest_query_string(arguments):
+    params = {}
+    for key, value in arguments.items():
+        params[key] = ",".join(value) if isinstance(value, list) else value
+    return urllib.parse.urlencode(params)
+
+
+def benchmark_routes(base_url, scenarios, iterations):
+    """Latency of each REST route scenario over HTTP(S), as served (server cache enabled)
+
+    Scenarios of tools without a REST route are skipped.
+    """
+    context = ssl._create_unverified_context()   # Self-signed development certificate
+    results = []
+    for name, _, route, arguments in scenarios + [("health", None, "/health", lambda i: {})]:
+        if route is None:
+            continue
+        timings, sizes = [], []
+        for i in range(iterations):
+            if route in POST_ROUTES:
+                request = urllib.request.Request(
+                    f"{base_url}{route}", data=json.dumps(arguments(i)).encode("utf-8"),
+                    headers={"Content-Type": "application/json"}
+                )
+            else:
+                query = rest_query_string(arguments(i))
+                request = f"{base_url}{route}" + (f"?{query}" if query else "")
+            started = time.perf_counter()
+            with urllib.request.urlopen(request, context=context) as response:
+                body = response.read()
+            timings.append(time.perf_counter() - started)
+            sizes.append(len(body))
+        result = {"name": name, "route": route, **summarize(timings, sizes)}
+        results.append(result)
+        print(f"   {route + ' ' + name:<36} p50 {result['p50_ms']:>9.3f} ms   "
+              f"p95 {result['p95_ms']:>9.3f} ms   p99 {result['p99_ms']:>9.3f} ms")
+    return results
+
+
+def start_server():
+    """Start `server.py --https` and return (process, base URL) once /health answers"""
+    process = subprocess.Popen(
+        # One client sending requests back to back: no rate limit
+        [sys.executable, os.path.join(PROJECT_DIR, "server.py"), "--https", "--rate-limit", "0"],
+        cwd=PROJECT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    context = ssl._create_unverified_context()
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        for base_url in SERVER_URLS:
+            try:
+                with urllib.request.urlopen(f"{base_url}/health", context=context, timeout=1):
+                    return process, base_url
+            except OSError:
+                pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("server.py --https did not start within "
+                       f"{SERVER_START_TIMEOUT}s")
+
+
+def run(args):
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR, capture_output=True, text=True
+        ).stdout.strip() or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"modes": args.modes, "workers": args.workers, "iterations": args.iterations,
+                     "seed": args.seed},
+        "scales": [],
+    }
+
+    server_process = None
+    base_url = args.rest_url
+    try:
+        for label in args.employees:
+            employees = generate_data.parse_employees(label)
+            data_dir = os.path.join(generate_data.OUTPUT_ROOT, label.lower())
+            if not os.path.isdir(data_dir):
+                generate_data.generate(employees, data_dir, args.seed)
+            print(f"\n{'=' * 60}\n {employees:,} employees ({data_dir})\n{'=' * 60}")
+            scale = {"employees": employees, "data_dir": data_dir, "load": []}
+
+            if not args.skip_load:
+                for mode in args.modes:
+                    reset_tables()
+                    runs = [mode] + (["incremental_unchanged"] if mode == "incremental" else [])
+                    for run_name in runs:
+                        seconds, failed, output = benchmark_load(mode, data_dir, args.workers)
+                        rows = sum(table_row_counts().values())
+                        result = {"mode": run_name, "seconds": round(seconds, 3), "rows": rows,
+                                  "rows_per_sec": round(rows / seconds) if seconds else None}
+                        if failed:
+                            result["error"] = output
+                        scale["load"].append(result)
+                        print(f"📦 {run_name:<22} {seconds:>8.2f}s  {rows:>10,} rows  "
+                              f"{result['rows_per_sec']:>10,} rows/sec" + ("  FAILED" if failed else ""))
+
+            scale["rows"] = table_row_counts()
+            ids, middle = sample_employee_ids(max(args.iterations * 10, 1000))
+            if not ids:
+                print(" No employees loaded, skipping query benchmarks")
+                report["scales"].append(scale)
+                continue
+            from server import encode_page_token
+            scenarios = query_scenarios(
+                ids, encode_page_token("employee_master", [middle]), sample_manager_ids(100) or ids
+            )
+
+            print("\n🔎 MCP tools (in-process)")
+            scale["mcp_tools"] = benchmark_tools(scenarios, args.iterations)
+
+            if args.serve and server_process is None:
+                server_process, base_url = start_server()
+            if base_url:
+                print(f"\n🌐 REST routes ({base_url})")
+                scale["rest_routes"] = benchmark_routes(base_url, scenarios, args.iterations)
+            report["scales"].append(scale)
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n Results written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HR data loading and MCP/REST query latency")
+    parser.add_argument(
+        "--employees",
+        nargs="+",
+        default=["10k"],
+        help="Dataset sizes to benchmark: 10k, 100k, 1m or any number (default 10k); "
+             "missing datasets are generated first"
+    )
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        choices=list(LOAD_MODES),
+        default=DEFAULT_MODES,
+        help=f"upload_db.py modes to time (default {' '.join(DEFAULT_MODES)}); the last one "
+             "leaves the data the queries run against"
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Workers for the parallel mode (default 4)")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS,
+                        help=f"Calls per query scenario (default {DEFAULT_ITERATIONS})")
+    parser.add_argument("--seed", type=int, default=generate_data.DEFAULT_SEED,
+                        help="Seed for datasets that need generating")
+    parser.add_argument("--skip-load", action="store_true",
+                        help="Only benchmark queries against the data already loaded")
+    parser.add_argument("--serve", action="store_true",
+                        help="Start `server.py --https` and benchmark its REST routes")
+    parser.add_argument("--rest-url", help="Benchmark the REST routes of an already running server")
+    parser.add_argument("--output", help=f"Results file (default {RESULTS_DIR}/benchmark-<time>.json)")
+    run(parser.parse_args())
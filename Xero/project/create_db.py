@@ -1,5 +1,7 @@
 import psycopg2
 
+import schema
+
 # -----------------------
 # Modify to your local PostgreSQL settings
 # -----------------------
@@ -14,82 +16,216 @@ conn = psycopg2.connect(
 cursor = conn.cursor()
 
 # -----------------------
-# CREATE TABLE SQL
+# Schema migrations
 # -----------------------
+# Applied in order; each applied version is recorded in SCHEMA_MIGRATIONS so
+# re-running this script only applies what is new. Migrations 1-2 are also
+# safe on databases created before versioning existed.
 
-sql = """
-
-CREATE TABLE IF NOT EXISTS EMPLOYEE_MASTER (
-    Employee_ID            VARCHAR PRIMARY KEY,
-    Full_Name              VARCHAR,
-    Date_of_Birth          DATE,
-    Gender                 VARCHAR,
-    Contact_Details        VARCHAR,
-    Address                VARCHAR,
-    Emergency_Contact      VARCHAR,
-    Employment_Status      VARCHAR,
-    Hire_Date              DATE,
-    Termination_Date       DATE,
-    Job_Title              VARCHAR,
-    Department             VARCHAR,
-    Office_Location        VARCHAR,
-    Region_State           VARCHAR,
-    Country                VARCHAR,
-    Manager_ID             VARCHAR REFERENCES EMPLOYEE_MASTER(Employee_ID),
-    Award_Agreement        VARCHAR,
-    Employment_Type        VARCHAR
-);
+# Table DDL is generated from the schema registry (schema.py)
+BASE_TABLES = ["employee_master", "remuneration", "position_details", "performance"]
+BASE_TABLES_SQL = "\n".join(schema.create_table_sql(t) for t in BASE_TABLES)
 
-CREATE TABLE IF NOT EXISTS REMUNERATION (
-    Employee_ID                   VARCHAR REFERENCES EMPLOYEE_MASTER(Employee_ID),
-    Base_Salary                   NUMERIC,
-    Award_Classification_Level    VARCHAR,
-    Allowances                    NUMERIC,
-    Commission                    NUMERIC,
-    Commission_Percent            NUMERIC,
-    Commission_Earned             NUMERIC,
-    Overtime_Rate                 NUMERIC,
-    Superannuation_Percent        NUMERIC,
-    Bonus_Eligibility             BOOLEAN,
-    Pay_Cycle                     VARCHAR,
-    Salary                        NUMERIC,
-    Commission_Dollar             NUMERIC,
-    Total_Package_Value           NUMERIC
-);
+# HR datasets added after the base tables, parents before children
+DATASET_TABLES_SQL = [
+    schema.create_table_sql(t) for t in schema.load_order() if t not in BASE_TABLES
+]
 
-CREATE TABLE IF NOT EXISTS POSITION_DETAILS (
-    Employee_ID         VARCHAR REFERENCES EMPLOYEE_MASTER(Employee_ID),
-    Position_Title      VARCHAR,
-    Position_Level      VARCHAR,
-    Skills_Required     VARCHAR,
-    Qualifications      VARCHAR,
-    Qualification_Date  DATE,
-    Expiry_Date         DATE,
-    Licenses_Permits    VARCHAR,
-    Competency_Status   VARCHAR
+NATURAL_KEYS_SQL = """
+-- Natural keys for tables created before they were declared above
+-- (upload_db.py --incremental upserts with INSERT ... ON CONFLICT on these)
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'remuneration'::regclass AND contype = 'p') THEN
+        ALTER TABLE REMUNERATION ADD PRIMARY KEY (Employee_ID);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'position_details'::regclass AND contype = 'p') THEN
+        ALTER TABLE POSITION_DETAILS ADD PRIMARY KEY (Employee_ID, Position_Title);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = 'performance'::regclass AND contype = 'p') THEN
+        ALTER TABLE PERFORMANCE ADD PRIMARY KEY (Employee_ID, Review_Date);
+    END IF;
+END $$;
+
+-- Load manifest for upload_db.py --incremental: content hash of each source
+-- file and of each row (by natural key) as of the last incremental load
+CREATE TABLE IF NOT EXISTS LOAD_MANIFEST_FILES (
+    File_Name   VARCHAR PRIMARY KEY,
+    Table_Name  VARCHAR NOT NULL,
+    File_Hash   VARCHAR NOT NULL,
+    Row_Count   INTEGER,
+    Loaded_At   TIMESTAMP DEFAULT now()
 );
 
-CREATE TABLE IF NOT EXISTS PERFORMANCE (
-    Employee_ID             VARCHAR REFERENCES EMPLOYEE_MASTER(Employee_ID),
-    Review_Date             DATE,
-    Performance_Rating      VARCHAR,
-    Potential_Rating        VARCHAR,
-    Time_in_Role            VARCHAR,
-    Goals_Objectives        VARCHAR,
-    Achievement_Status      VARCHAR,
-    Development_Plan_Status VARCHAR,
-    Last_Promotion_Date     DATE,
-    Next_Review_Date        DATE
+CREATE TABLE IF NOT EXISTS LOAD_MANIFEST_ROWS (
+    Table_Name  VARCHAR,
+    Row_Key     VARCHAR,
+    Row_Hash    BIGINT NOT NULL,
+    PRIMARY KEY (Table_Name, Row_Key)
 );
 
 """
 
+# Indexes for the MCP server's access paths: foreign keys not covered by a
+# primary key prefix, equality filters and date range filters. Built with
+# CREATE INDEX CONCURRENTLY so existing tables stay writable meanwhile.
+ACCESS_PATH_INDEXES = [
+    # employee_master: department filter (+ keyset order), reporting lines, hire date ranges
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS employee_master_department_idx ON EMPLOYEE_MASTER (Department, Employee_ID)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS employee_master_manager_id_idx ON EMPLOYEE_MASTER (Manager_ID)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS employee_master_hire_date_idx ON EMPLOYEE_MASTER (Hire_Date)",
+    # position_details: qualification expiry ranges
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS position_details_expiry_date_idx ON POSITION_DETAILS (Expiry_Date)",
+    # (performance review date indexes: see PARTITIONING_SQL, a partitioned
+    # table cannot be indexed CONCURRENTLY)
+]
+
+# Materialized views (see schema.VIEWS), each with the unique index that
+# REFRESH MATERIALIZED VIEW CONCURRENTLY needs
+ANALYTICS_VIEWS = ["employee_summary", "department_summary", "salary_band_summary"]
+ANALYTICS_VIEWS_SQL = [
+    statement for view_name in ANALYTICS_VIEWS for statement in schema.create_view_sql(view_name)
+]
+
+# Org hierarchy closure table and per-employee span of control
+HIERARCHY_VIEWS = ["employee_hierarchy", "reporting_span"]
+HIERARCHY_VIEWS_SQL = [
+    statement for view_name in HIERARCHY_VIEWS for statement in schema.create_view_sql(view_name)
+]
+
+# Search index for the MCP server's search_employees tool: pg_trgm trigram
+# index on the distinct searchable values (fuzzy, typo-tolerant ranking)
+SEARCH_VIEWS = ["employee_search", "employee_search_terms"]
+SEARCH_TERMS_INDEX_SQL = (
+    "CREATE INDEX IF NOT EXISTS employee_search_terms_trgm_idx "
+    "ON employee_search_terms USING gist (value gist_trgm_ops)"
+)
+SEARCH_INDEX_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    *(statement for view_name in SEARCH_VIEWS for statement in schema.create_view_sql(view_name)),
+    SEARCH_TERMS_INDEX_SQL,
+]
+
+# History tables range-partitioned by year (schema "partition_by"), so date
+# range queries only scan the partitions of the years they cover. New
+# databases create them partitioned in migrations 1 and 4; an existing
+# unpartitioned table is rebuilt with one partition per year it holds, and the
+# views dropped along with it are recreated. upload_db.py creates the
+# partition of each new year before loading rows into it.
+PARTITIONED_TABLES = [t for t in schema.load_order() if schema.TABLES[t]["partition_by"]]
+
+
+def partition_table_sql(table_name):
+    """Rebuild table_name as a partitioned table if it is still a plain table"""
+    spec = schema.TABLES[table_name]
+    column = spec["partition_by"]
+    columns = ", ".join(c["name"] for c in spec["columns"])
+    old_name = f"{table_name}_unpartitioned"
+    return f"""
+DO $$
+DECLARE
+    partition_year INTEGER;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = '{table_name}'::regclass) = 'r' THEN
+        ALTER TABLE {table_name} RENAME TO {old_name};
+        ALTER TABLE {old_name} RENAME CONSTRAINT {table_name}_pkey TO {old_name}_pkey;
+        {schema.create_table_sql(table_name).strip()}
+        FOR partition_year IN
+            SELECT DISTINCT date_part('year', {column})::int FROM {old_name}
+        LOOP
+            EXECUTE format(
+                'CREATE TABLE {table_name}_%s PARTITION OF {table_name} FOR VALUES FROM (%L) TO (%L)',
+                partition_year, make_date(partition_year, 1, 1), make_date(partition_year + 1, 1, 1)
+            );
+        END LOOP;
+        INSERT INTO {table_name} ({columns}) SELECT {columns} FROM {old_name};
+        DROP TABLE {old_name} CASCADE;
+    END IF;
+END $$;
+"""
+
+
+PARTITIONING_SQL = [
+    *(partition_table_sql(t) for t in PARTITIONED_TABLES),
+    # performance: review date ranges (within a year's partition)
+    "CREATE INDEX IF NOT EXISTS performance_review_date_idx ON PERFORMANCE (Review_Date)",
+    "CREATE INDEX IF NOT EXISTS performance_next_review_date_idx ON PERFORMANCE (Next_Review_Date)",
+    # Views dropped with the rebuilt tables (no-ops when nothing was rebuilt)
+    *(statement for view_name in schema.VIEWS for statement in schema.create_view_sql(view_name)),
+    SEARCH_TERMS_INDEX_SQL,
+]
+
+# Search views rebuilt with their keys on md5(value) (value_key) and values
+# capped at schema.SEARCH_VALUE_MAX_LENGTH: btree and GiST index entries on
+# the raw text fail for long free-text values
+SEARCH_VALUE_KEY_SQL = [
+    "DROP MATERIALIZED VIEW IF EXISTS employee_search CASCADE",
+    *(statement for view_name in SEARCH_VIEWS for statement in schema.create_view_sql(view_name)),
+    SEARCH_TERMS_INDEX_SQL,
+]
+
+# (version, description, statements, concurrent)
+# Concurrent migrations run outside a transaction, one statement at a time.
+MIGRATIONS = [
+    (1, "Base HR tables", [BASE_TABLES_SQL], False),
+    (2, "Natural keys and load manifest", [NATURAL_KEYS_SQL], False),
+    (3, "Indexes for MCP server access paths", ACCESS_PATH_INDEXES, True),
+    (4, "Remaining HR datasets from columns.json", DATASET_TABLES_SQL, False),
+    (5, "Materialized analytics views", ANALYTICS_VIEWS_SQL, False),
+    (6, "Org hierarchy closure table", HIERARCHY_VIEWS_SQL, False),
+    (7, "Employee search index (pg_trgm)", SEARCH_INDEX_SQL, False),
+    (8, "History tables partitioned by year", PARTITIONING_SQL, False),
+    (9, "Search views keyed by value hash", SEARCH_VALUE_KEY_SQL, False),
+]
+
+
+def drop_invalid_indexes(cursor):
+    """Drop indexes left INVALID by an interrupted CREATE INDEX CONCURRENTLY"""
+    cursor.execute(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE NOT i.indisvalid AND n.nspname = current_schema()"
+    )
+    for (index_name,) in cursor.fetchall():
+        print(f"   Dropping invalid index {index_name}")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+
 # -----------------------
-# Execute creation
+# Apply migrations
 # -----------------------
-cursor.execute(sql)
+cursor.execute("""
+CREATE TABLE IF NOT EXISTS SCHEMA_MIGRATIONS (
+    Version      INTEGER PRIMARY KEY,
+    Description  VARCHAR,
+    Applied_At   TIMESTAMP DEFAULT now()
+)
+""")
 conn.commit()
 
+cursor.execute("SELECT version FROM schema_migrations")
+applied = {row[0] for row in cursor.fetchall()}
+conn.commit()
+
+for version, description, statements, concurrent in MIGRATIONS:
+    if version in applied:
+        continue
+    print(f"Applying migration {version}: {description}")
+    if concurrent:
+        conn.autocommit = True
+        drop_invalid_indexes(cursor)
+        for statement in statements:
+            cursor.execute(statement)
+        conn.autocommit = False
+    else:
+        for statement in statements:
+            cursor.execute(statement)
+    cursor.execute(
+        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+        (version, description)
+    )
+    conn.commit()
+
 print("All tables successfully created in PostgreSQL.")
 
 cursor.close()
@@ -0,0 +1,451 @@
+"""
+Synthetic HR data generator
+
+Writes one CSV per dataset in the schema registry (schema.py), with the exact
+headers of table/columns.json (including "Position Level " and "Commision
+Earned"), for any number of employees. Output is deterministic for a given
+seed, so benchmark runs on different versions load identical data.
+
+    python generate_data.py --employees 100k
+    python upload_db.py --copy --data-dir ../synthetic/100k
+"""
+import os
+import sys
+import io
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+import schema
+
+# Set Windows console output encoding to UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT_ROOT = os.path.join(BASE_DIR, "synthetic")
+
+DEFAULT_SEED = 42
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# -------------------------------
+# Organisation shape
+# -------------------------------
+# One CEO, then each level is up to SPAN_OF_CONTROL times wider than the one
+# above and every employee reports to a random employee of the level above, so
+# team sizes vary like a real organisation chart. Each director directly below
+# the CEO runs one department; everyone below a director inherits it.
+SPAN_OF_CONTROL = 6
+DEPARTMENTS = ["Finance", "Sales", "Operations", "Human Resources", "Technology", "Customer Service"]
+STAFF_TITLES = {
+    "Executive": ["Executive Assistant"],
+    "Finance": ["Accountant", "Payroll Officer", "Financial Analyst"],
+    "Sales": ["Sales Rep", "Account Executive"],
+    "Operations": ["Operations Staff", "Logistics Coordinator"],
+    "Human Resources": ["HR Advisor", "Recruiter"],
+    "Technology": ["Software Engineer", "Systems Administrator", "Data Analyst"],
+    "Customer Service": ["Customer Service Officer", "Support Specialist"],
+}
+# Base salary by role before a random spread: CEO, director, manager, team leader, staff
+ROLE_SALARIES = [320000, 210000, 150000, 110000, 75000]
+OFFICES = [
+    ("Subiaco Office", "WA"), ("Perth CBD Office", "WA"), ("Sydney Office", "NSW"),
+    ("Melbourne Office", "VIC"), ("Brisbane Office", "QLD"), ("Adelaide Office", "SA"),
+]
+FIRST_NAMES = ["Mei Lin", "Sophia", "Rajesh", "James", "Olivia", "Liam", "Aisha", "Noah",
+               "Chloe", "Ethan", "Priya", "Lucas", "Isabella", "Mateo", "Hannah", "Kenji"]
+LAST_NAMES = ["Cheong", "Bennett", "Patel", "Smith", "Nguyen", "Brown", "Khan", "Wilson",
+              "Taylor", "Garcia", "Singh", "Martin", "Lee", "Walker", "Kelly", "Tanaka"]
+RATINGS = ["Low", "Medium", "High"]
+REVIEW_DATES = ["2023-12-10", "2024-12-10"]   # One review per employee on each date
+LEAVE_TYPES = ["Annual Leave", "Personal Leave"]
+EMPLOYEES_PER_VACANCY = 20
+EXTERNAL_FACTOR_MONTHS = 120
+
+
+def parse_employees(value):
+    """Employee count from "10k", "100k", "1m" or a plain number"""
+    return SCALES.get(value.lower()) or int(value.replace("_", ""))
+
+
+def pick(rng, choices, size):
+    return np.asarray(choices, dtype=object)[rng.integers(0, len(choices), size)]
+
+
+def random_dates(rng, start, end, size):
+    """Uniform random dates in [start, end)"""
+    start, end = np.datetime64(start, "D"), np.datetime64(end, "D")
+    offsets = rng.integers(0, (end - start).astype(int), size).astype("timedelta64[D]")
+    return pd.Series(start + offsets)
+
+
+def yes_no(rng, probability, size):
+    return np.where(rng.random(size) < probability, "Yes", "No")
+
+
+def percent(values):
+    return pd.Series(np.round(values).astype(int)).astype(str) + "%"
+
+
+def sometimes(rng, values, probability):
+    """Keep each value with the given probability, leave it empty otherwise"""
+    values = pd.Series(values)
+    return values.where(rng.random(len(values)) < probability)
+
+
+def build_people(n, rng):
+    """Attributes shared by every dataset: ids, reporting lines, department, role"""
+    width = max(3, len(str(n)))
+    ids = "E" + pd.Series(np.arange(1, n + 1)).astype(str).str.zfill(width)
+
+    # Reporting lines, one level at a time (every level is a contiguous range)
+    manager = np.full(n, -1)
+    level = np.zeros(n, dtype=int)
+    department = np.empty(n, dtype=object)
+    department[0] = "Executive"
+    start, end, depth = 0, 1, 0
+    while end < n:
+        level_end = min(n, end + (end - start) * SPAN_OF_CONTROL)
+        managers = rng.integers(start, end, level_end - end)
+        manager[end:level_end] = managers
+        level[end:level_end] = depth + 1
+        if depth == 0:
+            department[end:level_end] = np.resize(np.asarray(DEPARTMENTS, dtype=object), level_end - end)
+        else:
+            department[end:level_end] = department[managers]
+        start, end, depth = end, level_end, depth + 1
+
+    direct_reports = np.bincount(manager[manager >= 0], minlength=n)
+    role = np.select(
+        [level == 0, level == 1, (level == 2) & (direct_reports > 0), direct_reports > 0],
+        [0, 1, 2, 3], default=4
+    )
+    staff_title = np.empty(n, dtype=object)
+    for dept, titles in STAFF_TITLES.items():
+        mask = department == dept
+        staff_title[mask] = pick(rng, titles, int(mask.sum()))
+    dept_names = pd.Series(department).astype(str)
+    job_title = np.select(
+        [role == 0, role == 1, role == 2, role == 3],
+        ["CEO", dept_names + " Director", dept_names + " Manager", "Team Leader"],
+        default=staff_title
+    )
+
+    office = rng.integers(0, len(OFFICES), n)
+    return pd.DataFrame({
+        "employee_id": ids,
+        "manager_index": manager,
+        "manager_id": ids.to_numpy()[np.maximum(manager, 0)],
+        "level": level,
+        "role": role,
+        "direct_reports": direct_reports,
+        "department": department,
+        "job_title": job_title,
+        "position_level": np.asarray(["M3", "M2", "M1", "S2", "S1"], dtype=object)[role],
+        "full_name": pick(rng, FIRST_NAMES, n) + " " + pick(rng, LAST_NAMES, n),
+        "gender": pick(rng, ["Female", "Male", "Female", "Male", "Non-binary"], n),
+        "date_of_birth": random_dates(rng, "1960-01-01", "2003-12-31", n),
+        "hire_date": random_dates(rng, "2005-01-01", "2025-06-30", n),
+        "office_location": np.asarray([o[0] for o in OFFICES], dtype=object)[office],
+        "region_state": np.asarray([o[1] for o in OFFICES], dtype=object)[office],
+        "base_salary": np.round(np.asarray(ROLE_SALARIES)[role] * rng.lognormal(0, 0.18, n)),
+    }).assign(manager_id=lambda df: df["manager_id"].where(df["manager_index"] >= 0))
+
+
+# -------------------------------
+# Dataset generators
+# -------------------------------
+# Each returns a dataframe keyed by table column name. Columns a generator
+# leaves out are written empty, as many are in the shipped CSVs.
+def employee_master(people, rng):
+    n = len(people)
+    terminated = rng.random(n) < 0.05
+    return pd.DataFrame({
+        "employee_id": people["employee_id"],
+        "full_name": people["full_name"],
+        "date_of_birth": people["date_of_birth"],
+        "gender": people["gender"],
+        "contact_details": pd.Series(rng.integers(400000000, 499999999, n)).astype(str),
+        "address": pd.Series(rng.integers(1, 300, n)).astype(str) + " Example St",
+        "emergency_contact": "Emergency " + pd.Series(rng.integers(100, 999, n)).astype(str),
+        "employment_status": np.where(terminated, "Terminated", "Active"),
+        "hire_date": people["hire_date"],
+        "termination_date": (
+            people["hire_date"] + pd.to_timedelta(rng.integers(30, 2000, n), unit="D")
+        ).where(terminated),
+        "job_title": people["job_title"],
+        "department": people["department"],
+        "office_location": people["office_location"],
+        "region_state": people["region_state"],
+        "country": "Australia",
+        "manager_id": people["manager_id"],
+        "award_agreement": pick(rng, ["Clerks Award", "Professional Employees Award", "Award Free"], n),
+        "employment_type": pick(rng, ["Full-time", "Full-time", "Full-time", "Part-time", "Casual"], n),
+    })
+
+
+def remuneration(people, rng):
+    n = len(people)
+    sales = (people["department"] == "Sales").to_numpy()
+    allowances = sometimes(rng, np.round(rng.integers(1, 31, n) * 500.0), 0.3)
+    commission_percent = pd.Series(np.where(sales, rng.integers(5, 16, n), np.nan))
+    commission = (people["base_salary"] * commission_percent / 100).round(2)
+    superannuation = np.select([people["role"] <= 1], [20], default=12)
+    salary = people["base_salary"] + allowances.fillna(0)
+    return pd.DataFrame({
+        "employee_id": people["employee_id"],
+        "base_salary": people["base_salary"],
+        "award_classification_level": sometimes(rng, rng.integers(1, 6, n).astype(float), 0.5),
+        "allowances": allowances,
+        "commission": commission,
+        "commission_percent": commission_percent,
+        "commission_earned": (commission * rng.uniform(0.5, 1.2, n)).round(2),
+        "overtime_rate": sometimes(rng, pick(rng, ["1.5x", "2x"], n), 0.4),
+        "superannuation_percent": superannuation,
+        "bonus_eligibility": yes_no(rng, 0.4, n),
+        "pay_cycle": pick(rng, ["Monthly", "Fortnightly"], n),
+        "salary": salary,
+        "commission_dollar": commission,
+        "total_package_value": (salary * (1 + superannuation / 100) + commission.fillna(0)).round(2),
+    })
+
+
+def position_details(people, rng):
+    n = len(people)
+    return pd.DataFrame({
+        "employee_id": people["employee_id"],
+        "position_title": people["job_title"],
+        "position_level": people["position_level"],
+        "licenses_permits": pick(rng, ["Driver License", "MS 365 Suite", "First Aid", "Forklift Licence"], n),
+        "qualification_date": random_dates(rng, "2015-01-01", "2026-01-01", n),
+        "expiry_date": sometimes(rng, random_dates(rng, "2025-01-01", "2029-01-01", n), 0.6),
+    })
+
+
+def performance(people, rng):
+    frames = []
+    for review_date in REVIEW_DATES:
+        n = len(people)
+        review = pd.Timestamp(review_date)
+        frames.append(pd.DataFrame({
+            "employee_id": people["employee_id"],
+            "review_date": review,
+            "performance_rating": rng.integers(1, 6, n),
+            "potential_rating": pick(rng, RATINGS, n),
+            "goals_objectives": sometimes(rng, pick(rng, ["NPS", "Revenue", "Cost", "Safety"], n), 0.7),
+            "achievement_status": percent(rng.uniform(40, 100, n)),
+            "development_plan_status": pick(rng, ["Active", "Completed", "Not Started"], n),
+            "last_promotion_date": people["hire_date"],
+            "next_review_date": review + pd.DateOffset(years=1),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def leave_tracker(people, rng):
+    frames = []
+    for leave_type in LEAVE_TYPES:
+        n = len(people)
+        requested = sometimes(rng, rng.integers(1, 11, n).astype(float), 0.3)
+        start = random_dates(rng, "2025-01-01", "2025-12-01", n).where(requested.notna())
+        frames.append(pd.DataFrame({
+            "employee_id": people["employee_id"],
+            "leave_type": leave_type,
+            "leave_balance_days": rng.integers(0, 40, n),
+            "days_requested": requested,
+            "days_approved": requested,
+            "leave_taken_start": start,
+            "leave_taken_end": start + pd.to_timedelta(requested, unit="D"),
+            "leave_accrual_rate": "1.5 days/month" if leave_type == "Annual Leave" else "10 days/year",
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def organisation_structure(people, rng):
+    names = people["full_name"].to_numpy()
+    return pd.DataFrame({
+        "employee_id": people["employee_id"],
+        "position_title": people["job_title"],
+        "position_level": people["position_level"],
+        "manager_id": people["manager_id"],
+        "manager_name": pd.Series(names[np.maximum(people["manager_index"], 0)]).where(
+            people["manager_index"] >= 0
+        ),
+        "department_function": people["department"],
+        "office_location": people["office_location"],
+        "region_state": people["region_state"],
+        "country": "Australia",
+        "date_appointed": people["hire_date"],
+        "direct_reports": people["direct_reports"],
+    })
+
+
+def succession_planning(people, rng):
+    n = len(people)
+    ids = people["employee_id"].to_numpy()
+    return pd.DataFrame({
+        "employee_id": people["employee_id"],
+        "current_position": people["job_title"],
+        "performance_rating": rng.integers(1, 6, n),
+        "potential_rating": pick(rng, RATINGS, n),
+        "ready_now_roles": yes_no(rng, 0.15, n),
+        "ready_1_2_yrs": yes_no(rng, 0.3, n),
+        "likely_backfill_candidate": sometimes(rng, ids[rng.integers(0, n, n)], 0.4),
+        "development_needs": sometimes(rng, pick(rng, ["Leadership Training", "Technical Skills", "Mentoring"], n), 0.6),
+        "target_readiness_date": random_dates(rng, "2026-01-01", "2028-01-01", n),
+    })
+
+
+def engagement_retention(people, rng):
+    n = len(people)
+    return pd.DataFrame({
+        "employee_id": people["employee_id"],
+        "engagement_score": rng.integers(40, 100, n),
+        "turnover_risk_score": pick(rng, RATINGS, n),
+        "absenteeism_rate": percent(rng.uniform(1, 10, n)),
+        "regrettable_loss_indicator": yes_no(rng, 0.3, n),
+    })
+
+
+def risk_compliance(people, rng):
+    n = len(people)
+    incidents = rng.random(n) < 0.05
+    return pd.DataFrame({
+        "employee_id": people["employee_id"],
+        "compliance_training_completion_percent": rng.integers(60, 101, n),
+        "whs_incident_involvement": incidents.astype(int),
+        "incident_type": pd.Series(pick(rng, ["Slip", "Manual Handling", "Vehicle"], n)).where(incidents),
+        "incident_date": random_dates(rng, "2023-01-01", "2025-12-31", n).where(incidents),
+        "severity": pd.Series(pick(rng, RATINGS, n)).where(incidents),
+        "near_miss_count": rng.poisson(0.3, n),
+        "lost_time_injury_indicator": yes_no(rng, 0.01, n),
+        "policy_breach_flag": yes_no(rng, 0.02, n),
+    })
+
+
+def diversity_inclusion(people, rng):
+    n = len(people)
+    age = (pd.Timestamp("2025-12-31") - people["date_of_birth"]).dt.days // 365
+    return pd.DataFrame({
+        "employee_id": people["employee_id"],
+        "gender": people["gender"],
+        "age_group": pd.cut(age, [0, 30, 40, 50, 200], labels=["Under 30", "30-40", "41-50", "51+"]),
+        "aboriginal_torres_strait_islander_status": yes_no(rng, 0.03, n),
+        "cald_background": yes_no(rng, 0.3, n),
+        "disability_status": yes_no(rng, 0.05, n),
+        "lgbtq_indicator": yes_no(rng, 0.08, n),
+        "veteran_status": yes_no(rng, 0.03, n),
+        "flexible_work_arrangement": yes_no(rng, 0.35, n),
+    })
+
+
+def recruitment(people, rng):
+    n = max(1, len(people) // EMPLOYEES_PER_VACANCY)
+    hires = rng.integers(0, len(people), n)
+    hired = people.iloc[hires].reset_index(drop=True)
+    width = max(3, len(str(n)))
+    return pd.DataFrame({
+        "vacancy_id": "V" + pd.Series(np.arange(1, n + 1)).astype(str).str.zfill(width),
+        "employee_id": hired["employee_id"],
+        "position_title": hired["job_title"],
+        "hiring_manager_id": hired["manager_id"],
+        "source_of_candidate": pick(rng, ["Agency", "Referral", "Job Board", "LinkedIn"], n),
+        "time_to_fill": rng.integers(10, 90, n),
+        "number_of_vacancies": rng.integers(1, 4, n),
+        "candidate_pipeline_stage": pick(rng, ["Applied", "Interviewed", "Offered", "Hired"], n),
+        "assessment_results": "Score: " + percent(rng.uniform(50, 100, n)),
+        "office_location": hired["office_location"],
+        "region_state": hired["region_state"],
+        "country": "Australia",
+    })
+
+
+def advanced_analytics(people, rng):
+    n = len(people)
+    return pd.DataFrame({
+        "employee_id": people["employee_id"],
+        "cost_to_company": np.round(people["base_salary"] * rng.uniform(1.1, 1.4, n)),
+        "training_investment": rng.integers(0, 5000, n),
+        "productivity_index": rng.integers(60, 130, n),
+        "attrition_probability": percent(rng.beta(2, 8, n) * 100),
+        "flight_risk_score": pick(rng, RATINGS, n),
+        "engagement_trend": pick(rng, ["Improving", "Stable", "Declining"], n),
+        "promotion_velocity": rng.integers(0, 6, n),
+        "critical_role_indicator": np.where(people["role"] <= 2, "Yes", yes_no(rng, 0.1, n)),
+    })
+
+
+def external_factors(people, rng):
+    n = EXTERNAL_FACTOR_MONTHS
+    return pd.DataFrame({
+        "period_date": pd.date_range("2016-01-01", periods=n, freq="MS"),
+        "cpi": rng.uniform(1, 7, n).round(2),
+        "unemployment_rate": rng.uniform(3, 7, n).round(2),
+        "industry_turnover_rate": rng.uniform(8, 20, n).round(2),
+        "market_salary_benchmark": rng.integers(70000, 120000, n),
+        "economic_confidence_index": rng.uniform(70, 120, n).round(2),
+        "job_vacancy_index": rng.integers(1000, 3500, n),
+    })
+
+
+GENERATORS = {
+    "employee_master": employee_master,
+    "remuneration": remuneration,
+    "position_details": position_details,
+    "performance": performance,
+    "leave_tracker": leave_tracker,
+    "organisation_structure": organisation_structure,
+    "succession_planning": succession_planning,
+    "engagement_retention": engagement_retention,
+    "risk_compliance": risk_compliance,
+    "diversity_inclusion": diversity_inclusion,
+    "recruitment": recruitment,
+    "advanced_analytics": advanced_analytics,
+    "external_factors": external_factors,
+}
+
+
+def write_dataset(df, table_name, output_dir):
+    """Write a generated table as its CSV, with the source headers in source order"""
+    columns = schema.TABLES[table_name]["columns"]
+    out = pd.DataFrame({c["header"]: df[c["name"]] if c["name"] in df else None for c in columns})
+    path = os.path.join(output_dir, schema.TABLES[table_name]["file"])
+    # utf-8-sig: the shipped CSVs are exported from Excel with a byte order mark
+    out.to_csv(path, index=False, encoding="utf-8-sig", date_format="%Y-%m-%d")
+    return len(out)
+
+
+def generate(employees, output_dir, seed=DEFAULT_SEED):
+    """Generate every dataset for `employees` employees into output_dir"""
+    os.makedirs(output_dir, exist_ok=True)
+    started = time.perf_counter()
+    people = build_people(employees, np.random.default_rng(seed))
+    depth = int(people["level"].max())
+    print(f"👥 {employees:,} employees, {depth + 1} management levels (seed {seed})")
+
+    for offset, (table_name, generator) in enumerate(GENERATORS.items()):
+        # One generator per table keeps each table's data independent of the others'
+        rng = np.random.default_rng([seed, offset])
+        rows = write_dataset(generator(people, rng), table_name, output_dir)
+        print(f"   {schema.TABLES[table_name]['file']}: {rows:,} rows")
+
+    print(f"\n Wrote {len(GENERATORS)} files to {output_dir} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic HR CSV files for load and query benchmarks")
+    parser.add_argument(
+        "--employees",
+        default="10k",
+        help="Number of employees: 10k, 100k, 1m or any number (default 10k)"
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help=f"Random seed (default {DEFAULT_SEED})")
+    parser.add_argument(
+        "--output",
+        help=f"Output folder (default {OUTPUT_ROOT}/<employees>)"
+    )
+    args = parser.parse_args()
+
+    employees = parse_employees(args.employees)
+    generate(employees, args.output or os.path.join(OUTPUT_ROOT, args.employees.lower()), args.seed)
@@ -0,0 +1,532 @@
+"""
+HR schema registry
+
+One declarative description of every HR dataset in table/columns.json. The
+DDL in create_db.py, the CSV -> table column mapping and type coercion in
+upload_db.py, and the table/column whitelist in server.py are all generated
+from it, so a dataset is added by declaring it here rather than by new code
+paths in each script.
+"""
+import os
+import re
+import json
+from functools import lru_cache
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLUMNS_FILE = os.path.join(BASE_DIR, "table", "columns.json")
+
+# Column type -> PostgreSQL type
+SQL_TYPES = {
+    "varchar": "VARCHAR",
+    "date": "DATE",
+    "numeric": "NUMERIC",
+    "integer": "INTEGER",
+    "percent": "NUMERIC",   # "12%" is stored as 12
+    "boolean": "BOOLEAN",
+}
+
+# Text values accepted for boolean columns; anything else is loaded as NULL
+BOOLEAN_VALUES = {
+    "yes": True, "y": True, "true": True, "1": True,
+    "no": False, "n": False, "false": False, "0": False,
+}
+
+# -------------------------------
+# Dataset declarations
+# -------------------------------
+# Keyed by dataset name in columns.json (also the CSV file name and workbook
+# sheet name). Columns and their order come from columns.json; a column's
+# name is derived from its header (see column_name) unless renamed here, and
+# its type is VARCHAR unless listed under "types". Every employee_id column
+# outside employee_master references employee_master.
+#
+# Time series datasets name their "date_column", the default column of the
+# MCP server's date range filters. "partition_by" range-partitions the table
+# by year of that date column (one partition per year, created by the loader
+# as years appear); it must be part of the primary key, so datasets keyed
+# without a date (Leave Tracker, Risk & Compliance) stay unpartitioned.
+DATASETS = {
+    "Employee Master": {
+        "primary_key": ["employee_id"],
+        "renames": {"Manager": "manager_id"},
+        "references": {"manager_id": "employee_master"},
+        "types": {
+            "date": ["date_of_birth", "hire_date", "termination_date"],
+        },
+    },
+    "Remuneration": {
+        "primary_key": ["employee_id"],
+        "renames": {"Commision Earned": "commission_earned"},
+        "types": {
+            "numeric": ["base_salary", "allowances", "commission", "commission_percent",
+                        "commission_earned", "overtime_rate", "superannuation_percent",
+                        "salary", "commission_dollar", "total_package_value"],
+            "boolean": ["bonus_eligibility"],
+        },
+    },
+    "Position Details": {
+        "primary_key": ["employee_id", "position_title"],
+        "types": {
+            "date": ["qualification_date", "expiry_date"],
+        },
+    },
+    "Performance": {
+        "primary_key": ["employee_id", "review_date"],
+        "date_column": "review_date",
+        "partition_by": "review_date",
+        "types": {
+            "date": ["review_date", "last_promotion_date", "next_review_date"],
+        },
+    },
+    "Leave Tracker": {
+        "primary_key": ["employee_id", "leave_type"],
+        "date_column": "leave_taken_start",
+        "types": {
+            "numeric": ["leave_balance_days", "days_requested", "days_approved"],
+            "date": ["leave_taken_start", "leave_taken_end"],
+        },
+    },
+    "Organisation Structure": {
+        "primary_key": ["employee_id"],
+        "types": {
+            "date": ["date_appointed"],
+            "integer": ["direct_reports"],
+        },
+    },
+    "Succession Planning": {
+        "primary_key": ["employee_id"],
+        "types": {
+            "integer": ["performance_rating"],
+            "boolean": ["ready_now_roles", "ready_1_2_yrs"],
+            "date": ["target_readiness_date"],
+        },
+    },
+    "Engagement & Retention": {
+        "primary_key": ["employee_id"],
+        "types": {
+            "numeric": ["engagement_score"],
+            "percent": ["absenteeism_rate"],
+            "boolean": ["regrettable_loss_indicator"],
+        },
+    },
+    "Risk & Compliance": {
+        "primary_key": ["employee_id"],
+        "renames": {"Date": "incident_date"},
+        "date_column": "incident_date",
+        "types": {
+            "percent": ["compliance_training_completion_percent"],
+            "integer": ["whs_incident_involvement", "near_miss_count"],
+            "date": ["incident_date"],
+            "numeric": ["time_lost"],
+            "boolean": ["lost_time_injury_indicator", "policy_breach_flag"],
+        },
+    },
+    "Diversity & Inclusion": {
+        "primary_key": ["employee_id"],
+        "types": {
+            "boolean": ["aboriginal_torres_strait_islander_status", "cald_background",
+                        "disability_status", "lgbtq_indicator", "veteran_status",
+                        "flexible_work_arrangement"],
+        },
+    },
+    "Recruitment": {
+        "primary_key": ["vacancy_id"],
+        "renames": {"Hiring ManagerID": "hiring_manager_id"},
+        "types": {
+            "integer": ["time_to_fill", "number_of_vacancies"],
+        },
+    },
+    "Advanced Analytics": {
+        "primary_key": ["employee_id"],
+        "types": {
+            "numeric": ["cost_to_company", "training_investment", "productivity_index"],
+            "percent": ["attrition_probability"],
+            "integer": ["promotion_velocity"],
+            "boolean": ["critical_role_indicator"],
+        },
+    },
+    "External Factors": {
+        "primary_key": ["period_date"],
+        "renames": {"Date": "period_date"},
+        "date_column": "period_date",
+        "partition_by": "period_date",
+        "types": {
+            "date": ["period_date"],
+            "numeric": ["cpi", "unemployment_rate", "industry_turnover_rate",
+                        "market_salary_benchmark", "economic_confidence_index",
+                        "job_vacancy_index"],
+        },
+    },
+}
+
+
+# -------------------------------
+# Materialized analytics views
+# -------------------------------
+# Read-only summaries for the questions the chatbot asks most (flight risk by
+# department, engagement by salary band). Created by create_db.py and
+# refreshed by upload_db.py with REFRESH MATERIALIZED VIEW CONCURRENTLY after
+# a load touches any table in "depends_on", in the order declared here (so a
+# view built on another view is refreshed after it). "key" is the unique
+# index that concurrent refresh requires; "indexes" are extra lookup indexes.
+VIEWS = {
+    "employee_summary": {
+        "depends_on": ["employee_master", "remuneration", "performance",
+                       "engagement_retention", "advanced_analytics"],
+        "key": ["employee_id"],
+        "indexes": [["department", "employee_id"]],
+        "sql": """
+SELECT
+    e.employee_id,
+    e.full_name,
+    COALESCE(e.department, 'Unassigned') AS department,
+    e.job_title,
+    e.employment_status,
+    e.employment_type,
+    e.manager_id,
+    e.hire_date,
+    r.base_salary,
+    r.total_package_value,
+    CASE
+        WHEN r.base_salary IS NULL THEN 'Unknown'
+        WHEN r.base_salary < 60000 THEN 'Under 60k'
+        WHEN r.base_salary < 80000 THEN '60k-80k'
+        WHEN r.base_salary < 100000 THEN '80k-100k'
+        WHEN r.base_salary < 150000 THEN '100k-150k'
+        ELSE '150k+'
+    END AS salary_band,
+    p.review_date AS last_review_date,
+    p.performance_rating,
+    p.potential_rating,
+    g.engagement_score,
+    g.turnover_risk_score,
+    g.absenteeism_rate,
+    a.attrition_probability,
+    a.flight_risk_score,
+    a.engagement_trend,
+    a.critical_role_indicator
+FROM employee_master e
+LEFT JOIN remuneration r ON r.employee_id = e.employee_id
+LEFT JOIN LATERAL (
+    SELECT review_date, performance_rating, potential_rating
+    FROM performance
+    WHERE employee_id = e.employee_id
+    ORDER BY review_date DESC NULLS LAST
+    LIMIT 1
+) p ON true
+LEFT JOIN engagement_retention g ON g.employee_id = e.employee_id
+LEFT JOIN advanced_analytics a ON a.employee_id = e.employee_id
+""",
+    },
+    "department_summary": {
+        "depends_on": ["employee_summary"],
+        "key": ["department"],
+        "sql": """
+SELECT
+    department,
+    COUNT(*) AS headcount,
+    COUNT(*) FILTER (WHERE employment_status = 'Active') AS active_headcount,
+    ROUND(AVG(base_salary), 2) AS avg_base_salary,
+    ROUND(SUM(total_package_value), 2) AS total_package_value,
+    ROUND(AVG(engagement_score), 2) AS avg_engagement_score,
+    ROUND(AVG(attrition_probability), 2) AS avg_attrition_probability,
+    COUNT(*) FILTER (WHERE flight_risk_score = 'High') AS high_flight_risk,
+    COUNT(*) FILTER (WHERE critical_role_indicator) AS critical_roles,
+    COUNT(*) FILTER (WHERE critical_role_indicator AND flight_risk_score = 'High') AS critical_roles_at_risk
+FROM employee_summary
+GROUP BY department
+""",
+    },
+    "salary_band_summary": {
+        "depends_on": ["employee_summary"],
+        "key": ["department", "salary_band"],
+        "sql": """
+SELECT
+    department,
+    salary_band,
+    COUNT(*) AS headcount,
+    ROUND(AVG(base_salary), 2) AS avg_base_salary,
+    ROUND(AVG(engagement_score), 2) AS avg_engagement_score,
+    ROUND(AVG(attrition_probability), 2) AS avg_attrition_probability,
+    COUNT(*) FILTER (WHERE flight_risk_score = 'High') AS high_flight_risk,
+    COUNT(*) FILTER (WHERE engagement_trend = 'Declining') AS declining_engagement
+FROM employee_summary
+GROUP BY department, salary_band
+""",
+    },
+    # Org hierarchy closure table: one row per (ancestor, employee) pair on a
+    # reporting line, including each employee with itself at depth 0, so
+    # subtrees and chains of command are single index lookups. The path
+    # array stops the walk at cycles in manager_id.
+    "employee_hierarchy": {
+        "depends_on": ["employee_master"],
+        "key": ["ancestor_id", "depth", "employee_id"],
+        "indexes": [["employee_id", "depth"]],
+        "sql": """
+WITH RECURSIVE reporting_lines AS (
+    SELECT employee_id AS ancestor_id, employee_id, 0 AS depth, ARRAY[employee_id] AS path
+    FROM employee_master
+    UNION ALL
+    SELECT r.ancestor_id, e.employee_id, r.depth + 1, r.path || e.employee_id
+    FROM reporting_lines r
+    JOIN employee_master e ON e.manager_id = r.employee_id
+    WHERE e.employee_id <> ALL (r.path)
+)
+SELECT ancestor_id, employee_id, depth
+FROM reporting_lines
+""",
+    },
+    # Per employee: level in the org (0 at the top), direct reports, everyone
+    # below them and how many levels deep their subtree goes
+    "reporting_span": {
+        "depends_on": ["employee_hierarchy"],
+        "key": ["employee_id"],
+        "sql": """
+SELECT
+    below.employee_id,
+    above.org_level,
+    below.direct_reports,
+    below.total_reports,
+    below.levels_below
+FROM (
+    SELECT
+        ancestor_id AS employee_id,
+        COUNT(*) FILTER (WHERE depth = 1) AS direct_reports,
+        COUNT(*) - 1 AS total_reports,
+        MAX(depth) AS levels_below
+    FROM employee_hierarchy
+    GROUP BY ancestor_id
+) below
+JOIN (
+    SELECT employee_id, MAX(depth) AS org_level
+    FROM employee_hierarchy
+    GROUP BY employee_id
+) above ON above.employee_id = below.employee_id
+""",
+    },
+}
+
+# Free-text columns searched by the MCP server's search_employees tool
+SEARCH_FIELDS = {
+    "employee_master": ["full_name", "job_title"],
+    "position_details": ["skills_required", "qualifications", "licenses_permits"],
+    "performance": ["goals_objectives"],
+}
+
+# Longest searchable value, in characters; longer free text (goals) is searched
+# by its beginning. Keeps each value's trigrams within a GiST index entry.
+SEARCH_VALUE_MAX_LENGTH = 1000
+
+# Search index: one row per employee and distinct non-empty value of a
+# SEARCH_FIELDS column, with the employee's department for filtering. Values
+# are keyed and looked up by their md5 (value_key), as a btree index entry
+# cannot hold long text.
+VIEWS["employee_search"] = {
+    "depends_on": list(SEARCH_FIELDS),
+    "key": ["field", "value_key", "employee_id"],
+    "indexes": [["field", "value_key", "department", "employee_id"]],
+    "sql": """
+SELECT DISTINCT s.employee_id, e.department, s.field, s.value, md5(s.value) AS value_key
+FROM (
+""" + "\n    UNION ALL\n".join(
+        f"    SELECT employee_id, '{column}' AS field, "
+        f"left(btrim({column}), {SEARCH_VALUE_MAX_LENGTH}) AS value FROM {table}"
+        for table, columns in SEARCH_FIELDS.items() for column in columns
+    ) + """
+) s
+JOIN employee_master e ON e.employee_id = s.employee_id
+WHERE s.value <> ''
+""",
+}
+
+# Each searchable value once per field (many employees share a job title or
+# licence); create_db.py adds the pg_trgm trigram index used to rank them
+VIEWS["employee_search_terms"] = {
+    "depends_on": ["employee_search"],
+    "key": ["field", "value_key"],
+    "sql": """
+SELECT DISTINCT field, value_key, value FROM employee_search
+""",
+}
+
+
+def identifier(label):
+    """Normalize a dataset name or column header into a SQL identifier"""
+    label = label.replace("%", " percent ").replace("$", " dollar ")
+    return re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_")
+
+
+def column_name(header, renames=None):
+    """Table column for a CSV header ("Position Level " -> position_level)"""
+    if renames and header in renames:
+        return renames[header]
+    return identifier(header)
+
+
+def _build_tables():
+    with open(COLUMNS_FILE, encoding="utf-8") as f:
+        headers_by_dataset = json.load(f)
+
+    tables = {}
+    for dataset, spec in DATASETS.items():
+        name = identifier(dataset)
+        renames = spec.get("renames", {})
+        types = {col: col_type for col_type, cols in spec.get("types", {}).items() for col in cols}
+        columns = [
+            {"header": header, "name": column_name(header, renames)}
+            for header in headers_by_dataset[dataset]
+        ]
+        names = [c["name"] for c in columns]
+        for col in list(types) + spec["primary_key"]:
+            if col not in names:
+                raise ValueError(f"{dataset}: unknown column {col} (columns: {names})")
+        for c in columns:
+            c["type"] = types.get(c["name"], "varchar")
+        for key in ("date_column", "partition_by"):
+            if spec.get(key) and types.get(spec[key]) != "date":
+                raise ValueError(f"{dataset}: {key} {spec[key]} is not a date column")
+        if spec.get("partition_by") and spec["partition_by"] not in spec["primary_key"]:
+            raise ValueError(f"{dataset}: partition_by {spec['partition_by']} is not in the primary key")
+
+        references = dict(spec.get("references", {}))
+        if name != "employee_master" and "employee_id" in names:
+            references.setdefault("employee_id", "employee_master")
+
+        tables[name] = {
+            "dataset": dataset,
+            "file": f"{dataset}.csv",
+            "columns": columns,
+            "primary_key": spec["primary_key"],
+            "references": references,
+            "date_column": spec.get("date_column"),
+            "partition_by": spec.get("partition_by"),
+        }
+    return tables
+
+
+# table name -> {"dataset", "file", "columns", "primary_key", "references",
+#                "date_column", "partition_by"}
+TABLES = _build_tables()
+
+
+def load_order(table_names=None):
+    """Table names ordered so every table comes after the tables it references"""
+    remaining = {
+        t: {ref for ref in TABLES[t]["references"].values() if ref != t}
+        for t in (table_names or TABLES)
+    }
+    ordered = []
+    while remaining:
+        ready = [t for t, deps in remaining.items() if not deps & set(remaining)]
+        if not ready:
+            raise ValueError(f"Foreign key cycle between tables: {sorted(remaining)}")
+        for t in ready:
+            del remaining[t]
+            ordered.append(t)
+    return ordered
+
+
+def create_table_sql(table_name):
+    """CREATE TABLE IF NOT EXISTS statement for one table"""
+    spec = TABLES[table_name]
+    lines = [f"    {c['name']} {SQL_TYPES[c['type']]}" for c in spec["columns"]]
+    lines.append(f"    PRIMARY KEY ({', '.join(spec['primary_key'])})")
+    for column, referenced in spec["references"].items():
+        lines.append(f"    FOREIGN KEY ({column}) REFERENCES {referenced} (employee_id)")
+    partitioning = f" PARTITION BY RANGE ({spec['partition_by']})" if spec["partition_by"] else ""
+    return f"CREATE TABLE IF NOT EXISTS {table_name} (\n" + ",\n".join(lines) + f"\n){partitioning};\n"
+
+
+def partition_name(table_name, year):
+    """Name of the partition holding one year of a partitioned table"""
+    return f"{table_name}_{int(year)}"
+
+
+def create_partition_sql(table_name, year):
+    """CREATE TABLE IF NOT EXISTS statement for one yearly partition"""
+    year = int(year)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table_name, year)} PARTITION OF {table_name} "
+        f"FOR VALUES FROM ('{year:04d}-01-01') TO ('{year + 1:04d}-01-01')"
+    )
+
+
+def column_mapping(table_name):
+    """CSV header -> table column"""
+    return {c["header"]: c["name"] for c in TABLES[table_name]["columns"]}
+
+
+def column_types(table_name):
+    """Table column -> PostgreSQL type (lower case, as information_schema reports it)"""
+    return {c["name"]: SQL_TYPES[c["type"]].lower() for c in TABLES[table_name]["columns"]}
+
+
+@lru_cache(maxsize=None)
+def coercion_plan(table_name):
+    """Column type -> columns needing conversion, computed once per table"""
+    plan = {}
+    for c in TABLES[table_name]["columns"]:
+        if c["type"] != "varchar":
+            plan.setdefault(c["type"], []).append(c["name"])
+    return plan
+
+
+def _to_boolean(values):
+    return values.astype(str).str.strip().str.lower().map(BOOLEAN_VALUES).astype("boolean")
+
+
+def _to_percent(values):
+    return pd.to_numeric(values.astype(str).str.strip().str.rstrip("%"), errors="coerce")
+
+
+def _to_integer(values):
+    numbers = pd.to_numeric(values, errors="coerce")
+    return numbers.where(numbers == numbers.round()).astype("Int64")
+
+
+# Column type -> vectorized converter (one call per column)
+CONVERTERS = {
+    "date": lambda values: pd.to_datetime(values, errors="coerce"),
+    "numeric": lambda values: pd.to_numeric(values, errors="coerce"),
+    "integer": _to_integer,
+    "percent": _to_percent,
+    "boolean": _to_boolean,
+}
+
+
+def coerce_dataframe(df, table_name):
+    """Convert a renamed dataframe's columns to the table's types"""
+    for col_type, columns in coercion_plan(table_name).items():
+        convert = CONVERTERS[col_type]
+        for col in columns:
+            if col in df.columns:
+                df[col] = convert(df[col])
+    return df
+
+
+def create_view_sql(view_name):
+    """CREATE MATERIALIZED VIEW statement and its indexes for one view"""
+    spec = VIEWS[view_name]
+    statements = [
+        f"CREATE MATERIALIZED VIEW IF NOT EXISTS {view_name} AS{spec['sql'].rstrip()}",
+        f"CREATE UNIQUE INDEX IF NOT EXISTS {view_name}_key_idx ON {view_name} ({', '.join(spec['key'])})",
+    ]
+    for columns in spec.get("indexes", []):
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS {view_name}_{'_'.join(columns)}_idx "
+            f"ON {view_name} ({', '.join(columns)})"
+        )
+    return statements
+
+
+def views_for_tables(table_names):
+    """Views to refresh, in refresh order, after these tables changed"""
+    changed = set(table_names)
+    views = []
+    for view_name, spec in VIEWS.items():
+        if changed & set(spec["depends_on"]):
+            views.append(view_name)
+            changed.add(view_name)
+    return views
@@ -1,8 +1,40 @@
 import json
+import os
+import asyncio
+import inspect
+import math
 import sys
 import io
+import gzip
+import re
+import base64
+import uuid
+import weakref
+import threading
+import time
+import select
+import bisect
+import functools
+import contextvars
+from datetime import date, datetime, timezone
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+import anyio
+import brotli
+import psycopg
 import psycopg2
+import psycopg2.extensions
+from psycopg2 import pool as pg_pool
+from psycopg_pool import AsyncConnectionPool
 from mcp.server.fastmcp import FastMCP
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+import schema
+import snapshot
 
 # Set Windows console output encoding to UTF-8
 if sys.platform == 'win32':
@@ -18,103 +50,2541 @@ PG_HOST = "localhost"
 PG_PORT = "5432"
 PG_DB = "postgres"
 
-# Global database connection
-_conn = None
-_cursor = None
+# Connection pool settings
+PG_POOL_MIN = 1           # Connections opened when the pool is created
+PG_POOL_MAX = 10          # Hard cap on concurrent database connections
+PG_POOL_TIMEOUT = 10      # Seconds to wait for a free connection before failing
+PG_POOL_PING_AFTER = 30   # Idle seconds after which a connection is pinged on checkout
 
-def get_db_connection():
-    """Get database connection"""
-    global _conn, _cursor
-    if _conn is None or _conn.closed:
-        _conn = psycopg2.connect(
-            host=PG_HOST,
-            port=PG_PORT,
-            database=PG_DB,
-            user=PG_USER,
-            password=PG_PASSWORD
+# Query result cache settings
+CACHE_MAX_ENTRIES = 1024  # LRU bound on cached results
+CACHE_DEFAULT_TTL = 300   # Seconds a cached result stays valid
+CACHE_TTLS = {            # Per-table overrides (seconds; 0 disables caching)
+    "employee_master": 600,
+    "remuneration": 300,
+    "position_details": 600,
+    "performance": 300,
+}
+# Pagination settings
+MAX_QUERY_LIMIT = 1000    # Hard cap on rows returned by one query_employees call
+MAX_PROFILE_BATCH = 100   # Hard cap on employee IDs per get_employee_profiles call
+MAX_BATCH_QUERIES = 20    # Hard cap on queries per query_employees_batch call
+FETCH_BATCH_SIZE = 200    # Rows per round trip when streaming from a server-side cursor
+
+# Queryable tables: every dataset and materialized analytics view in the
+# schema registry (schema.py); views are refreshed by upload_db.py
+ALLOWED_TABLES = list(schema.TABLES) + list(schema.VIEWS)
+
+# Primary (or unique view) key of each table: the stable sort order and keyset for pagination
+TABLE_KEYS = {table: spec["primary_key"] for table, spec in schema.TABLES.items()}
+TABLE_KEYS.update({view: spec["key"] for view, spec in schema.VIEWS.items()})
+
+# Default column of date_from/date_to filters on the time series tables
+TABLE_DATE_COLUMNS = {
+    table: spec["date_column"] for table, spec in schema.TABLES.items() if spec["date_column"]
+}
+
+# upload_db.py notifies this channel with the table name after each load
+CACHE_INVALIDATION_CHANNEL = "hr_table_changed"
+
+# Metrics and slow-query log settings
+METRICS_ENABLED = True                  # Collect latency/size histograms served on /metrics
+SLOW_QUERY_MS = None                    # Log queries slower than this many ms (None disables)
+SLOW_QUERY_LOG = "slow_queries.log"     # One JSON object per line: SQL, parameters, EXPLAIN output
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Production REST API settings (--https); every worker process has its own
+# asyncio connection pool of up to PG_POOL_MAX connections and its own cache
+HTTP_HOST = "0.0.0.0"
+HTTP_PORT = 8443
+HTTP_WORKERS = min(4, os.cpu_count() or 1)  # Worker processes (override with --workers N)
+HTTP_BACKLOG = 2048             # Pending TCP connections queued by the kernel
+HTTP_KEEP_ALIVE = 30            # Seconds an idle client connection is kept open
+HTTP_SHUTDOWN_TIMEOUT = 15      # Seconds in-flight requests get to finish on shutdown
+TLS_CERT_FILE = "server.crt"
+TLS_KEY_FILE = "server.key"
+COMPRESS_MIN_BYTES = 1024       # Smaller responses are sent uncompressed
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4              # Brotli's fast range; higher levels cost far more CPU per response
+
+# Snapshot mode (--snapshot PATH): serve every read tool from a SQLite
+# snapshot written by upload_db.py --snapshot, without a database connection
+SNAPSHOT_FILE = None
+SNAPSHOT_POLL_SECONDS = 2       # How often the snapshot file is checked for a replacement
+
+# Admission control (per process): queries beyond the in-flight limit wait
+# briefly in a bounded queue, everything past that and clients over their rate
+# limit are turned away at once with a retry hint (HTTP 429 on the REST API)
+MAX_INFLIGHT_QUERIES = PG_POOL_MAX      # Database queries running at once
+ADMISSION_QUEUE_SIZE = 2 * PG_POOL_MAX  # Queries allowed to wait for a free slot
+ADMISSION_WAIT_SECONDS = 1              # Longest a query waits for a slot before it is rejected
+RATE_LIMIT_PER_SECOND = 50              # Sustained calls per client (REST client address or MCP session; 0 disables)
+RATE_LIMIT_BURST = 100                  # Calls a client may make back to back
+RATE_LIMIT_CLIENTS = 10000              # Clients tracked; the least recently seen are forgotten first
+STATEMENT_TIMEOUT_MS = 5000             # statement_timeout of tool queries
+STATEMENT_TIMEOUTS = {                  # Per-tool overrides (ms)
+    "aggregate_employees": 15000,
+}
+
+
+class ConnectionPool:
+    """Bounded, thread-safe PostgreSQL connection pool
+
+    At most `maxconn` connections are open at once; callers wait up to
+    `timeout` seconds for a free one. Idle connections are kept warm and
+    health-checked on checkout, so a dropped backend is transparently
+    replaced with a fresh connection.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, ping_after, **connect_kwargs):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._connect_kwargs = connect_kwargs
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._idle = []  # (connection, last used) pairs, most recent last
+        self._in_use = 0
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _connect(self):
+        return psycopg2.connect(**self._connect_kwargs)
+
+    def _is_healthy(self, conn, last_used):
+        """Check a connection before handing it out"""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        with self._lock:
+            idle = self._idle.pop() if self._idle else None
+        if idle is None:
+            return self._connect()
+        conn, last_used = idle
+        if self._is_healthy(conn, last_used):
+            return conn
+        # Reconnect: drop the broken connection and open a fresh one
+        conn.close()
+        return self._connect()
+
+    def _checkin(self, conn):
+        if conn.closed:
+            return
+        try:
+            # Read-only usage: end the transaction so the connection goes back idle
+            conn.rollback()
+        except psycopg2.Error:
+            conn.close()
+            return
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; it is returned to the pool when the block exits"""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise pg_pool.PoolError(
+                f"No database connection available within {self.timeout}s "
+                f"(pool size {self.maxconn})"
+            )
+        try:
+            conn = self._checkout()
+            if METRICS_ENABLED:
+                metrics.observe("hr_pool_wait_seconds", time.perf_counter() - started)
+            with self._lock:
+                self._in_use += 1
+            try:
+                yield conn
+            finally:
+                with self._lock:
+                    self._in_use -= 1
+                self._checkin(conn)
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {"max": self.maxconn, "in_use": self._in_use, "idle": len(self._idle)}
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_db_pool():
+    """Get (lazily creating) the shared connection pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    PG_POOL_MIN,
+                    PG_POOL_MAX,
+                    PG_POOL_TIMEOUT,
+                    PG_POOL_PING_AFTER,
+                    host=PG_HOST,
+                    port=PG_PORT,
+                    database=PG_DB,
+                    user=PG_USER,
+                    password=PG_PASSWORD
+                )
+    return _pool
+
+
+@contextmanager
+def db_cursor(server_side=False, timeout=None):
+    """Borrow a pooled connection and yield a cursor private to this request
+
+    With server_side=True the cursor is a named (server-side) cursor: rows
+    stay on the server and are fetched FETCH_BATCH_SIZE at a time. timeout
+    is the statement_timeout (ms) the connection should run with.
+    """
+    call = current_call()
+    with get_db_pool().connection() as conn:
+        if timeout is not None and _statement_timeouts.get(conn) != timeout:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SET statement_timeout = {int(timeout)}")
+            conn.commit()
+            _statement_timeouts[conn] = timeout
+        started = time.perf_counter()
+        name = f"query_{uuid.uuid4().hex}" if server_side else None
+        factory = StatementTrackingCursor if SLOW_QUERY_MS is not None else None
+        with conn.cursor(name=name, cursor_factory=factory) as cursor:
+            if server_side:
+                cursor.itersize = FETCH_BATCH_SIZE
+            yield cursor
+            elapsed = time.perf_counter() - started
+            if call is not None:
+                call.db_seconds += elapsed
+                call.rows += max(cursor.rowcount, 0)
+            if SLOW_QUERY_MS is not None and elapsed * 1000 >= SLOW_QUERY_MS:
+                log_slow_query(conn, cursor, elapsed, call)
+
+
+def close_db_pool():
+    """Close every pooled connection"""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+# -------------------------------
+# Metrics and Slow-Query Log
+# -------------------------------
+METRIC_HELP = {
+    "hr_tool_duration_seconds": ("histogram", "Tool call latency (cache hits included)"),
+    "hr_tool_db_seconds": ("histogram", "Time a tool call spent on database connections"),
+    "hr_tool_serialization_seconds": (
+        "histogram", "Time a tool call spent outside the database (SQL building, JSON serialization)"
+    ),
+    "hr_tool_rows": ("histogram", "Rows read from the database per tool call"),
+    "hr_tool_response_bytes": ("histogram", "Tool response size in bytes"),
+    "hr_tool_errors_total": ("counter", "Tool calls that returned an error"),
+    "hr_http_request_duration_seconds": ("histogram", "REST request latency, transport included"),
+    "hr_pool_wait_seconds": ("histogram", "Time spent waiting for a pooled database connection"),
+    "hr_slow_queries_total": ("counter", "Queries recorded in the slow-query log"),
+    "hr_cache_entries": ("gauge", "Results currently cached"),
+    "hr_cache_hits_total": ("counter", "Result cache hits"),
+    "hr_cache_misses_total": ("counter", "Result cache misses"),
+    "hr_cache_hit_ratio": ("gauge", "Share of result cache lookups that were hits"),
+    "hr_pool_connections": ("gauge", "Database connections by state"),
+    "hr_admission_queries": ("gauge", "Database queries admitted (in_flight) and queued (waiting)"),
+    "hr_rejected_total": ("counter", "Calls turned away by admission control (busy) or rate limits"),
+}
+METRIC_BUCKETS = {
+    "hr_tool_rows": ROW_BUCKETS,
+    "hr_tool_response_bytes": BYTE_BUCKETS,
+}
+
+
+class Histogram:
+    """Fixed-bucket histogram (cumulative counts are computed when rendering)"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Thread-safe histograms and counters, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._histograms = {}   # (name, labels) -> Histogram
+        self._counters = {}     # (name, labels) -> value
+
+    def histogram(self, name, **labels):
+        """The histogram of one label set; callers observe it while holding self.lock"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(METRIC_BUCKETS.get(name, LATENCY_BUCKETS))
+            return histogram
+
+    def observe(self, name, value, **labels):
+        histogram = self.histogram(name, **labels)
+        with self.lock:
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def render(self, samples=()):
+        """Exposition text; samples are extra (name, labels, value) gauges and counters"""
+        series = {}
+        with self.lock:
+            for (name, labels), histogram in self._histograms.items():
+                lines = series.setdefault(name, [])
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+            for (name, labels), value in self._counters.items():
+                series.setdefault(name, []).append(f"{name}{_labels(labels)} {value}")
+        for name, labels, value in samples:
+            series.setdefault(name, []).append(f"{name}{_labels(tuple(labels.items()))} {value}")
+
+        output = []
+        for name, lines in series.items():
+            kind, description = METRIC_HELP.get(name, ("untyped", name))
+            output.append(f"# HELP {name} {description}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(lines)
+        return "\n".join(output) + "\n"
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_label_value(v)}"' for k, v in labels) + "}"
+
+
+metrics = MetricsRegistry()
+
+
+def render_metrics():
+    """/metrics response body: recorded histograms plus current cache and pool state"""
+    cache = query_cache.stats()
+    samples = [
+        ("hr_cache_entries", {}, cache["entries"]),
+        ("hr_cache_hits_total", {}, cache["hits"]),
+        ("hr_cache_misses_total", {}, cache["misses"]),
+        ("hr_cache_hit_ratio", {}, cache["hit_rate"]),
+    ]
+    pools = []
+    if _pool is not None:
+        pools.append(_pool.stats())
+    if _async_pool is not None:
+        stats = _async_pool.get_stats()
+        pools.append({
+            "max": stats["pool_max"],
+            "in_use": stats["pool_size"] - stats["pool_available"],
+            "idle": stats["pool_available"],
+        })
+    if pools:
+        samples += [
+            ("hr_pool_connections", {"state": state}, sum(pool[state] for pool in pools))
+            for state in ("in_use", "idle", "max")
+        ]
+    gate = admission.stats()
+    samples += [("hr_admission_queries", {"state": state}, gate[state]) for state in ("in_flight", "waiting")]
+    return metrics.render(samples)
+
+
+class ToolCall:
+    """Per-call accumulator for the database share of a tool call"""
+    __slots__ = ("tool", "db_seconds", "rows")
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+# The ToolCall of the tool being run; copied into the worker threads and
+# asyncio tasks a tool starts, so nested tool calls add their share to it
+_current_call = contextvars.ContextVar("hr_tool_call", default=None)
+_call_lock = threading.Lock()
+
+# Recorded for every tool call, in this order
+TOOL_HISTOGRAMS = (
+    "hr_tool_duration_seconds", "hr_tool_db_seconds", "hr_tool_serialization_seconds",
+    "hr_tool_rows", "hr_tool_response_bytes",
+)
+
+
+def current_call():
+    """The ToolCall of the tool running in this context, if metrics are enabled"""
+    return _current_call.get()
+
+
+_tool_histograms = {}
+
+
+def record_tool_call(call, elapsed, response):
+    """Observe a finished tool call: latency, database time, rows, response size and errors"""
+    histograms = _tool_histograms.get(call.tool)
+    if histograms is None:
+        histograms = _tool_histograms.setdefault(
+            call.tool, [metrics.histogram(metric, tool=call.tool) for metric in TOOL_HISTOGRAMS]
+        )
+    values = (elapsed, call.db_seconds, max(elapsed - call.db_seconds, 0.0), call.rows, len(response))
+    with metrics.lock:
+        for histogram, value in zip(histograms, values):
+            histogram.observe(value)
+    if response.startswith("{") and '"error"' in response[:16]:
+        metrics.increment("hr_tool_errors_total", tool=call.tool)
+
+
+def instrumented(tool):
+    """Record latency, database time, rows and response size of an MCP tool
+
+    Apply below @threaded_tool (or @mcp.tool()); functools.wraps keeps the
+    signature and docstring that FastMCP turns into the tool schema.
+    """
+    name = tool.__name__
+
+    @contextmanager
+    def tracked():
+        outer = current_call()
+        call = ToolCall(name)
+        token = _current_call.set(call)
+        try:
+            yield call
+        finally:
+            _current_call.reset(token)
+            if outer is not None:
+                with _call_lock:  # Batch items finish on several threads at once
+                    outer.db_seconds += call.db_seconds
+                    outer.rows += call.rows
+
+    if inspect.iscoroutinefunction(tool):
+        @functools.wraps(tool)
+        async def async_wrapper(*args, **kwargs):
+            if not METRICS_ENABLED:
+                return await tool(*args, **kwargs)
+            started = time.perf_counter()
+            with tracked() as call:
+                response = await tool(*args, **kwargs)
+            record_tool_call(call, time.perf_counter() - started, response)
+            return response
+
+        return async_wrapper
+
+    @functools.wraps(tool)
+    def wrapper(*args, **kwargs):
+        if not METRICS_ENABLED:
+            return tool(*args, **kwargs)
+        started = time.perf_counter()
+        with tracked() as call:
+            response = tool(*args, **kwargs)
+        record_tool_call(call, time.perf_counter() - started, response)
+        return response
+
+    return wrapper
+
+
+class StatementTrackingCursor(psycopg2.extensions.cursor):
+    """Cursor that remembers its last statement and parameters (for the slow-query log)"""
+    last_statement = None
+
+    def execute(self, query, vars=None):
+        self.last_statement = (query, vars)
+        return super().execute(query, vars)
+
+
+_slow_log_lock = threading.Lock()
+
+
+def log_slow_query(conn, cursor, elapsed, call):
+    """Append a slow query, its parameters and its EXPLAIN (ANALYZE, BUFFERS) plan to SLOW_QUERY_LOG
+
+    The plan comes from running the statement again, so it only costs time
+    on requests that were already slow.
+    """
+    if cursor.last_statement is None:
+        return
+    sql, params = cursor.last_statement
+    entry = slow_query_entry(sql, params, elapsed, call)
+    if is_explainable(sql):
+        try:
+            with conn.cursor() as explain:
+                explain.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+                entry["plan"] = "\n".join(row[0] for row in explain.fetchall())
+        except psycopg2.Error as e:
+            conn.rollback()
+            entry["plan_error"] = str(e).strip()
+    write_slow_query(entry)
+
+
+def slow_query_entry(sql, params, elapsed, call):
+    return {
+        "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        "tool": call.tool if call is not None else None,
+        "duration_ms": round(elapsed * 1000, 3),
+        "sql": sql,
+        "parameters": params,
+    }
+
+
+def is_explainable(sql):
+    return sql.lstrip().split(None, 1)[0].upper() in ("SELECT", "WITH", "EXECUTE")
+
+
+def write_slow_query(entry):
+    metrics.increment("hr_slow_queries_total")
+    with _slow_log_lock:
+        with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+# -------------------------------
+# Query Result Cache
+# -------------------------------
+class QueryCache:
+    """Thread-safe LRU cache of serialized query results with per-table TTLs"""
+
+    def __init__(self, max_entries, default_ttl, ttls):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = ttls
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (table, key) -> (expires at, value, tables it depends on)
+        self._lock = threading.Lock()
+
+    def get(self, table, key):
+        """Return the cached value, or None on a miss or expired entry"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((table, key))
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end((table, key))
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[(table, key)]
+            self.misses += 1
+            return None
+
+    def put(self, table, key, value, depends_on=()):
+        """Cache a result; depends_on lists other tables whose changes invalidate it"""
+        tables = (table,) + tuple(t for t in depends_on if t != table)
+        ttl = min(self.ttls.get(t, self.default_ttl) for t in tables)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[(table, key)] = (time.monotonic() + ttl, value, tables)
+            self._entries.move_to_end((table, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, table=None):
+        """Drop cached results that depend on one table, or every cached result"""
+        with self._lock:
+            if table is None:
+                self._entries.clear()
+            else:
+                stale = [k for k, entry in self._entries.items() if table in entry[2]]
+                for cached_key in stale:
+                    del self._entries[cached_key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+query_cache = QueryCache(CACHE_MAX_ENTRIES, CACHE_DEFAULT_TTL, CACHE_TTLS)
+_listener_thread = None
+_listener_lock = threading.Lock()
+
+
+def _listen_for_invalidations():
+    """Invalidate cached results when upload_db.py reports a changed table
+
+    Runs on its own (unpooled) connection. While disconnected, the whole cache
+    is dropped and TTLs bound staleness until the listener reconnects.
+    """
+    while True:
+        try:
+            conn = psycopg2.connect(
+                host=PG_HOST, port=PG_PORT, database=PG_DB, user=PG_USER, password=PG_PASSWORD
+            )
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CACHE_INVALIDATION_CHANNEL}")
+            # Changes may have happened while no listener was connected
+            query_cache.invalidate()
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    query_cache.invalidate(notify.payload or None)
+        except Exception as e:
+            print(f"Cache invalidation listener error: {e}; retrying in 5s", file=sys.stderr)
+            query_cache.invalidate()
+            time.sleep(5)
+
+
+def start_cache_listener():
+    """Start the background LISTEN thread (snapshot mode: the snapshot watcher) once per process"""
+    global _listener_thread
+    if _listener_thread is None:
+        with _listener_lock:
+            if _listener_thread is None:
+                _listener_thread = threading.Thread(
+                    target=_watch_snapshot if SNAPSHOT_FILE is not None else _listen_for_invalidations,
+                    name="cache-invalidation",
+                    daemon=True
+                )
+                _listener_thread.start()
+
+# Names of the statements already PREPAREd on each pooled connection
+_prepared_statements = weakref.WeakKeyDictionary()
+
+
+def execute_prepared(cursor, name, definition, args):
+    """EXECUTE a named prepared statement, PREPAREing it on first use per connection
+
+    definition is the statement's "(types) AS query" part ("AS query" when
+    the query casts its parameters to their types). Prepared
+    statements outlive transactions, so each connection parses and plans the
+    query once and every later call only sends the arguments.
+    """
+    prepared = _prepared_statements.setdefault(cursor.connection, set())
+    if name not in prepared:
+        cursor.execute(f"PREPARE {name} {definition}")
+        prepared.add(name)
+    placeholders = ", ".join(["%s"] * len(args))
+    cursor.execute(f"EXECUTE {name} ({placeholders})", args)
+
+# -------------------------------
+# Admission Control
+# -------------------------------
+class Overloaded(Exception):
+    """A call turned away by admission control or a rate limit"""
+
+    def __init__(self, message, retry_after, reason):
+        super().__init__(message)
+        self.retry_after = retry_after  # Suggested wait before retrying, in seconds
+        self.reason = reason            # "busy" or "rate_limited"
+
+
+def overloaded_response(error):
+    """Tool response for a rejected call: the error plus a retry hint"""
+    if METRICS_ENABLED:
+        metrics.increment("hr_rejected_total", reason=error.reason)
+    return json.dumps({"error": str(error), "retry_after": error.retry_after}, ensure_ascii=False, indent=2)
+
+
+def on_event_loop():
+    """True on a thread running an asyncio event loop, where nothing may block"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class AdmissionGate:
+    """Bounded number of database queries in flight, with a short wait queue
+
+    Up to `limit` queries run at once and up to `queue_size` more wait, each
+    for at most `wait` seconds; any other query is rejected immediately, so
+    latency stays bounded under overload instead of every caller queueing on
+    the connection pool. admit() serves the worker threads MCP tools run on
+    (see threaded_tool), admit_async() the asyncio REST workers. Waiting
+    queries hold a worker thread, so limit + queue_size must stay below
+    anyio's default of 40 worker threads.
+    """
+
+    def __init__(self, limit, queue_size, wait):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(limit)
+        self._async_slots = None  # Created on first use, in the worker's event loop
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+
+    def _busy(self):
+        return Overloaded(
+            f"Server busy: {self.limit} queries running and {self.queue_size} waiting, try again shortly",
+            self.wait, "busy"
+        )
+
+    def _enqueue(self):
+        with self._lock:
+            if self._waiting >= self.queue_size:
+                raise self._busy()
+            self._waiting += 1
+
+    def _settle(self, waiting, in_flight):
+        with self._lock:
+            self._waiting += waiting
+            self._in_flight += in_flight
+
+    @contextmanager
+    def admit(self):
+        if not self._slots.acquire(blocking=False):
+            if on_event_loop():
+                # Waiting here would stall every session sharing the loop,
+                # including the queries that would free a slot
+                raise self._busy()
+            self._enqueue()
+            try:
+                admitted = self._slots.acquire(timeout=self.wait)
+            finally:
+                self._settle(-1, 0)
+            if not admitted:
+                raise self._busy()
+        self._settle(0, 1)
+        try:
+            yield
+        finally:
+            self._settle(0, -1)
+            self._slots.release()
+
+    @asynccontextmanager
+    async def admit_async(self):
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.limit)
+        slots = self._async_slots
+        if slots.locked():
+            self._enqueue()
+            try:
+                await asyncio.wait_for(slots.acquire(), self.wait)
+            except asyncio.TimeoutError:
+                raise self._busy() from None
+            finally:
+                self._settle(-1, 0)
+        else:
+            await slots.acquire()
+        self._settle(0, 1)
+        try:
+            yield
+        finally:
+            self._settle(0, -1)
+            slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {"limit": self.limit, "in_flight": self._in_flight, "waiting": self._waiting}
+
+
+class RateLimiter:
+    """Token bucket per client: `rate` calls per second sustained, bursts of up to `burst`"""
+
+    def __init__(self, rate, burst, max_clients):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client -> (tokens, last call), least recently seen first
+        self._lock = threading.Lock()
+
+    def check(self, client):
+        """Take a token for client, or raise Overloaded with the time until the next one"""
+        if client is None or not self.rate:
+            return
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            admitted = tokens >= 1
+            self._buckets[client] = (tokens - 1 if admitted else tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        if not admitted:
+            raise Overloaded(
+                f"Rate limit exceeded ({self.rate:g} calls per second)",
+                round((1 - tokens) / self.rate, 3), "rate_limited"
+            )
+
+
+admission = AdmissionGate(MAX_INFLIGHT_QUERIES, ADMISSION_QUEUE_SIZE, ADMISSION_WAIT_SECONDS)
+rate_limiter = RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, RATE_LIMIT_CLIENTS)
+
+_statement_timeouts = weakref.WeakKeyDictionary()  # connection -> statement_timeout set on it (ms)
+
+
+def statement_timeout(tool):
+    """statement_timeout (ms) for the queries of a tool"""
+    return STATEMENT_TIMEOUTS.get(tool, STATEMENT_TIMEOUT_MS)
+
+
+def mcp_client():
+    """Rate limit key of the MCP session making the current call (None outside one, e.g. --test)"""
+    try:
+        context = mcp.get_context()
+        return context.client_id or f"session-{id(context.session)}"
+    except ValueError:
+        return None
+
+# -------------------------------
+# Database Access for Tools
+# -------------------------------
+class DatabaseQuery:
+    """A statement a tool needs run; the tool yields it and is sent back the rows"""
+    __slots__ = ("sql", "params", "server_side", "prepared")
+
+    def __init__(self, sql, params=(), server_side=False, prepared=None):
+        self.sql = sql
+        self.params = params
+        self.server_side = server_side  # Stream the rows from a server-side cursor
+        self.prepared = prepared        # Prepared statement name; sql then uses $n placeholders
+
+
+def fetch_rows(query, timeout=None):
+    """Run a DatabaseQuery on the psycopg2 pool (or the snapshot) and return all rows
+
+    The query first needs a slot from the admission gate (Overloaded when
+    none frees up in time); timeout is its statement_timeout in ms.
+    """
+    with admission.admit():
+        if SNAPSHOT_FILE is not None:
+            return fetch_snapshot_rows(query, current_call(), timeout)
+        with db_cursor(server_side=query.server_side, timeout=timeout) as cursor:
+            if query.prepared:
+                execute_prepared(cursor, query.prepared, f"AS {query.sql}", query.params)
+            else:
+                cursor.execute(query.sql, query.params)
+            rows = []
+            while True:
+                batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+                rows.extend(batch)
+                if len(batch) < FETCH_BATCH_SIZE:
+                    break
+    return rows
+
+
+def database_tool(steps):
+    """Run a tool written as a generator of DatabaseQuery objects
+
+    The generator validates its arguments, yields each query it needs and
+    returns the response; database errors are raised at the yield, so the
+    tool's own error handling applies. The decorated function answers the
+    queries on the psycopg2 pool (MCP transports, on a worker thread: see
+    threaded_tool); its run_async attribute
+    answers them on the asyncio pool of the production REST API.
+    
+    Calls over the MCP session's rate limit, and queries the admission gate
+    turns away, end the call with an error carrying a retry hint.
+    """
+    @functools.wraps(steps)
+    def tool(*args, **kwargs):
+        try:
+            rate_limiter.check(mcp_client())
+        except Overloaded as e:
+            return overloaded_response(e)
+        timeout = statement_timeout(steps.__name__)
+        pending = steps(*args, **kwargs)
+        try:
+            query = next(pending)
+            while True:
+                try:
+                    rows = fetch_rows(query, timeout)
+                except Overloaded as e:
+                    pending.close()
+                    return overloaded_response(e)
+                except Exception as e:
+                    query = pending.throw(e)
+                else:
+                    query = pending.send(rows)
+        except StopIteration as done:
+            return done.value
+
+    async def run_async(*args, **kwargs):
+        return await run_tool_async(steps.__name__, steps(*args, **kwargs))
+
+    tool.run_async = run_async
+    return tool
+
+# -------------------------------
+# Snapshot Mode
+# -------------------------------
+# The tools' SQL runs on the snapshot after snapshot.translate_sql; prepared
+# statements are rebuilt for SQLite from the snapshot's columns (see
+# SNAPSHOT_STATEMENTS). The file is only ever replaced whole, so it is opened
+# immutable and a watcher thread swaps in a new one when it appears.
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """The snapshot currently served (opened on first use)"""
+    global _snapshot
+    if _snapshot is None:
+        with _snapshot_lock:
+            if _snapshot is None:
+                _snapshot = snapshot.Snapshot(SNAPSHOT_FILE)
+    return _snapshot
+
+
+def _watch_snapshot():
+    """Swap in a new snapshot when upload_db.py replaces the file
+
+    The new file is opened and checked before it replaces the current one;
+    a broken or missing file is reported and the current snapshot stays.
+    Requests already reading the old file finish on it.
+    """
+    global _snapshot
+    while True:
+        time.sleep(SNAPSHOT_POLL_SECONDS)
+        try:
+            if _snapshot is not None and snapshot.file_identity(SNAPSHOT_FILE) == _snapshot.identity:
+                continue
+            replacement = snapshot.Snapshot(SNAPSHOT_FILE)
+        except Exception as e:
+            print(f"Snapshot reload error: {e}; keeping the current snapshot", file=sys.stderr)
+            continue
+        with _snapshot_lock:
+            _snapshot = replacement
+        query_cache.invalidate()
+        print(
+            f"Snapshot reloaded: {SNAPSHOT_FILE} (created {replacement.info.get('created_at')})",
+            file=sys.stderr
         )
-        _cursor = _conn.cursor()
-    return _conn, _cursor
+
+
+def fetch_snapshot_rows(query, call, timeout=None):
+    """Run a DatabaseQuery on the snapshot and return all rows
+
+    Reads are in-process and take well under a millisecond for key lookups,
+    so the asyncio path calls this directly as well.
+    """
+    snap = get_snapshot()
+    if query.prepared:
+        sql, json_columns = snap.statement(query.prepared, SNAPSHOT_STATEMENTS[query.prepared])
+    else:
+        sql, json_columns = snapshot.translate_sql(query.sql), ()
+    params = snapshot.adapt_params(query.params)
+    started = time.perf_counter()
+    rows = snap.execute(sql, params, timeout)
+    elapsed = time.perf_counter() - started
+    if json_columns:
+        rows = [
+            tuple(json.loads(v) if i in json_columns and v is not None else v for i, v in enumerate(row))
+            for row in rows
+        ]
+    if call is not None:
+        call.db_seconds += elapsed
+        call.rows += len(rows)
+    if SLOW_QUERY_MS is not None and elapsed * 1000 >= SLOW_QUERY_MS:
+        entry = slow_query_entry(sql, params, elapsed, call)
+        entry["plan"] = "\n".join(row[-1] for row in snap.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+        write_slow_query(entry)
+    return rows
+
+
+def snapshot_condition(expression, data_type, value):
+    """An equality filter on the snapshot, compared the way PostgreSQL compares the type
+
+    Numeric values are stored as text, so they are compared as numbers;
+    boolean filters accept the same words as the loader (schema.BOOLEAN_VALUES).
+    """
+    if snapshot.is_decimal(data_type):
+        return f"hr_number({expression}) = hr_number(%s)", value
+    if data_type == "boolean":
+        return f"{expression} = %s", schema.BOOLEAN_VALUES.get(str(value).strip().lower(), value)
+    return f"{expression} = %s", value
+
+# -------------------------------
+# Pagination Tokens
+# -------------------------------
+def encode_page_token(table, key_values):
+    """Opaque continuation token: the table and the key of the last row returned"""
+    payload = json.dumps({"t": table, "k": [str(v) for v in key_values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_page_token(table, token, key_count=None):
+    """Key values to resume after; raises ValueError for tokens from another query
+
+    key_count is the number of key values expected (default: the table's key).
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        key_values = payload["k"]
+    except Exception:
+        raise ValueError("Invalid page_token")
+    if key_count is None:
+        key_count = len(TABLE_KEYS[table])
+    if payload.get("t") != table or len(key_values) != key_count:
+        raise ValueError(f"page_token does not belong to a query on table {table}")
+    return key_values
+
+# -------------------------------
+# Schema Metadata and Response Rendering
+# -------------------------------
+_view_schemas = {}
+VIEW_COLUMNS_SQL = (
+    "SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute "
+    "WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped "
+    "ORDER BY attnum"
+)
+
+
+def get_table_schema(table):
+    """Column name -> data type for a table, in ordinal order
+
+    Tables come from the schema registry. Materialized views are read from
+    the catalog once and cached (information_schema does not list them).
+    """
+    if table in schema.TABLES:
+        return schema.column_types(table)
+    if SNAPSHOT_FILE is not None:
+        return get_snapshot().column_types(table)
+    if table not in _view_schemas:
+        with db_cursor() as cursor:
+            cursor.execute(VIEW_COLUMNS_SQL, (table,))
+            _view_schemas[table] = dict(cursor.fetchall())
+    return _view_schemas[table]
+
+
+def get_table_columns(table):
+    """Column names of a table in ordinal order"""
+    return list(get_table_schema(table))
+
+
+def date_range_conditions(expression, data_type, date_from, date_to):
+    """Conditions and parameters of an inclusive date range filter on one column
+
+    Dates must be ISO dates (YYYY-MM-DD). They are passed as text, which
+    PostgreSQL compares as dates and the snapshot (dates stored as ISO text)
+    compares as strings, so both give the same rows. On a partitioned table
+    the range prunes the scan to the partitions of the years it covers.
+    """
+    if data_type != "date":
+        raise ValueError(f"{expression.split('.')[-1]} is not a date column")
+    conditions, params = [], []
+    for name, value, operator in (("date_from", date_from, ">="), ("date_to", date_to, "<=")):
+        if value:
+            try:
+                value = date.fromisoformat(str(value).strip()).isoformat()
+            except ValueError:
+                raise ValueError(f"{name} must be a date (YYYY-MM-DD), got {value}")
+            conditions.append(f"{expression} {operator} %s")
+            params.append(value)
+    return conditions, params
+
+
+def date_column_for(table, date_column):
+    """The column a date range filter on table applies to"""
+    date_column = date_column or TABLE_DATE_COLUMNS.get(table)
+    if not date_column:
+        raise ValueError(f"Table {table} has no default date column, pass date_column")
+    return date_column
+
+
+def render_rows(columns, rows, next_page_token, output_format, truncated=False):
+    """Serialize a page of results
+
+    "json" is a list of row objects (one object per row, indented);
+    "compact" lists the column names once followed by one array per row,
+    without whitespace, which is far smaller for wide tables.
+    """
+    if output_format == "compact":
+        payload = {"columns": columns, "rows": rows, "next_page_token": next_page_token}
+        if truncated:
+            payload["truncated"] = True
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+    payload = {"rows": [dict(zip(columns, r)) for r in rows], "next_page_token": next_page_token}
+    if truncated:
+        payload["truncated"] = True
+    return json.dumps(payload, ensure_ascii=False, indent=2, default=str)
+
+
+def fit_to_budget(render, row_count, max_bytes):
+    """Largest n such that render(n) is at most max_bytes (UTF-8), or None"""
+    low, high = 0, row_count
+    while low < high:
+        mid = (low + high + 1) // 2
+        if len(render(mid).encode("utf-8")) <= max_bytes:
+            low = mid
+        else:
+            high = mid - 1
+    if len(render(low).encode("utf-8")) > max_bytes:
+        return None
+    return low
 
 # -------------------------------
 # Create FastMCP Server
 # -------------------------------
 mcp = FastMCP("HR Database Server")
 
+
+def threaded_tool(tool):
+    """Register a blocking tool with FastMCP as a coroutine run on a worker thread
+
+    FastMCP calls sync tools directly on its event loop, where each pool
+    checkout and query would stall every other SSE / streamable HTTP session.
+    The registered coroutine runs the tool on anyio's worker threads instead
+    (the MCP request context is copied along). The module-level function
+    stays synchronous for --test, benchmark.py and batch items.
+    """
+    @functools.wraps(tool)
+    async def call(*args, **kwargs):
+        return await anyio.to_thread.run_sync(functools.partial(tool, *args, **kwargs))
+
+    mcp.tool()(call)
+    return tool
+
 # -------------------------------
 # Define Query Tools
 # -------------------------------
-@mcp.tool()
+@threaded_tool
+@instrumented
+@database_tool
 def query_employees(
     table: str,
     limit: int = 10,
     employee_id: str = None,
-    department: str = None
+    department: str = None,
+    page_token: str = None,
+    columns: list[str] = None,
+    format: str = "json",
+    max_bytes: int = None,
+    date_from: str = None,
+    date_to: str = None,
+    date_column: str = None
 ) -> str:
     """
     Query employee database
     
+    Rows are returned in primary-key order. When more rows match, the response
+    includes next_page_token; pass it back as page_token (with the same
+    filters) to fetch the next page.
+    
     Args:
-        table: Table name (employee_master, remuneration, position_details, performance)
-        limit: Number of rows to return, default 10
+        table: Table name (employee_master, remuneration, position_details,
+            performance, leave_tracker, organisation_structure,
+            succession_planning, engagement_retention, risk_compliance,
+            diversity_inclusion, recruitment, advanced_analytics,
+            external_factors) or a read-only analytics view:
+            employee_summary (one row per employee: salary band, latest
+            review, engagement and flight risk), department_summary,
+            salary_band_summary (per department and salary band),
+            employee_hierarchy (every ancestor_id/employee_id pair on a
+            reporting line, with depth) or reporting_span (per employee:
+            org_level, direct_reports, total_reports, levels_below)
+        limit: Number of rows to return, default 10, at most 1000
         employee_id: Employee ID, optional
         department: Department, optional
+        page_token: Continuation token from a previous response, optional
+        columns: Only return these columns, optional (default all columns)
+        format: "json" (list of row objects, default) or "compact"
+            (column names once, then one array of values per row)
+        max_bytes: Response size budget in bytes (about 4 bytes per token),
+            optional; rows that do not fit are left for the next page and
+            the response is marked "truncated"
+        date_from: Only rows dated on or after this date (YYYY-MM-DD), optional
+        date_to: Only rows dated on or before this date (YYYY-MM-DD), optional
+        date_column: Date column date_from/date_to apply to, optional;
+            defaults to review_date (performance), leave_taken_start
+            (leave_tracker), incident_date (risk_compliance) and period_date
+            (external_factors), required for other tables
     
     Returns:
-        JSON-formatted query results
+        JSON object with "rows" (the query results) and "next_page_token"
+        (null on the last page)
     """
     # Table name whitelist
-    allowed_tables = ["employee_master", "remuneration", "position_details", "performance"]
-    if table not in allowed_tables:
+    if table not in ALLOWED_TABLES:
         return json.dumps({"error": f"Table {table} is not allowed"}, ensure_ascii=False, indent=2)
+    if format not in ("json", "compact"):
+        return json.dumps({"error": f"Unknown format {format}, use json or compact"}, ensure_ascii=False, indent=2)
+    
+    # Serve repeated calls from the result cache
+    start_cache_listener()
+    cache_key = (
+        limit, employee_id or None, department or None, page_token or None,
+        tuple(columns) if columns else None, format, max_bytes,
+        date_from or None, date_to or None, date_column or None
+    )
+    cached = query_cache.get(table, cache_key)
+    if cached is not None:
+        return cached
     
     try:
-        conn, cursor = get_db_connection()
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        limit = min(limit, MAX_QUERY_LIMIT)
+        key_columns = TABLE_KEYS[table]
+        
+        # Column projection, validated against the table schema; key columns are
+        # always selected because the continuation token is built from them
+        table_columns = get_table_columns(table)
+        if columns:
+            unknown = [c for c in columns if c not in table_columns]
+            if unknown:
+                raise ValueError(f"Unknown column(s) for table {table}: {', '.join(unknown)}")
+            output_columns = list(dict.fromkeys(columns))
+        else:
+            output_columns = table_columns
+        select_columns = output_columns + [c for c in key_columns if c not in output_columns]
         
         # Build SQL
-        sql = f"SELECT * FROM {table}"
+        sql = f"SELECT {', '.join(select_columns)} FROM {table}"
         params = []
         conditions = []
+        depends_on = ()
         
         if employee_id:
+            if "employee_id" not in table_columns:
+                raise ValueError(f"Table {table} has no employee_id column")
             conditions.append("employee_id = %s")
             params.append(employee_id)
         
         if department:
-            conditions.append("department = %s")
+            # Tables without their own department column are filtered by the
+            # department of the employee in employee_master
+            if "department" in table_columns:
+                conditions.append("department = %s")
+            elif "employee_id" in table_columns:
+                conditions.append(
+                    "employee_id IN (SELECT employee_id FROM employee_master WHERE department = %s)"
+                )
+                depends_on = ("employee_master",)
+            else:
+                raise ValueError(f"Table {table} cannot be filtered by department")
             params.append(department)
         
+        if date_from or date_to:
+            date_column = date_column_for(table, date_column)
+            if date_column not in table_columns:
+                raise ValueError(f"Unknown column {date_column} for table {table}")
+            date_conditions, date_params = date_range_conditions(
+                date_column, get_table_schema(table)[date_column], date_from, date_to
+            )
+            conditions += date_conditions
+            params += date_params
+        
+        # Keyset pagination: resume strictly after the last key of the previous page
+        if page_token:
+            key_values = decode_page_token(table, page_token)
+            conditions.append(
+                f"({', '.join(key_columns)}) > ({', '.join(['%s'] * len(key_columns))})"
+            )
+            params.extend(key_values)
+        
         if conditions:
             sql += " WHERE " + " AND ".join(conditions)
         
-        sql += f" LIMIT {limit}"
+        # One extra row tells us whether another page exists
+        sql += f" ORDER BY {', '.join(key_columns)} LIMIT %s"
+        params.append(limit + 1)
         
-        # Execute query
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
-        result = [dict(zip(columns, r)) for r in rows]
+        # Execute query on a pooled connection; large pages stream from a server-side cursor
+        rows = yield DatabaseQuery(sql, params, server_side=limit > FETCH_BATCH_SIZE)
         
-        return json.dumps(result, ensure_ascii=False, indent=2, default=str)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        key_positions = [select_columns.index(c) for c in key_columns]
+        width = len(output_columns)
+        
+        def render(n):
+            """Response containing the first n rows"""
+            truncated = n < len(rows)
+            next_page_token = None
+            if n and (has_more or truncated):
+                next_page_token = encode_page_token(table, [rows[n - 1][i] for i in key_positions])
+            return render_rows(
+                output_columns, [list(r[:width]) for r in rows[:n]], next_page_token, format, truncated
+            )
+        
+        if max_bytes is None:
+            response = render(len(rows))
+        else:
+            fitted = fit_to_budget(render, len(rows), int(max_bytes))
+            if fitted is None or (fitted == 0 and rows):
+                raise ValueError(f"max_bytes={max_bytes} is too small for a single row")
+            response = render(fitted)
+        
+        query_cache.put(table, cache_key, response, depends_on=depends_on)
+        return response
     
     except Exception as e:
         return json.dumps({"error": f"Query failed: {str(e)}"}, ensure_ascii=False, indent=2)
 
+# Arguments a query_employees_batch item may carry
+QUERY_ARGUMENTS = tuple(inspect.signature(query_employees).parameters)
+
+# Worker threads running batch items on MCP transports; one per pooled connection
+_batch_threads = anyio.CapacityLimiter(PG_POOL_MAX)
+
+
+def parse_batch(queries):
+    """Validate every batch item before any of them runs
+
+    Returns one entry per item: its query_employees arguments, or the error
+    response (a JSON string) for an invalid item. Raises ValueError when the
+    batch itself is malformed.
+    """
+    if not isinstance(queries, list) or not queries:
+        raise ValueError("Provide a non-empty list of queries")
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise ValueError(f"At most {MAX_BATCH_QUERIES} queries per batch")
+    
+    parsed = []
+    for position, query in enumerate(queries):
+        try:
+            if not isinstance(query, dict):
+                raise ValueError("must be an object of query_employees arguments")
+            unknown = [k for k in query if k not in QUERY_ARGUMENTS]
+            if unknown:
+                raise ValueError(f"unknown argument(s) {', '.join(unknown)}")
+            arguments = dict(query)
+            if arguments.get("table") not in ALLOWED_TABLES:
+                raise ValueError(f"Table {arguments.get('table')} is not allowed")
+            columns = arguments.get("columns")
+            if isinstance(columns, str):
+                arguments["columns"] = [c.strip() for c in columns.split(",") if c.strip()]
+            elif columns is not None and (
+                not isinstance(columns, list) or not all(isinstance(c, str) for c in columns)
+            ):
+                raise ValueError("columns must be a list of column names")
+            for name, value in arguments.items():
+                if name != "columns" and isinstance(value, (list, dict)):
+                    raise ValueError(f"{name} must be a single value")
+            parsed.append(arguments)
+        except ValueError as e:
+            parsed.append(json.dumps({"error": f"Query {position}: {e}"}, ensure_ascii=False, indent=2))
+    return parsed
+
+
+def batch_response(responses):
+    """Combine query_employees responses, in order, without parsing them again"""
+    return '{"results": [\n' + ",\n".join(responses) + "\n]}"
+
+
+@mcp.tool()
+@instrumented
+async def query_employees_batch(queries: list[dict]) -> str:
+    """
+    Run several query_employees lookups in one call
+    
+    Use this when a question needs several independent lookups (e.g.
+    remuneration of five employees plus one department's performance rows).
+    The queries run concurrently; a failing query does not affect the others.
+    
+    Args:
+        queries: Up to 20 objects holding query_employees arguments: table
+            (required), limit, employee_id, department, page_token, columns,
+            format, max_bytes, date_from, date_to and date_column
+    
+    Returns:
+        JSON object with "results": one query_employees response per query,
+        in the order given (an object with "error" for a query that failed)
+    """
+    try:
+        rate_limiter.check(mcp_client())
+    except Overloaded as e:
+        return overloaded_response(e)
+    try:
+        parsed = parse_batch(queries)
+    except ValueError as e:
+        return json.dumps({"error": str(e)}, ensure_ascii=False, indent=2)
+    
+    async def run(item):
+        if not isinstance(item, dict):
+            return item
+        return await anyio.to_thread.run_sync(
+            functools.partial(query_employees, **item), limiter=_batch_threads
+        )
+    
+    return batch_response(await asyncio.gather(*(run(item) for item in parsed)))
+
+# Aggregate functions accepted by aggregate_employees, and the column types they need
+AGGREGATE_FUNCTIONS = {
+    "count": None,
+    "count_distinct": None,
+    "min": None,
+    "max": None,
+    "sum": "numeric",
+    "avg": "numeric",
+}
+NUMERIC_TYPES = {"numeric", "integer", "bigint", "smallint", "real", "double precision"}
+MAX_GROUP_BY_COLUMNS = 3
+
+
+def resolve_column(table, name):
+    """Validate a column reference and return (SQL expression, owning table, data type)
+
+    Columns of other tables than employee_master may reference employee
+    attributes as "employee_master.<column>"; the caller then joins
+    employee_master on employee_id.
+    """
+    if "." in name:
+        owner, column = name.split(".", 1)
+        if owner not in (table, "employee_master") or (
+            owner != table and "employee_id" not in get_table_schema(table)
+        ):
+            raise ValueError(f"Column {name} cannot be used with table {table}")
+    else:
+        owner, column = table, name
+    table_schema = get_table_schema(owner)
+    if column not in table_schema:
+        raise ValueError(f"Unknown column {column} for table {owner}")
+    alias = "t" if owner == table else "e"
+    return f"{alias}.{column}", owner, table_schema[column]
+
+
+def parse_metric(table, spec):
+    """Turn "count", "avg:column" or "p90:column" into (SQL expression, tables used)"""
+    function, _, column = spec.partition(":")
+    function = function.strip().lower()
+    if function == "count" and not column:
+        return "COUNT(*)", {table}
+    if not column:
+        raise ValueError(f"Metric {spec} needs a column, e.g. {function}:base_salary")
+    expression, owner, data_type = resolve_column(table, column.strip())
+    percentile = re.fullmatch(r"p(\d{1,2}(?:\.\d+)?)", function)
+    if percentile:
+        if data_type not in NUMERIC_TYPES:
+            raise ValueError(f"Metric {spec} needs a numeric column ({column} is {data_type})")
+        fraction = float(percentile.group(1)) / 100
+        if SNAPSHOT_FILE is not None:
+            return f"hr_percentile({expression}, {fraction})", {table, owner}
+        return (
+            f"ROUND((percentile_cont({fraction}) WITHIN GROUP (ORDER BY {expression}))::numeric, 2)",
+            {table, owner}
+        )
+    if function not in AGGREGATE_FUNCTIONS:
+        raise ValueError(
+            f"Unknown metric {spec}; use count, count_distinct, sum, avg, min, max or pNN (e.g. p90)"
+        )
+    if AGGREGATE_FUNCTIONS[function] == "numeric" and data_type not in NUMERIC_TYPES:
+        raise ValueError(f"Metric {spec} needs a numeric column ({column} is {data_type})")
+    if SNAPSHOT_FILE is not None:
+        # Numeric values are text in the snapshot: aggregate them as decimals
+        decimal = snapshot.is_decimal(data_type)
+        if function == "count_distinct" and decimal:
+            return f"COUNT(DISTINCT hr_number({expression}))", {table, owner}
+        if function == "avg" or (decimal and function in ("sum", "min", "max")):
+            return f"hr_{function}({expression})", {table, owner}
+        if function == "sum" and data_type == "bigint":
+            # SUM(bigint) is numeric in PostgreSQL
+            return f"hr_sum(CAST({expression} AS TEXT))", {table, owner}
+    if function == "count_distinct":
+        return f"COUNT(DISTINCT {expression})", {table, owner}
+    if function == "avg":
+        return f"ROUND(AVG({expression}), 2)", {table, owner}
+    return f"{function.upper()}({expression})", {table, owner}
+
+
+@threaded_tool
+@instrumented
+@database_tool
+def aggregate_employees(
+    table: str,
+    metrics: list[str] = None,
+    group_by: list[str] = None,
+    filters: dict[str, str] = None,
+    order_by: str = None,
+    limit: int = 100,
+    date_from: str = None,
+    date_to: str = None,
+    date_column: str = None
+) -> str:
+    """
+    Compute HR statistics in the database (headcounts, averages, distributions)
+    
+    Prefer this over fetching rows with query_employees whenever the question
+    is about counts, totals, averages or distributions.
+    
+    Args:
+        table: Table name (employee_master, remuneration, position_details,
+            performance, leave_tracker, organisation_structure,
+            succession_planning, engagement_retention, risk_compliance,
+            diversity_inclusion, recruitment, advanced_analytics,
+            external_factors) or a read-only analytics view:
+            employee_summary (one row per employee: salary band, latest
+            review, engagement and flight risk), department_summary,
+            salary_band_summary (per department and salary band),
+            employee_hierarchy (every ancestor_id/employee_id pair on a
+            reporting line, with depth) or reporting_span (per employee:
+            org_level, direct_reports, total_reports, levels_below)
+        metrics: Aggregates to compute, default ["count"]. Each is "count",
+            "count_distinct:<column>", "sum:<column>", "avg:<column>",
+            "min:<column>", "max:<column>" or a percentile "pNN:<column>"
+            (e.g. "p90:base_salary")
+        group_by: Up to 3 columns to group by, optional
+        filters: Column -> value equality filters, optional
+        order_by: A group_by column or metric to sort by; prefix with "-" for
+            descending, optional (default: group_by columns)
+        limit: Maximum number of groups to return, default 100
+        date_from: Only rows dated on or after this date (YYYY-MM-DD), optional
+        date_to: Only rows dated on or before this date (YYYY-MM-DD), optional
+        date_column: Date column date_from/date_to apply to, optional (same
+            defaults as query_employees)
+    
+    Columns of employee_master can be used from the other tables as
+    "employee_master.<column>" (e.g. group remuneration by
+    "employee_master.department").
+    
+    Returns:
+        JSON object with "rows", one object per group holding the group_by
+        values and the metrics
+    """
+    if table not in ALLOWED_TABLES:
+        return json.dumps({"error": f"Table {table} is not allowed"}, ensure_ascii=False, indent=2)
+    
+    metrics = metrics or ["count"]
+    group_by = group_by or []
+    filters = filters or {}
+    
+    start_cache_listener()
+    cache_key = (
+        "aggregate", tuple(metrics), tuple(group_by),
+        tuple(sorted(filters.items())), order_by, limit,
+        date_from or None, date_to or None, date_column or None
+    )
+    cached = query_cache.get(table, cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        limit = min(limit, MAX_QUERY_LIMIT)
+        if len(group_by) > MAX_GROUP_BY_COLUMNS:
+            raise ValueError(f"At most {MAX_GROUP_BY_COLUMNS} group_by columns are supported")
+        
+        tables_used = {table}
+        group_expressions = []
+        decimal_outputs = set()  # Snapshot mode: outputs sorted as numbers, not text
+        for name in group_by:
+            expression, owner, data_type = resolve_column(table, name)
+            if snapshot.is_decimal(data_type):
+                decimal_outputs.add(len(group_expressions))
+            group_expressions.append(expression)
+            tables_used.add(owner)
+        
+        metric_expressions = []
+        for spec in metrics:
+            expression, owners = parse_metric(table, spec)
+            if expression.startswith("hr_"):
+                decimal_outputs.add(len(group_expressions) + len(metric_expressions))
+            metric_expressions.append(expression)
+            tables_used |= owners
+        
+        conditions = []
+        params = []
+        for name, value in filters.items():
+            expression, owner, data_type = resolve_column(table, name)
+            if SNAPSHOT_FILE is not None:
+                condition, value = snapshot_condition(expression, data_type, value)
+            else:
+                condition = f"{expression} = %s"
+            conditions.append(condition)
+            params.append(value)
+            tables_used.add(owner)
+        
+        if date_from or date_to:
+            expression, owner, data_type = resolve_column(table, date_column_for(table, date_column))
+            date_conditions, date_params = date_range_conditions(expression, data_type, date_from, date_to)
+            conditions += date_conditions
+            params += date_params
+            tables_used.add(owner)
+        
+        output_names = list(group_by) + list(metrics)
+        output_expressions = group_expressions + metric_expressions
+        
+        def order_term(position):
+            if SNAPSHOT_FILE is not None and position in decimal_outputs:
+                return f"hr_number({output_expressions[position]})"
+            return str(position + 1)
+        
+        order_terms = []
+        if order_by:
+            descending = order_by.startswith("-")
+            name = order_by.lstrip("-")
+            if name not in output_names:
+                raise ValueError(f"order_by must be one of: {', '.join(output_names)}")
+            order_terms.append(f"{order_term(output_names.index(name))}{' DESC' if descending else ''}")
+        order_terms += [order_term(i) for i in range(len(group_expressions))]
+        
+        # Build SQL
+        sql = f"SELECT {', '.join(output_expressions)} FROM {table} t"
+        if table != "employee_master" and "employee_master" in tables_used:
+            sql += " JOIN employee_master e ON e.employee_id = t.employee_id"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if group_expressions:
+            sql += f" GROUP BY {', '.join(str(i + 1) for i in range(len(group_expressions)))}"
+        if order_terms:
+            sql += f" ORDER BY {', '.join(order_terms)}"
+        sql += " LIMIT %s"
+        params.append(limit)
+        
+        rows = yield DatabaseQuery(sql, params)
+        result = [dict(zip(output_names, r)) for r in rows]
+        
+        response = json.dumps({"rows": result}, ensure_ascii=False, indent=2, default=str)
+        query_cache.put(table, cache_key, response, depends_on=tables_used)
+        return response
+    
+    except Exception as e:
+        return json.dumps({"error": f"Aggregation failed: {str(e)}"}, ensure_ascii=False, indent=2)
+
+# One row per employee: the employee_master record plus nested remuneration,
+# position and performance history, joined on employee_id (a prepared statement)
+EMPLOYEE_PROFILE_SQL = """
+SELECT
+    to_json(e) AS employee,
+    to_json(r) AS remuneration,
+    COALESCE(p.positions, '[]'::json) AS positions,
+    COALESCE(f.reviews, '[]'::json) AS performance
+FROM employee_master e
+LEFT JOIN remuneration r ON r.employee_id = e.employee_id
+LEFT JOIN LATERAL (
+    SELECT json_agg(pd ORDER BY pd.position_title) AS positions
+    FROM position_details pd
+    WHERE pd.employee_id = e.employee_id
+) p ON true
+LEFT JOIN LATERAL (
+    SELECT json_agg(pf ORDER BY pf.review_date DESC) AS reviews
+    FROM performance pf
+    WHERE pf.employee_id = e.employee_id
+) f ON true
+WHERE e.employee_id = ANY($1::varchar[])
+ORDER BY array_position($1::varchar[], e.employee_id)
+"""
+PROFILE_TABLES = ("employee_master", "remuneration", "position_details", "performance")
+
+
+def snapshot_json_row(snap, table, alias):
+    """SQLite json_object of a snapshot row, with the values to_json would give"""
+    fields = []
+    for column, data_type in snap.column_types(table).items():
+        value = f"{alias}.{column}"
+        if snapshot.is_decimal(data_type):
+            value = f"json({value})"
+        elif data_type == "boolean":
+            value = f"CASE {value} WHEN 1 THEN json('true') WHEN 0 THEN json('false') END"
+        fields.append(f"'{column}', {value}")
+    return f"json_object({', '.join(fields)})"
+
+
+def employee_profile_snapshot_sql(snap):
+    """EMPLOYEE_PROFILE_SQL for the snapshot; every column is returned as JSON text"""
+    sql = f"""
+SELECT
+    {snapshot_json_row(snap, "employee_master", "e")},
+    CASE WHEN r.employee_id IS NOT NULL THEN {snapshot_json_row(snap, "remuneration", "r")} END,
+    (SELECT json_group_array(json(item)) FROM (
+        SELECT {snapshot_json_row(snap, "position_details", "pd")} AS item
+        FROM position_details pd
+        WHERE pd.employee_id = e.employee_id
+        ORDER BY pd.position_title
+    )),
+    (SELECT json_group_array(json(item)) FROM (
+        SELECT {snapshot_json_row(snap, "performance", "pf")} AS item
+        FROM performance pf
+        WHERE pf.employee_id = e.employee_id
+        ORDER BY pf.review_date DESC
+    ))
+FROM json_each(?) j
+JOIN employee_master e ON e.employee_id = j.value
+LEFT JOIN remuneration r ON r.employee_id = e.employee_id
+ORDER BY j.key
+"""
+    return sql, (0, 1, 2, 3)
+
+
+# Prepared statement name -> builder of its snapshot form: (SQL, JSON columns)
+SNAPSHOT_STATEMENTS = {
+    "employee_profile": employee_profile_snapshot_sql,
+}
+
+
+@threaded_tool
+@instrumented
+@database_tool
+def get_employee_profiles(employee_ids: list[str]) -> str:
+    """
+    Get complete employee records in one call: personal and job details,
+    remuneration, positions and performance review history
+    
+    Use this instead of several query_employees calls when the question is
+    about specific employees ("tell me about E012", "compare E003 and E007").
+    
+    Args:
+        employee_ids: One or more employee IDs (at most 100)
+    
+    Returns:
+        JSON object with "profiles" (one per employee found, in the order
+        requested; positions and performance are lists) and "not_found"
+    """
+    employee_ids = list(dict.fromkeys(i.strip() for i in (employee_ids or []) if i and i.strip()))
+    if not employee_ids:
+        return json.dumps({"error": "Provide at least one employee ID"}, ensure_ascii=False, indent=2)
+    if len(employee_ids) > MAX_PROFILE_BATCH:
+        return json.dumps(
+            {"error": f"At most {MAX_PROFILE_BATCH} employee IDs per call"}, ensure_ascii=False, indent=2
+        )
+    
+    start_cache_listener()
+    cache_key = ("profile", tuple(employee_ids))
+    cached = query_cache.get("employee_master", cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        rows = yield DatabaseQuery(EMPLOYEE_PROFILE_SQL, [employee_ids], prepared="employee_profile")
+        
+        profiles = []
+        for employee, remuneration, positions, performance in rows:
+            # employee_id is already on the profile itself
+            for record in [remuneration or {}] + positions + performance:
+                record.pop("employee_id", None)
+            employee["remuneration"] = remuneration
+            employee["positions"] = positions
+            employee["performance"] = performance
+            profiles.append(employee)
+        found = {p["employee_id"] for p in profiles}
+        
+        response = json.dumps(
+            {"profiles": profiles, "not_found": [i for i in employee_ids if i not in found]},
+            ensure_ascii=False, indent=2, default=str
+        )
+        query_cache.put("employee_master", cache_key, response, depends_on=PROFILE_TABLES)
+        return response
+    
+    except Exception as e:
+        return json.dumps({"error": f"Profile lookup failed: {str(e)}"}, ensure_ascii=False, indent=2)
+
+# -------------------------------
+# Org Hierarchy Tools
+# -------------------------------
+# Lookups on the employee_hierarchy closure table and reporting_span view
+# (schema.VIEWS), refreshed by upload_db.py whenever employee_master changes
+HIERARCHY_COLUMNS = ["employee_id", "full_name", "job_title", "department", "manager_id"]
+HIERARCHY_TABLES = ("employee_master", "reporting_span")
+SPAN_COLUMNS = ["org_level", "direct_reports", "total_reports", "levels_below"]
+
+REPORTING_CHAIN_SQL = f"""
+SELECT h.depth, {', '.join('e.' + c for c in HIERARCHY_COLUMNS)}
+FROM employee_hierarchy h
+JOIN employee_master e ON e.employee_id = h.ancestor_id
+WHERE h.employee_id = %s
+ORDER BY h.depth
+"""
+
+
+@threaded_tool
+@instrumented
+@database_tool
+def get_reporting_chain(employee_id: str) -> str:
+    """
+    Get an employee's chain of command: their manager, that manager's
+    manager and so on up to the top of the organisation
+    
+    Args:
+        employee_id: Employee ID
+    
+    Returns:
+        JSON object with "employee", "org_level" (number of managers above
+        the employee; 0 for the top of the organisation) and "chain" (the
+        managers from the direct manager upwards, each with levels_up)
+    """
+    employee_id = (employee_id or "").strip()
+    if not employee_id:
+        return json.dumps({"error": "Provide an employee ID"}, ensure_ascii=False, indent=2)
+    
+    start_cache_listener()
+    cache_key = ("reporting_chain", employee_id)
+    cached = query_cache.get("employee_hierarchy", cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        rows = yield DatabaseQuery(REPORTING_CHAIN_SQL, [employee_id])
+        if not rows:
+            raise ValueError(f"Employee {employee_id} not found")
+        chain = [{"levels_up": row[0], **dict(zip(HIERARCHY_COLUMNS, row[1:]))} for row in rows[1:]]
+        response = json.dumps(
+            {"employee": dict(zip(HIERARCHY_COLUMNS, rows[0][1:])), "org_level": len(chain), "chain": chain},
+            ensure_ascii=False, indent=2, default=str
+        )
+        query_cache.put("employee_hierarchy", cache_key, response, depends_on=HIERARCHY_TABLES)
+        return response
+    
+    except Exception as e:
+        return json.dumps({"error": f"Reporting chain lookup failed: {str(e)}"}, ensure_ascii=False, indent=2)
+
+
+@threaded_tool
+@instrumented
+@database_tool
+def get_subordinates(
+    manager_id: str,
+    max_depth: int = None,
+    limit: int = 100,
+    page_token: str = None
+) -> str:
+    """
+    Get everyone who reports to a manager, directly or indirectly
+    
+    Use this for questions like "who is in the Sales Manager's team" or
+    "everyone under E008"; look up the manager's employee ID first if only
+    a job title or name is known.
+    
+    Args:
+        manager_id: Employee ID of the manager
+        max_depth: Only return people at most this many levels below the
+            manager, optional (1 = direct reports only)
+        limit: Number of people to return, default 100, at most 1000
+        page_token: Continuation token from a previous response, optional
+    
+    Returns:
+        JSON object with the manager's "direct_reports", "total_reports"
+        and "levels_below", "rows" (people ordered by depth below the
+        manager, then employee ID) and "next_page_token" (null on the last
+        page)
+    """
+    manager_id = (manager_id or "").strip()
+    if not manager_id:
+        return json.dumps({"error": "Provide a manager ID"}, ensure_ascii=False, indent=2)
+    
+    start_cache_listener()
+    cache_key = ("subordinates", manager_id, max_depth, limit, page_token or None)
+    cached = query_cache.get("employee_hierarchy", cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        limit = min(limit, MAX_QUERY_LIMIT)
+        if max_depth is not None and int(max_depth) < 1:
+            raise ValueError("max_depth must be at least 1")
+        
+        spans = yield DatabaseQuery(
+            "SELECT direct_reports, total_reports, levels_below FROM reporting_span WHERE employee_id = %s",
+            [manager_id]
+        )
+        if not spans:
+            raise ValueError(f"Employee {manager_id} not found")
+        direct_reports, total_reports, levels_below = spans[0]
+        
+        token_scope = f"employee_hierarchy:{manager_id}"
+        rows = []
+        has_more = False
+        if total_reports:
+            conditions = ["h.ancestor_id = %s", "h.depth > 0"]
+            params = [manager_id]
+            if max_depth is not None:
+                conditions.append("h.depth <= %s")
+                params.append(int(max_depth))
+            # Keyset pagination on (depth, employee_id)
+            if page_token:
+                conditions.append("(h.depth, h.employee_id) > (%s, %s)")
+                params.extend(decode_page_token(token_scope, page_token, key_count=2))
+            params.append(limit + 1)
+            rows = yield DatabaseQuery(
+                f"SELECT h.depth, {', '.join('e.' + c for c in HIERARCHY_COLUMNS)} "
+                f"FROM employee_hierarchy h JOIN employee_master e ON e.employee_id = h.employee_id "
+                f"WHERE {' AND '.join(conditions)} "
+                f"ORDER BY h.depth, h.employee_id LIMIT %s",
+                params
+            )
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+        
+        next_page_token = None
+        if has_more:
+            next_page_token = encode_page_token(token_scope, [rows[-1][0], rows[-1][1]])
+        response = json.dumps(
+            {
+                "manager_id": manager_id,
+                "direct_reports": direct_reports,
+                "total_reports": total_reports,
+                "levels_below": levels_below,
+                "rows": [{"depth": row[0], **dict(zip(HIERARCHY_COLUMNS, row[1:]))} for row in rows],
+                "next_page_token": next_page_token
+            },
+            ensure_ascii=False, indent=2, default=str
+        )
+        query_cache.put("employee_hierarchy", cache_key, response, depends_on=HIERARCHY_TABLES)
+        return response
+    
+    except Exception as e:
+        return json.dumps({"error": f"Subordinate lookup failed: {str(e)}"}, ensure_ascii=False, indent=2)
+
+
+@threaded_tool
+@instrumented
+@database_tool
+def get_span_of_control(
+    employee_ids: list[str] = None,
+    department: str = None,
+    order_by: str = "direct_reports",
+    limit: int = 20
+) -> str:
+    """
+    Get org level and span of control: direct reports, everyone below and
+    how many levels deep each person's team goes
+    
+    Without employee_ids, returns the managers (people with at least one
+    direct report) with the largest spans, e.g. "who has the most direct
+    reports", "span of control per manager in Finance".
+    
+    Args:
+        employee_ids: Only these employees (managers or not), optional
+        department: Only employees of this department, optional
+        order_by: direct_reports (default), total_reports, levels_below or
+            org_level; sorted from highest to lowest
+        limit: Number of people to return, default 20, at most 1000
+    
+    Returns:
+        JSON object with "rows" (employee details plus org_level,
+        direct_reports, total_reports and levels_below) and, when
+        employee_ids are given, "not_found"
+    """
+    if order_by not in SPAN_COLUMNS:
+        return json.dumps(
+            {"error": f"order_by must be one of: {', '.join(SPAN_COLUMNS)}"}, ensure_ascii=False, indent=2
+        )
+    employee_ids = list(dict.fromkeys(i.strip() for i in (employee_ids or []) if i and i.strip()))
+    
+    start_cache_listener()
+    cache_key = ("span_of_control", tuple(employee_ids), department or None, order_by, limit)
+    cached = query_cache.get("reporting_span", cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        limit = min(limit, MAX_QUERY_LIMIT)
+        if employee_ids:
+            conditions = ["s.employee_id = ANY(%s::varchar[])"]
+            params = [employee_ids]
+        else:
+            conditions = ["s.direct_reports > 0"]
+            params = []
+        if department:
+            conditions.append("e.department = %s")
+            params.append(department)
+        params.append(limit)
+        
+        rows = yield DatabaseQuery(
+            f"SELECT {', '.join('e.' + c for c in HIERARCHY_COLUMNS)}, "
+            f"{', '.join('s.' + c for c in SPAN_COLUMNS)} "
+            f"FROM reporting_span s JOIN employee_master e ON e.employee_id = s.employee_id "
+            f"WHERE {' AND '.join(conditions)} "
+            f"ORDER BY s.{order_by} DESC, s.employee_id LIMIT %s",
+            params
+        )
+        result = {"rows": [dict(zip(HIERARCHY_COLUMNS + SPAN_COLUMNS, row)) for row in rows]}
+        if employee_ids:
+            found = {row["employee_id"] for row in result["rows"]}
+            result["not_found"] = [i for i in employee_ids if i not in found]
+        
+        response = json.dumps(result, ensure_ascii=False, indent=2, default=str)
+        query_cache.put("reporting_span", cache_key, response, depends_on=("employee_master",))
+        return response
+    
+    except Exception as e:
+        return json.dumps({"error": f"Span of control lookup failed: {str(e)}"}, ensure_ascii=False, indent=2)
+
+# -------------------------------
+# Employee Search Tool
+# -------------------------------
+# Ranked fuzzy search on the employee_search and employee_search_terms views
+# (schema.VIEWS); the distinct values carry a pg_trgm trigram index
+SEARCH_FIELDS = [column for columns in schema.SEARCH_FIELDS.values() for column in columns]
+# Cached searches depend on both views, which are refreshed (and notified) one at a time
+SEARCH_TABLES = tuple(schema.SEARCH_FIELDS) + ("employee_search", "employee_search_terms")
+SEARCH_COLUMNS = ["employee_id", "full_name", "job_title", "department"]
+SEARCH_MIN_SCORE = 0.25         # Values matching the query less well than this are left out
+MAX_SEARCH_LIMIT = 50           # Hard cap on employees returned by one search_employees call
+SEARCH_MATCHES_PER_RESULT = 5   # Matching values read per employee asked for (one employee can match in several fields)
+
+
+@threaded_tool
+@instrumented
+@database_tool
+def search_employees(query: str, fields: list[str] = None, department: str = None, limit: int = 10) -> str:
+    """
+    Find employees by name, job title, skills, qualifications, licences or
+    goals, tolerating typos and partial words
+    
+    Use this instead of query_employees whenever the exact value is not
+    known, e.g. "Sarah in Finance", "who holds a forklift licence",
+    "employees with Python skills".
+    
+    Args:
+        query: Words to look for, e.g. "sarah", "forklift licence"
+        fields: Only search these fields, optional (default all): full_name,
+            job_title, skills_required, qualifications, licenses_permits,
+            goals_objectives
+        department: Only employees of this department, optional
+        limit: Number of employees to return, default 10, at most 50
+    
+    Returns:
+        JSON object with "rows": employees ranked by score (1.0 when every
+        query word is found), each with the field values that matched
+    """
+    query = " ".join((query or "").split())
+    if not query:
+        return json.dumps({"error": "Provide words to search for"}, ensure_ascii=False, indent=2)
+    fields = list(dict.fromkeys(fields or SEARCH_FIELDS))
+    unknown = [f for f in fields if f not in SEARCH_FIELDS]
+    if unknown:
+        return json.dumps(
+            {"error": f"Unknown search fields: {', '.join(unknown)}. Available: {', '.join(SEARCH_FIELDS)}"},
+            ensure_ascii=False, indent=2
+        )
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return json.dumps({"error": "limit must be an integer"}, ensure_ascii=False, indent=2)
+    if limit < 1:
+        return json.dumps({"error": "limit must be at least 1"}, ensure_ascii=False, indent=2)
+    limit = min(limit, MAX_SEARCH_LIMIT)
+    
+    start_cache_listener()
+    cache_key = ("search", query.lower(), tuple(sorted(fields)), department or None, limit)
+    cached = query_cache.get("employee_search", cache_key)
+    if cached is not None:
+        return cached
+    
+    try:
+        candidates = limit * SEARCH_MATCHES_PER_RESULT
+        conditions = ["t.field = ANY(%s::varchar[])"]
+        params = [fields]
+        match = "s.field = t.field AND s.value_key = t.value_key"
+        if department:
+            conditions.append(f"EXISTS (SELECT 1 FROM employee_search s WHERE {match} AND s.department = %s)")
+            params.append(department)
+            match += " AND s.department = %s"
+        
+        # Best matching (field, value) pairs that some employee in scope has,
+        # then the employees holding them
+        if SNAPSHOT_FILE is not None:
+            # No trigram index in the snapshot: score every distinct value
+            terms = (
+                f"SELECT field, value_key, value, hr_word_similarity(%s, value) AS score "
+                f"FROM employee_search_terms t "
+                f"WHERE {' AND '.join(conditions)} ORDER BY score DESC, field, value LIMIT %s"
+            )
+            matches = f"JOIN employee_search s ON {match}"
+            params = [query, *params, candidates]
+        else:
+            # Nearest values first, straight from the GiST trigram index
+            terms = (
+                f"SELECT t.field, t.value_key, t.value, 1 - (%s <<<-> t.value) AS score "
+                f"FROM employee_search_terms t "
+                f"WHERE {' AND '.join(conditions)} ORDER BY %s <<<-> t.value, t.field, t.value LIMIT %s"
+            )
+            matches = (
+                f"CROSS JOIN LATERAL (SELECT s.employee_id, s.field, s.value FROM employee_search s "
+                f"WHERE {match} ORDER BY s.employee_id LIMIT %s) s"
+            )
+            params = [query, *params, query, candidates]
+        if department:
+            params.append(department)
+        if SNAPSHOT_FILE is None:
+            params.append(candidates)
+        # Scores are rounded to 3 decimals before the exact cut-off below
+        params += [SEARCH_MIN_SCORE - 0.0005, candidates]
+        
+        rows = yield DatabaseQuery(
+            f"SELECT {', '.join('e.' + c for c in SEARCH_COLUMNS)}, c.field, c.value, c.score FROM ("
+            f"SELECT s.employee_id, s.field, s.value, t.score FROM ({terms}) t {matches} "
+            f"WHERE t.score >= %s ORDER BY t.score DESC, s.employee_id LIMIT %s"
+            f") c JOIN employee_master e ON e.employee_id = c.employee_id "
+            f"ORDER BY c.score DESC, c.employee_id, c.field",
+            params
+        )
+        
+        results = {}
+        for row in rows:
+            score = round(row[-1], 3)
+            if score < SEARCH_MIN_SCORE:
+                break
+            employee = results.get(row[0])
+            if employee is None:
+                if len(results) == limit:
+                    continue
+                employee = results[row[0]] = {**dict(zip(SEARCH_COLUMNS, row)), "score": score, "matches": []}
+            employee["matches"].append({"field": row[-3], "value": row[-2], "score": score})
+        
+        response = json.dumps({"rows": list(results.values())}, ensure_ascii=False, indent=2, default=str)
+        query_cache.put("employee_search", cache_key, response, depends_on=SEARCH_TABLES)
+        return response
+    
+    except Exception as e:
+        return json.dumps({"error": f"Employee search failed: {str(e)}"}, ensure_ascii=False, indent=2)
+
+# -------------------------------
+# Monitoring Routes (SSE and streamable HTTP transports)
+# -------------------------------
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_route(request):
+    """Prometheus metrics"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health_route(request):
+    """Health check"""
+    health = {"status": "ok", "database": PG_DB, "cache": query_cache.stats(), "admission": admission.stats()}
+    if SNAPSHOT_FILE is not None:
+        snap = get_snapshot()
+        health["database"] = snap.path
+        health["snapshot_created_at"] = snap.info.get("created_at")
+    return JSONResponse(health)
+
+# -------------------------------
+# Production REST API (--https)
+# -------------------------------
+# Served by uvicorn worker processes. Each worker runs one event loop with
+# its own asyncio PostgreSQL pool (psycopg 3); tools run their SQL through
+# run_async, so a request waiting on the database does not hold a thread.
+_async_pool = None
+
+
+async def open_async_pool():
+    """Open this worker's asyncio connection pool"""
+    global _async_pool
+    _async_pool = AsyncConnectionPool(
+        min_size=PG_POOL_MIN,
+        max_size=PG_POOL_MAX,
+        timeout=PG_POOL_TIMEOUT,
+        open=False,
+        kwargs=dict(
+            host=PG_HOST,
+            port=PG_PORT,
+            dbname=PG_DB,
+            user=PG_USER,
+            password=PG_PASSWORD,
+            client_encoding="utf8"
+        )
+    )
+    await _async_pool.open()
+
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+
+async def load_view_schemas():
+    """Read the analytics view columns at startup so no request waits on the catalog"""
+    async with _async_pool.connection() as conn:
+        for view in schema.VIEWS:
+            try:
+                cursor = await conn.execute(VIEW_COLUMNS_SQL, (view,))
+                _view_schemas[view] = dict(await cursor.fetchall())
+            except psycopg.Error:
+                # Not created yet (create_db.py); queries on it report the error
+                await conn.rollback()
+
+
+async def fetch_rows_async(query, call, timeout=None):
+    """Run a DatabaseQuery on the asyncio pool (or the snapshot) and return all rows"""
+    async with admission.admit_async():
+        if SNAPSHOT_FILE is not None:
+            return fetch_snapshot_rows(query, call, timeout)
+        return await fetch_pool_rows_async(query, call, timeout)
+
+
+async def fetch_pool_rows_async(query, call, timeout):
+    started = time.perf_counter()
+    async with _async_pool.connection() as conn:
+        checked_out = time.perf_counter()
+        if METRICS_ENABLED:
+            metrics.observe("hr_pool_wait_seconds", checked_out - started)
+        if timeout is not None and _statement_timeouts.get(conn) != timeout:
+            await conn.execute(f"SET statement_timeout = {int(timeout)}")
+            await conn.commit()
+            _statement_timeouts[conn] = timeout
+        if query.prepared:
+            # psycopg prepares the statement on first use per connection
+            cursor = psycopg.AsyncRawCursor(conn)
+        elif query.server_side:
+            cursor = conn.cursor(name=f"query_{uuid.uuid4().hex}")
+            cursor.itersize = FETCH_BATCH_SIZE
+        else:
+            cursor = conn.cursor()
+        async with cursor:
+            if query.prepared:
+                await cursor.execute(query.sql, query.params, prepare=True)
+            else:
+                await cursor.execute(query.sql, query.params)
+            rows = []
+            while True:
+                batch = await cursor.fetchmany(FETCH_BATCH_SIZE)
+                rows.extend(batch)
+                if len(batch) < FETCH_BATCH_SIZE:
+                    break
+        elapsed = time.perf_counter() - checked_out
+        call.db_seconds += elapsed
+        call.rows += len(rows)
+        if SLOW_QUERY_MS is not None and elapsed * 1000 >= SLOW_QUERY_MS:
+            await log_slow_query_async(conn, query, elapsed, call)
+    return rows
+
+
+async def log_slow_query_async(conn, query, elapsed, call):
+    """log_slow_query for the asyncio pool"""
+    entry = slow_query_entry(query.sql, query.params, elapsed, call)
+    if is_explainable(query.sql):
+        try:
+            cursor = psycopg.AsyncRawCursor(conn) if query.prepared else conn.cursor()
+            async with cursor:
+                await cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query.sql}", query.params)
+                entry["plan"] = "\n".join(row[0] for row in await cursor.fetchall())
+        except psycopg.Error as e:
+            await conn.rollback()
+            entry["plan_error"] = str(e).strip()
+    write_slow_query(entry)
+
+
+async def run_tool_async(name, pending):
+    """Drive a database_tool generator on the asyncio pool, with @instrumented metrics
+
+    Overloaded propagates to the caller (rest_route answers it with 429).
+    """
+    call = ToolCall(name)
+    timeout = statement_timeout(name)
+    started = time.perf_counter()
+    try:
+        query = next(pending)
+        while True:
+            try:
+                rows = await fetch_rows_async(query, call, timeout)
+            except Overloaded:
+                pending.close()
+                raise
+            except Exception as e:
+                query = pending.throw(e)
+            else:
+                query = pending.send(rows)
+    except StopIteration as done:
+        response = done.value
+    if METRICS_ENABLED:
+        record_tool_call(call, time.perf_counter() - started, response)
+    return response
+
+
+def accepted_encodings(request):
+    """Content codings listed in Accept-Encoding, except those refused with q=0"""
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, weight = part.partition(";")
+        try:
+            q = float(weight.split("=", 1)[1]) if "=" in weight else 1.0
+        except ValueError:
+            q = 1.0
+        if q > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def json_response(request, body, status=200):
+    """JSON response, brotli or gzip compressed when large and the client accepts it"""
+    data = body.encode("utf-8")
+    headers = {"Vary": "Accept-Encoding"}
+    if len(data) >= COMPRESS_MIN_BYTES:
+        accepted = accepted_encodings(request)
+        if "br" in accepted:
+            data = brotli.compress(data, quality=BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif "gzip" in accepted:
+            data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+    return Response(data, status_code=status, headers=headers, media_type="application/json")
+
+
+class BadRequest(Exception):
+    """Malformed REST request (answered with 400)"""
+
+
+async def request_params(request):
+    """Query string parameters (GET) or the JSON body (POST), which must be an object"""
+    if request.method == "GET":
+        return dict(request.query_params)
+    body = await request.body()
+    if not body:
+        return {}
+    try:
+        params = json.loads(body)
+    except ValueError:
+        raise BadRequest("Request body must be valid JSON") from None
+    if params is None:
+        return {}
+    if not isinstance(params, dict):
+        raise BadRequest("Request body must be a JSON object")
+    return params
+
+
+def int_param(params, name, default=None):
+    """Integer request parameter (query string text or JSON number), default when absent"""
+    value = params.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        raise BadRequest(f"{name} must be an integer")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name} must be an integer") from None
+
+
+def rest_route(path, handler, methods=("GET", "POST"), rate_limited=True):
+    """Route for a handler returning a JSON string (or a Response)
+
+    Records the request latency, applies the per-client rate limit, answers
+    malformed requests (BadRequest) with 400, rejected calls (Overloaded) with
+    429 and a Retry-After header and turns other exceptions into a 500 error.
+    """
+    async def endpoint(request):
+        started = time.perf_counter()
+        try:
+            if rate_limited:
+                rate_limiter.check(request.client.host if request.client else None)
+            result = await handler(request)
+            response = result if isinstance(result, Response) else json_response(request, result)
+        except BadRequest as e:
+            response = json_response(request, json.dumps({"error": str(e)}, ensure_ascii=False), 400)
+        except Overloaded as e:
+            response = json_response(request, overloaded_response(e), 429)
+            response.headers["Retry-After"] = str(math.ceil(e.retry_after))
+        except Exception as e:
+            response = json_response(request, json.dumps({"error": str(e)}, ensure_ascii=False), 500)
+        if METRICS_ENABLED:
+            metrics.observe(
+                "hr_http_request_duration_seconds",
+                time.perf_counter() - started,
+                route=path,
+                method=request.method,
+                status=response.status_code
+            )
+        return response
+
+    return Route(path, endpoint, methods=list(methods))
+
+
+async def api_query(request):
+    """REST API query endpoint"""
+    params = await request_params(request)
+    columns = params.get("columns")
+    if isinstance(columns, str):
+        columns = [c.strip() for c in columns.split(",") if c.strip()]
+    return await query_employees.run_async(
+        table=params.get("table", "employee_master"),
+        limit=int_param(params, "limit", 10),
+        employee_id=params.get("employee_id"),
+        department=params.get("department"),
+        page_token=params.get("page_token"),
+        columns=columns,
+        format=params.get("format", "json"),
+        max_bytes=int_param(params, "max_bytes"),
+        date_from=params.get("date_from"),
+        date_to=params.get("date_to"),
+        date_column=params.get("date_column")
+    )
+
+
+async def api_query_batch(request):
+    """REST API batch query endpoint: {"queries": [query parameters, ...]}"""
+    params = await request_params(request)
+    try:
+        parsed = parse_batch(params.get("queries"))
+    except ValueError as e:
+        return json.dumps({"error": str(e)}, ensure_ascii=False, indent=2)
+    
+    async def run(item):
+        if not isinstance(item, dict):
+            return item
+        try:
+            return await query_employees.run_async(**item)
+        except Overloaded as e:
+            return overloaded_response(e)
+    
+    return batch_response(await asyncio.gather(*(run(item) for item in parsed)))
+
+
+async def api_aggregate(request):
+    """REST API aggregation endpoint"""
+    params = await request_params(request)
+    # metrics and group_by are lists or comma-separated strings (always the
+    # latter in a GET query string); filters is an object or its JSON text
+    try:
+        for key in ("metrics", "group_by"):
+            value = params.get(key)
+            if isinstance(value, str):
+                params[key] = [v.strip() for v in value.split(",") if v.strip()]
+            elif value is not None and (
+                not isinstance(value, list) or not all(isinstance(v, str) for v in value)
+            ):
+                raise ValueError(f"{key} must be a list of strings or a comma-separated string")
+        if isinstance(params.get("filters"), str):
+            try:
+                params["filters"] = json.loads(params["filters"])
+            except ValueError:
+                raise ValueError("filters must be a JSON object") from None
+        if params.get("filters") is not None and not isinstance(params["filters"], dict):
+            raise ValueError("filters must be a JSON object")
+    except ValueError as e:
+        return json.dumps({"error": str(e)}, ensure_ascii=False, indent=2)
+    return await aggregate_employees.run_async(
+        table=params.get("table", "employee_master"),
+        metrics=params.get("metrics"),
+        group_by=params.get("group_by"),
+        filters=params.get("filters"),
+        order_by=params.get("order_by"),
+        limit=int_param(params, "limit", 100),
+        date_from=params.get("date_from"),
+        date_to=params.get("date_to"),
+        date_column=params.get("date_column")
+    )
+
+
+async def api_profile(request):
+    """REST API employee profile endpoint"""
+    params = await request_params(request)
+    if request.method == "GET":
+        employee_ids = (params.get("employee_ids") or params.get("employee_id", "")).split(",")
+    else:
+        employee_ids = params.get("employee_ids") or [params.get("employee_id", "")]
+        if isinstance(employee_ids, str):
+            employee_ids = employee_ids.split(",")
+        if not isinstance(employee_ids, list) or not all(isinstance(i, str) for i in employee_ids):
+            raise BadRequest("employee_ids must be a list of employee ID strings")
+    return await get_employee_profiles.run_async(employee_ids=employee_ids)
+
+
+@asynccontextmanager
+async def http_lifespan(app):
+    """Worker startup and graceful shutdown: open the pool, then close it after in-flight requests"""
+    if SNAPSHOT_FILE is None:
+        await open_async_pool()
+        await load_view_schemas()
+    start_cache_listener()
+    try:
+        yield
+    finally:
+        await close_async_pool()
+        close_db_pool()
+
+
+def create_http_app():
+    """ASGI app of the REST API (uvicorn factory, called in every worker process)"""
+    global SLOW_QUERY_MS, SNAPSHOT_FILE
+    # Command line settings reach the worker processes through the environment
+    if os.environ.get("HR_SLOW_QUERY_MS"):
+        SLOW_QUERY_MS = float(os.environ["HR_SLOW_QUERY_MS"])
+    if os.environ.get("HR_RATE_LIMIT"):
+        rate_limiter.rate = float(os.environ["HR_RATE_LIMIT"])
+    if os.environ.get("HR_SNAPSHOT_FILE"):
+        SNAPSHOT_FILE = os.environ["HR_SNAPSHOT_FILE"]
+    return Starlette(
+        routes=[
+            rest_route("/query", api_query),
+            rest_route("/query/batch", api_query_batch, methods=("POST",)),
+            rest_route("/aggregate", api_aggregate),
+            rest_route("/profile", api_profile),
+            rest_route("/health", health_route, methods=("GET",), rate_limited=False),
+            rest_route("/metrics", metrics_route, methods=("GET",), rate_limited=False),
+        ],
+        middleware=[
+            # Allow cross-origin requests
+            Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+        ],
+        lifespan=http_lifespan
+    )
+
 # -------------------------------
 # Run Server
 # -------------------------------
 if __name__ == "__main__":
     import sys
     
+    # Optional snapshot mode, e.g. --snapshot ../hr_snapshot.db
+    if "--snapshot" in sys.argv:
+        SNAPSHOT_FILE = os.path.abspath(sys.argv[sys.argv.index("--snapshot") + 1])
+    
     print("=" * 60)
     print("HR Database MCP Server")
     print("=" * 60)
-    print(f"Database: {PG_DB}@{PG_HOST}:{PG_PORT}")
+    if SNAPSHOT_FILE is not None:
+        print(f"Snapshot: {SNAPSHOT_FILE} (created {get_snapshot().info.get('created_at')})")
+        print(f"Replacements are picked up within {SNAPSHOT_POLL_SECONDS}s")
+    else:
+        print(f"Database: {PG_DB}@{PG_HOST}:{PG_PORT}")
     print("=" * 60)
     
     # Check command line arguments
     transport = "stdio"  # Default to stdio (MCP client calls)
     
+    # Optional slow-query log, e.g. --slow-query-ms 200
+    if "--slow-query-ms" in sys.argv:
+        SLOW_QUERY_MS = float(sys.argv[sys.argv.index("--slow-query-ms") + 1])
+        print(f"Slow-query log: queries over {SLOW_QUERY_MS:g} ms are written to {SLOW_QUERY_LOG}")
+    
+    # Optional per-client rate limit, e.g. --rate-limit 10 (calls per second, 0 disables)
+    if "--rate-limit" in sys.argv:
+        rate_limiter.rate = float(sys.argv[sys.argv.index("--rate-limit") + 1])
+    if rate_limiter.rate:
+        print(f"Rate limit: {rate_limiter.rate:g} calls per second per client (bursts of {rate_limiter.burst})")
+    
     if len(sys.argv) > 1:
         if sys.argv[1] == "--sse":
             transport = "sse"
@@ -123,66 +2593,81 @@ if __name__ == "__main__":
             transport = "streamable-http"
             print("Using HTTP transport mode")
         elif sys.argv[1] == "--https":
-            # HTTPS REST API mode
-            from flask import Flask, request, jsonify
-            from flask_cors import CORS
-            import ssl
-            
-            app = Flask(__name__)
-            CORS(app)  # Allow cross-origin requests
-            
-            @app.route('/query', methods=['POST', 'GET'])
-            def api_query():
-                """REST API query endpoint"""
-                try:
-                    if request.method == 'GET':
-                        params = request.args.to_dict()
-                    else:
-                        params = request.json or {}
-                    
-                    table = params.get('table', 'employee_master')
-                    limit = int(params.get('limit', 10))
-                    employee_id = params.get('employee_id')
-                    department = params.get('department')
-                    
-                    result = query_employees(
-                        table=table,
-                        limit=limit,
-                        employee_id=employee_id,
-                        department=department
-                    )
-                    return jsonify(json.loads(result))
-                except Exception as e:
-                    return jsonify({"error": str(e)}), 500
+            # HTTPS REST API mode (uvicorn worker processes, see create_http_app)
+            import uvicorn
             
-            @app.route('/health', methods=['GET'])
-            def health():
-                """Health check"""
-                return jsonify({"status": "ok", "database": PG_DB})
+            workers = HTTP_WORKERS
+            if "--workers" in sys.argv:
+                workers = int(sys.argv[sys.argv.index("--workers") + 1])
+            if SLOW_QUERY_MS is not None:
+                os.environ["HR_SLOW_QUERY_MS"] = str(SLOW_QUERY_MS)
+            os.environ["HR_RATE_LIMIT"] = str(rate_limiter.rate)
+            if SNAPSHOT_FILE is not None:
+                os.environ["HR_SNAPSHOT_FILE"] = SNAPSHOT_FILE
+            tls = os.path.exists(TLS_CERT_FILE) and os.path.exists(TLS_KEY_FILE)
+            scheme = "https" if tls else "http"
             
-            print("Using HTTPS REST API mode")
-            print("API endpoint: https://localhost:8443/query")
-            print("Health check: https://localhost:8443/health")
+            print(f"Using HTTPS REST API mode ({workers} worker processes)")
+            print(f"API endpoint: {scheme}://localhost:{HTTP_PORT}/query")
+            print(f"Batch queries: {scheme}://localhost:{HTTP_PORT}/query/batch (POST)")
+            print(f"Aggregation: {scheme}://localhost:{HTTP_PORT}/aggregate")
+            print(f"Employee profiles: {scheme}://localhost:{HTTP_PORT}/profile")
+            print(f"Health check: {scheme}://localhost:{HTTP_PORT}/health")
+            print(f"Metrics: {scheme}://localhost:{HTTP_PORT}/metrics")
             print("=" * 60)
-            
-            # Create self-signed certificate (for development only)
-            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-            try:
-                context.load_cert_chain('server.crt', 'server.key')
-            except FileNotFoundError:
-                print("Warning: server.crt and server.key not found, using HTTP mode")
+            if not tls:
+                print(f"Warning: {TLS_CERT_FILE} and {TLS_KEY_FILE} not found, using HTTP mode")
                 print("Hint: You can generate certificates using openssl:")
                 print("  openssl req -x509 -newkey rsa:4096 -nodes -keyout server.key -out server.crt -days 365")
-                app.run(host='0.0.0.0', port=8443, debug=False)
-            else:
-                app.run(host='0.0.0.0', port=8443, ssl_context=context, debug=False)
+            
+            # SIGINT/SIGTERM stop accepting connections, let in-flight requests
+            # finish (up to HTTP_SHUTDOWN_TIMEOUT) and then close the pools
+            uvicorn.run(
+                "server:create_http_app",
+                factory=True,
+                app_dir=os.path.dirname(os.path.abspath(__file__)),
+                host=HTTP_HOST,
+                port=HTTP_PORT,
+                workers=workers,
+                ssl_certfile=TLS_CERT_FILE if tls else None,
+                ssl_keyfile=TLS_KEY_FILE if tls else None,
+                backlog=HTTP_BACKLOG,
+                timeout_keep_alive=HTTP_KEEP_ALIVE,
+                timeout_graceful_shutdown=HTTP_SHUTDOWN_TIMEOUT,
+                access_log=False  # Latency per route is on /metrics
+            )
             sys.exit(0)
         elif sys.argv[1] == "--test":
             # Test mode: directly test query functionality
             print("\nTest mode: Testing query functionality...")
             result = query_employees(table="employee_master", limit=3)
             print(result)
-            sys.exit(0)
+            
+            # REST routes: malformed requests are answered with 400, not 500
+            from starlette.testclient import TestClient
+            
+            print("\nTest mode: Testing REST request validation...")
+            client = TestClient(create_http_app())
+            cases = [
+                ("POST", "/query", {"json": [1, 2]}),
+                ("POST", "/query", {"content": b"{not json", "headers": {"Content-Type": "application/json"}}),
+                ("GET", "/query?limit=abc", {}),
+                ("GET", "/query?max_bytes=abc", {}),
+                ("POST", "/query", {"json": {"limit": "abc"}}),
+                ("POST", "/query", {"json": {"max_bytes": [1]}}),
+                ("GET", "/aggregate?limit=abc", {}),
+                ("POST", "/aggregate", {"json": {"limit": 2.5}}),
+                ("POST", "/aggregate", {"json": "text"}),
+                ("POST", "/profile", {"json": [1, 2]}),
+                ("POST", "/profile", {"json": {"employee_ids": 5}}),
+            ]
+            failed = 0
+            for method, path, kwargs in cases:
+                response = client.request(method, path, **kwargs)
+                ok = response.status_code == 400 and "error" in response.json()
+                failed += not ok
+                print(f"  {'ok  ' if ok else 'FAIL'} {method} {path} -> {response.status_code} {response.text}")
+            sys.exit(1 if failed else 0)
     
     if transport == "stdio":
         print("=" * 60)
@@ -193,7 +2678,6 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\nServer stopped")
     finally:
-        if _conn and not _conn.closed:
-            _cursor.close()
-            _conn.close()
-            print("Database connection closed")
+        if _pool is not None:
+            close_db_pool()
+            print("Database connection pool closed")
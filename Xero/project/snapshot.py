@@ -0,0 +1,435 @@
+"""
+Read-only SQLite snapshot of the HR database
+
+`upload_db.py --snapshot` writes one after each load (or run this module to
+export the database as it is); `server.py --snapshot` serves every read tool
+from it without a database connection and swaps in a new file when it
+appears.
+
+Tables and materialized views keep their PostgreSQL names, column order,
+keys and indexes. Values are stored so they read back as psycopg2 returns
+them: numeric values as their exact text (the way a Decimal renders),
+dates as ISO text, and booleans as 0/1, converted back on read.
+
+    python snapshot.py --output ../hr_snapshot.db
+"""
+import os
+import re
+import sys
+import io
+import json
+import time
+import sqlite3
+import argparse
+import functools
+import threading
+from pathlib import Path
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import datetime, timezone
+
+import schema
+
+# Set Windows console output encoding to UTF-8
+if sys.platform == 'win32':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SNAPSHOT_FILE = os.path.join(BASE_DIR, "hr_snapshot.db")
+
+SNAPSHOT_FORMAT = 1         # Bumped when the file layout changes
+EXPORT_BATCH_SIZE = 10000   # Rows per round trip when exporting a table
+PROGRESS_STEPS = 10000      # SQLite instructions between statement timeout checks
+
+# Column types from the PostgreSQL catalog, for every exported table and view
+CATALOG_COLUMNS_SQL = """
+SELECT c.relname, a.attname, format_type(a.atttypid, a.atttypmod)
+FROM pg_attribute a
+JOIN pg_class c ON c.oid = a.attrelid
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = current_schema() AND c.relname = ANY(%s)
+  AND a.attnum > 0 AND NOT a.attisdropped
+ORDER BY c.relname, a.attnum
+"""
+
+# Plain column indexes (primary keys, view keys, access path indexes)
+CATALOG_INDEXES_SQL = """
+SELECT t.relname, i.relname, ix.indisunique, array_agg(a.attname ORDER BY k.position)
+FROM pg_index ix
+JOIN pg_class t ON t.oid = ix.indrelid
+JOIN pg_class i ON i.oid = ix.indexrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+CROSS JOIN LATERAL unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, position)
+JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+WHERE n.nspname = current_schema() AND t.relname = ANY(%s)
+  AND ix.indexprs IS NULL AND ix.indpred IS NULL AND ix.indisvalid
+GROUP BY t.relname, i.relname, ix.indisunique
+ORDER BY t.relname, i.relname
+"""
+
+INTEGER_TYPES = {"integer", "bigint", "smallint"}
+FLOAT_TYPES = {"real", "double precision"}
+
+sqlite3.register_converter("BOOLEAN", lambda value: value == b"1")
+
+
+def sqlite_type(data_type):
+    """SQLite column type for a PostgreSQL type (numeric and dates are kept as text)"""
+    if data_type in INTEGER_TYPES:
+        return "INTEGER"
+    if data_type in FLOAT_TYPES:
+        return "REAL"
+    if data_type == "boolean":
+        return "BOOLEAN"
+    return "TEXT"
+
+
+def is_decimal(data_type):
+    """Whether the snapshot stores this type as exact decimal text"""
+    return data_type.startswith("numeric")
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def export_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    # Decimal, date and timestamp: the text the MCP server would render
+    return str(value)
+
+
+def file_identity(path):
+    """Changes whenever the file is replaced"""
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+# -------------------------------
+# Export (PostgreSQL -> SQLite)
+# -------------------------------
+def write_snapshot(conn, path, relations=None):
+    """Export tables and materialized views into a new snapshot file at path
+
+    Everything is read in one REPEATABLE READ transaction, so the snapshot
+    is consistent. It is written to a temporary file next to path and moved
+    into place with os.replace, so readers only ever see a complete file.
+    Returns relation -> row count.
+    """
+    relations = relations or list(schema.TABLES) + list(schema.VIEWS)
+    conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    cursor = conn.cursor()
+    cursor.execute(CATALOG_COLUMNS_SQL, (relations,))
+    columns = {}
+    for relation, column, data_type in cursor.fetchall():
+        columns.setdefault(relation, []).append((column, data_type))
+    cursor.execute(CATALOG_INDEXES_SQL, (relations,))
+    indexes = cursor.fetchall()
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    lite = sqlite3.connect(temporary)
+    try:
+        lite.execute("PRAGMA journal_mode = OFF")
+        lite.execute("PRAGMA synchronous = OFF")
+        lite.execute("CREATE TABLE snapshot_info (key TEXT PRIMARY KEY, value TEXT)")
+        lite.execute(
+            "CREATE TABLE snapshot_columns "
+            "(relation TEXT, ordinal INTEGER, column_name TEXT, data_type TEXT, PRIMARY KEY (relation, ordinal))"
+        )
+
+        row_counts = {}
+        for relation in relations:
+            if relation not in columns:
+                continue  # View not created yet (create_db.py)
+            names = [name for name, _ in columns[relation]]
+            lite.execute(
+                f"CREATE TABLE {quote(relation)} ("
+                + ", ".join(f"{quote(name)} {sqlite_type(data_type)}" for name, data_type in columns[relation])
+                + ")"
+            )
+            lite.executemany(
+                "INSERT INTO snapshot_columns VALUES (?, ?, ?, ?)",
+                [(relation, i, name, data_type) for i, (name, data_type) in enumerate(columns[relation])]
+            )
+            insert = (
+                f"INSERT INTO {quote(relation)} VALUES ({', '.join(['?'] * len(names))})"
+            )
+            rows = 0
+            with conn.cursor(name=f"snapshot_{relation}") as source:
+                source.itersize = EXPORT_BATCH_SIZE
+                source.execute(f"SELECT {', '.join(names)} FROM {relation}")
+                while True:
+                    batch = source.fetchmany(EXPORT_BATCH_SIZE)
+                    if not batch:
+                        break
+                    lite.executemany(insert, [tuple(export_value(v) for v in row) for row in batch])
+                    rows += len(batch)
+            row_counts[relation] = rows
+
+        for relation, index_name, unique, index_columns in indexes:
+            if relation in row_counts:
+                lite.execute(
+                    f"CREATE {'UNIQUE ' if unique else ''}INDEX {quote(index_name)} "
+                    f"ON {quote(relation)} ({', '.join(quote(c) for c in index_columns)})"
+                )
+        lite.executemany("INSERT INTO snapshot_info VALUES (?, ?)", [
+            ("format", str(SNAPSHOT_FORMAT)),
+            ("created_at", datetime.now(timezone.utc).isoformat(timespec="seconds")),
+            ("row_counts", json.dumps(row_counts)),
+        ])
+        lite.commit()
+        lite.execute("ANALYZE")
+        lite.commit()
+    finally:
+        lite.close()
+        conn.rollback()
+        cursor.close()
+
+    with open(temporary, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return row_counts
+
+# -------------------------------
+# Reading
+# -------------------------------
+def _decimal(value):
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    return Decimal(value)
+
+
+def _plain(value):
+    """Return an aggregate result the way psycopg2 would: int stays int, numeric becomes exact text"""
+    return value if isinstance(value, int) else str(value)
+
+
+class DecimalSum:
+    """SUM with numeric semantics: exact for decimal text, integer for integers"""
+
+    def __init__(self):
+        self.total = None
+
+    def step(self, value):
+        if value is not None:
+            value = value if isinstance(value, int) else _decimal(value)
+            self.total = value if self.total is None else self.total + value
+
+    def finalize(self):
+        return None if self.total is None else _plain(self.total)
+
+
+class DecimalAverage:
+    """ROUND(AVG(x), 2) as PostgreSQL computes it on numeric and integer columns"""
+
+    def __init__(self):
+        self.total = Decimal(0)
+        self.count = 0
+
+    def step(self, value):
+        if value is not None:
+            self.total += _decimal(value)
+            self.count += 1
+
+    def finalize(self):
+        if not self.count:
+            return None
+        return str((self.total / self.count).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+
+
+class DecimalMinimum:
+    """MIN comparing decimal text by value; returns the original value"""
+    keep = staticmethod(lambda candidate, best: candidate < best)
+
+    def __init__(self):
+        self.best = None
+
+    def step(self, value):
+        if value is not None:
+            candidate = (_decimal(value), value)
+            if self.best is None or self.keep(candidate[0], self.best[0]):
+                self.best = candidate
+
+    def finalize(self):
+        return None if self.best is None else self.best[1]
+
+
+class DecimalMaximum(DecimalMinimum):
+    keep = staticmethod(lambda candidate, best: candidate > best)
+
+
+class Percentile:
+    """ROUND(percentile_cont(fraction) WITHIN GROUP (ORDER BY x)::numeric, 2)"""
+
+    def __init__(self):
+        self.values = []
+        self.fraction = None
+
+    def step(self, value, fraction):
+        self.fraction = fraction
+        if value is not None:
+            self.values.append(float(_decimal(value)))
+
+    def finalize(self):
+        if not self.values:
+            return None
+        values = sorted(self.values)
+        position = self.fraction * (len(values) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(values) - 1)
+        result = values[lower] + (position - lower) * (values[upper] - values[lower])
+        # float8 -> numeric keeps 15 significant digits
+        return str(Decimal(format(result, ".15g")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+
+
+def to_number(value):
+    """Decimal text as a float, for comparing and sorting numeric values"""
+    return None if value is None else float(_decimal(value))
+
+
+def _words(text):
+    return [word for word in re.split(r"[\W_]+", text.lower()) if word]
+
+
+def _word_trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@functools.lru_cache(maxsize=256)
+def _query_trigrams(query):
+    return frozenset().union(*map(_word_trigrams, _words(query)))
+
+
+def word_similarity(query, text):
+    """pg_trgm's strict_word_similarity(query, text)
+
+    The best trigram similarity between query and any run of whole words in
+    text. Words are split on non-alphanumeric characters as under a UTF-8
+    locale; a database using the C locale also splits on non-ASCII letters.
+    """
+    if query is None or text is None:
+        return None
+    wanted = _query_trigrams(query)
+    if not wanted:
+        return 0.0
+    words = [_word_trigrams(word) for word in _words(text)]
+    best = 0.0
+    for start in range(len(words)):
+        span = set()
+        for word in words[start:]:
+            span |= word
+            shared = len(wanted & span)
+            best = max(best, shared / (len(wanted) + len(span) - shared))
+    return best
+
+
+def register_functions(conn):
+    conn.create_aggregate("hr_sum", 1, DecimalSum)
+    conn.create_aggregate("hr_avg", 1, DecimalAverage)
+    conn.create_aggregate("hr_min", 1, DecimalMinimum)
+    conn.create_aggregate("hr_max", 1, DecimalMaximum)
+    conn.create_aggregate("hr_percentile", 2, Percentile)
+    conn.create_function("hr_number", 1, to_number, deterministic=True)
+    conn.create_function("hr_word_similarity", 2, word_similarity, deterministic=True)
+
+
+def translate_sql(sql):
+    """Rewrite the PostgreSQL constructs the MCP tools use into SQLite
+
+    Array parameters (= ANY(%s::varchar[])) are passed as JSON arrays and
+    %s placeholders become ?.
+    """
+    return sql.replace("= ANY(%s::varchar[])", "IN (SELECT value FROM json_each(%s))").replace("%s", "?")
+
+
+def adapt_params(params):
+    return [json.dumps(p) if isinstance(p, (list, tuple)) else p for p in params]
+
+
+class Snapshot:
+    """An open snapshot file: its catalog plus one read-only connection per thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self.identity = file_identity(path)
+        self._uri = Path(path).resolve().as_uri() + "?mode=ro&immutable=1"
+        self._local = threading.local()
+        self._statements = {}
+        self._lock = threading.Lock()
+
+        conn = self.connection()
+        self.info = dict(conn.execute("SELECT key, value FROM snapshot_info"))
+        if self.info.get("format") != str(SNAPSHOT_FORMAT):
+            raise ValueError(f"{path} has snapshot format {self.info.get('format')}, expected {SNAPSHOT_FORMAT}")
+        self.columns = {}
+        for relation, column, data_type in conn.execute(
+            "SELECT relation, column_name, data_type FROM snapshot_columns ORDER BY relation, ordinal"
+        ):
+            self.columns.setdefault(relation, {})[column] = data_type
+
+    def connection(self):
+        """This thread's connection (the file never changes, so no locking is needed)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self._uri, uri=True, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+            )
+            register_functions(conn)
+            self._local.conn = conn
+        return conn
+
+    def column_types(self, relation):
+        if relation not in self.columns:
+            raise ValueError(f"{relation} is not in the snapshot {self.path}")
+        return self.columns[relation]
+
+    def statement(self, name, build):
+        """A statement built for this snapshot's columns by build(snapshot), built once"""
+        with self._lock:
+            if name not in self._statements:
+                self._statements[name] = build(self)
+            return self._statements[name]
+
+    def execute(self, sql, params=(), timeout=None):
+        """Run a query and fetch its rows; with timeout (ms) it is cancelled once it runs longer"""
+        conn = self.connection()
+        if timeout is None:
+            return conn.execute(sql, params).fetchall()
+        deadline = time.monotonic() + timeout / 1000
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+        try:
+            return conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"canceling statement due to statement timeout ({timeout} ms)") from None
+            raise
+        finally:
+            conn.set_progress_handler(None, PROGRESS_STEPS)
+
+
+if __name__ == "__main__":
+    from upload_db import connect_raw
+
+    parser = argparse.ArgumentParser(description="Export the HR database to a SQLite snapshot")
+    parser.add_argument(
+        "--output",
+        default=DEFAULT_SNAPSHOT_FILE,
+        help=f"Snapshot file to write (default {DEFAULT_SNAPSHOT_FILE})"
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    conn = connect_raw()
+    try:
+        row_counts = write_snapshot(conn, args.output)
+    finally:
+        conn.close()
+    print(
+        f"Snapshot written to {args.output}: {sum(row_counts.values())} rows "
+        f"from {len(row_counts)} tables and views in {time.perf_counter() - started:.2f}s"
+    )
@@ -1,12 +1,22 @@
 import os
 import sys
+import io
+import time
+import argparse
+import hashlib
+import functools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import openpyxl
 import pandas as pd
+import psycopg2
 from sqlalchemy import create_engine, inspect
-from datetime import datetime
+from datetime import date, datetime, time as time_of_day
+
+import schema
+import snapshot
 
 # Set Windows console output encoding to UTF-8
 if sys.platform == 'win32':
-    import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
@@ -22,131 +32,233 @@ engine = create_engine(
     f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}"
 )
 
+
+def connect_raw():
+    """Open a plain psycopg2 connection (safe to call from worker processes)"""
+    return psycopg2.connect(
+        host=PG_HOST, port=PG_PORT, database=PG_DB, user=PG_USER, password=PG_PASSWORD
+    )
+
 # === CSV File Path ===
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CSV_FOLDER = os.path.join(BASE_DIR, "table")
 
+# === Excel Workbook Source (--xlsx) ===
+# Set to an HR_Data_Tracking_Framework workbook to read each dataset from the
+# sheet of the same name instead of its CSV file (sheets without a dataset are ignored)
+XLSX_FILE = None
+WORKBOOK_EXTENSIONS = (".xlsx", ".xlsm")
+
+# Cell text read as missing, the same strings pd.read_csv treats as NaN, so a
+# sheet loads like its CSV export
+SHEET_NA_VALUES = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+}
+
+# Rows read and copied at a time by the COPY loader (--copy, --incremental)
+CHUNK_SIZE = 50000
+
+# server.py listens on this channel and drops cached results for the named table
+CACHE_INVALIDATION_CHANNEL = "hr_table_changed"
+
+# Default number of worker processes for the parallel loader (--parallel)
+PARALLEL_WORKERS = 4
+
+# Joins the natural key columns of a row into load_manifest_rows.row_key
+ROW_KEY_SEPARATOR = "\x1f"
+
+# Canonical text of a missing value when hashing rows (see row_hashes)
+ROW_HASH_NA = "\\N"
+
 # === CSV File to Database Table Mapping ===
+# CSV file -> table, natural key and column mapping, generated from the
+# schema registry (schema.py) for every dataset in table/columns.json
 CSV_TABLE_MAPPING = {
-    "Employee Master.csv": {
-        "table": "employee_master",
-        "column_mapping": {
-            "Employee ID": "employee_id",
-            "Full Name": "full_name",
-            "Date of Birth": "date_of_birth",
-            "Gender": "gender",
-            "Contact Details": "contact_details",
-            "Address": "address",
-            "Emergency Contact": "emergency_contact",
-            "Employment Status": "employment_status",
-            "Hire Date": "hire_date",
-            "Termination Date": "termination_date",
-            "Job Title": "job_title",
-            "Department": "department",
-            "Office Location": "office_location",
-            "Region/State": "region_state",
-            "Country": "country",
-            "Manager": "manager_id",
-            "Award/Agreement": "award_agreement",
-            "Employment Type": "employment_type"
-        }
-    },
-    "Remuneration.csv": {
-        "table": "remuneration",
-        "column_mapping": {
-            "Employee ID": "employee_id",
-            "Base Salary": "base_salary",
-            "Award/Classification Level": "award_classification_level",
-            "Allowances": "allowances",
-            "Commission": "commission",
-            "Commission %": "commission_percent",
-            "Commision Earned": "commission_earned",
-            "Overtime Rate": "overtime_rate",
-            "Superannuation %": "superannuation_percent",
-            "Bonus Eligibility": "bonus_eligibility",
-            "Pay Cycle": "pay_cycle",
-            "Salary": "salary",
-            "Commission $": "commission_dollar",
-            "Total Package Value": "total_package_value"
-        }
-    },
-    "Position Details.csv": {
-        "table": "position_details",
-        "column_mapping": {
-            "Employee ID": "employee_id",
-            "Position Title": "position_title",
-            "Position Level ": "position_level",
-            "Skills Required": "skills_required",
-            "Qualifications": "qualifications",
-            "Qualification Date": "qualification_date",
-            "Expiry Date": "expiry_date",
-            "Licenses/Permits": "licenses_permits",
-            "Competency Status": "competency_status"
-        }
-    },
-    "Performance.csv": {
-        "table": "performance",
-        "column_mapping": {
-            "Employee ID": "employee_id",
-            "Review Date": "review_date",
-            "Performance Rating": "performance_rating",
-            "Potential Rating": "potential_rating",
-            "Time in Role": "time_in_role",
-            "Goals/Objectives": "goals_objectives",
-            "Achievement Status": "achievement_status",
-            "Development Plan Status": "development_plan_status",
-            "Last Promotion Date": "last_promotion_date",
-            "Next Review Date": "next_review_date"
-        }
+    spec["file"]: {
+        "table": table_name,
+        "sheet": spec["dataset"],
+        "natural_key": spec["primary_key"],
+        "column_mapping": schema.column_mapping(table_name),
     }
+    for table_name, spec in schema.TABLES.items()
 }
 
+# Manager inference rules for employee_master rows whose Manager column is not
+# an employee_id: (job_title, department, manager_id), first match wins and
+# None matches any value. Manager IDs follow the shipped organisation chart.
+MANAGER_RULES = [
+    ("CEO", None, None),                           # CEO has no Manager
+    ("Executive Assistant", None, "E001"),         # Executive Assistant's Manager is CEO
+    ("Chief Financial Officer", None, "E001"),     # CFO's Manager is CEO
+    (None, "Finance", "E003"),                     # Other Finance employees report to the CFO
+    ("Sales Manager", None, "E001"),               # Sales Manager's Manager is CEO
+    ("Sales Team Leader", None, "E007"),           # Sales Team Leader's Manager is Sales Manager
+    ("Sales Rep", None, "E008"),                   # Sales Reps report to the first Sales Team Leader
+    ("Operations Manager", None, "E001"),          # Operations Manager's Manager is CEO
+    ("Operations Staff", "Operations", "E016"),    # Operations Staff report to the Operations Manager
+]
+
+# Insert referenced tables first (employee_master before its dependent tables)
+INSERTION_ORDER = [schema.TABLES[t]["file"] for t in schema.load_order()]
+
 
 def process_dataframe(df, table_name):
-    """Process dataframe: convert data types"""
-    # Process different data types based on table name
-    if table_name == "employee_master":
-        # Date fields
-        date_cols = ["date_of_birth", "hire_date", "termination_date"]
-        for col in date_cols:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-    
-    elif table_name == "remuneration":
-        # Numeric fields
-        numeric_cols = ["base_salary", "allowances", "commission", "commission_percent", 
-                       "commission_earned", "overtime_rate", "superannuation_percent",
-                       "salary", "commission_dollar", "total_package_value"]
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        # Boolean fields
-        if "bonus_eligibility" in df.columns:
-            df["bonus_eligibility"] = df["bonus_eligibility"].apply(
-                lambda x: True if str(x).strip().lower() in ['yes', 'true', '1'] else False
-            )
+    """Process dataframe: convert data types (per the table's coercion plan in schema.py)"""
+    return schema.coerce_dataframe(df, table_name)
+
+
+def create_partitions(cursor, table_name, years):
+    """Create the missing yearly partitions of a partitioned table (see schema.py)
+    
+    PostgreSQL routes every inserted row to the partition covering its date,
+    and rejects a row whose year has no partition yet, so each load creates
+    the partitions of the years it brings before inserting.
+    """
+    for year in sorted(set(int(y) for y in years)):
+        cursor.execute(schema.create_partition_sql(table_name, year))
+
+
+def create_staged_partitions(cursor, table_name, staging_table):
+    """Create the partitions for the years of the rows in a staging table"""
+    column = schema.TABLES[table_name]["partition_by"]
+    if column:
+        cursor.execute(
+            f"SELECT DISTINCT date_part('year', {column})::int FROM {staging_table} "
+            f"WHERE {column} IS NOT NULL"
+        )
+        create_partitions(cursor, table_name, [row[0] for row in cursor.fetchall()])
+
+
+def notify_tables_changed(cursor, table_names):
+    """Tell running MCP servers to drop cached results for these tables
+    
+    NOTIFY is transactional: it is delivered when the caller commits and
+    discarded if the load is rolled back.
+    """
+    for table_name in table_names:
+        cursor.execute("SELECT pg_notify(%s, %s)", (CACHE_INVALIDATION_CHANNEL, table_name))
+
+
+def analyze_tables(conn, table_names):
+    """Refresh planner statistics for freshly loaded tables (after the load commits)"""
+    cursor = conn.cursor()
+    for table_name in table_names:
+        cursor.execute(f"ANALYZE {table_name}")
+    conn.commit()
+    cursor.close()
+
+
+def refresh_views(conn, table_names):
+    """Refresh the materialized analytics views built on these tables (after the load commits)
+    
+    REFRESH ... CONCURRENTLY keeps each view readable while it is rebuilt.
+    Each refresh commits on its own and notifies MCP servers, so a failed
+    refresh leaves that view (and the loaded data) as it was.
+    """
+    views = schema.views_for_tables(table_names)
+    if not views:
+        return
+    cursor = conn.cursor()
+    cursor.execute("SELECT matviewname FROM pg_matviews WHERE schemaname = current_schema()")
+    existing = {row[0] for row in cursor.fetchall()}
+    conn.commit()
+    for view_name in views:
+        if view_name not in existing:
+            print(f" View does not exist: {view_name} (run create_db.py first)")
+            continue
+        started = time.perf_counter()
+        try:
+            cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name}")
+            notify_tables_changed(cursor, [view_name])
+            conn.commit()
+            print(f"🔄 Refreshed view {view_name} in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            conn.rollback()
+            print(f"    View refresh failed for {view_name}: {str(e)}")
+    cursor.close()
+
+
+def export_snapshot(path):
+    """Write the read-only SQLite snapshot served by server.py --snapshot
+
+    The file is replaced atomically, so servers reading it switch to the new
+    snapshot on their next poll. A failed export leaves the previous file.
+    """
+    started = time.perf_counter()
+    conn = connect_raw()
+    try:
+        row_counts = snapshot.write_snapshot(conn, path)
+        print(
+            f"📦 Snapshot written to {path}: {sum(row_counts.values())} rows "
+            f"from {len(row_counts)} tables and views in {time.perf_counter() - started:.2f}s\n"
+        )
+    except Exception as e:
+        print(f"    Snapshot export failed, previous snapshot kept: {str(e)}\n")
+    finally:
+        conn.close()
+
+
+def prepare_dataframe(df, config):
+    """Rename CSV columns to table columns, drop unmapped ones and coerce types"""
+    column_mapping = config["column_mapping"]
+    
+    # Rename columns to match database table
+    df = df.rename(columns=column_mapping)
+    
+    # Keep only mapped columns (remove extra columns)
+    df = df[[col for col in column_mapping.values() if col in df.columns]]
+    
+    # Process data types
+    return process_dataframe(df, config["table"])
+
+
+def infer_manager_ids(df, known_employee_ids):
+    """Resolve manager_id for employee_master rows
+    
+    A Manager value that is a known employee_id is kept as is; otherwise the
+    first matching rule in MANAGER_RULES decides. Rules are applied with
+    column-wise merges rather than per-row Python calls. known_employee_ids
+    is the set of every employee_id in the file, so the same rules apply
+    whether the file is processed whole or in chunks.
+    """
+    def column(name):
+        if name in df.columns:
+            return df[name].astype(object)
+        return pd.Series("", index=df.index, dtype=object)
     
-    elif table_name == "position_details":
-        # Date fields
-        date_cols = ["qualification_date", "expiry_date"]
-        for col in date_cols:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
+    rows = pd.DataFrame({
+        "row": range(len(df)),
+        "job_title": column("job_title").values,
+        "department": column("department").values
+    })
+    rules = pd.DataFrame(MANAGER_RULES, columns=["job_title", "department", "manager"])
+    rules["priority"] = range(len(rules))
     
-    elif table_name == "performance":
-        # Date fields
-        date_cols = ["review_date", "last_promotion_date", "next_review_date"]
-        for col in date_cols:
-            if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
+    # Merge each group of rules on the columns it constrains, then keep the
+    # highest-priority match per row
+    matches = []
+    for keys in (["job_title", "department"], ["job_title"], ["department"]):
+        wildcards = [c for c in ("job_title", "department") if c not in keys]
+        group = rules[rules[keys].notna().all(axis=1) & rules[wildcards].isna().all(axis=1)]
+        if len(group):
+            matches.append(rows.merge(group[keys + ["manager", "priority"]], on=keys))
+    matched = pd.concat(matches).sort_values("priority").drop_duplicates("row")
     
-    return df
+    result = pd.Series(None, index=df.index, dtype=object)
+    result.iloc[matched["row"].values] = matched["manager"].values
+    
+    # If already a valid employee_id, use it directly
+    manager = column("manager_id")
+    stripped = manager.where(manager.isna(), manager.astype(str).str.strip())
+    valid = manager.notna() & stripped.isin(known_employee_ids)
+    result[valid] = stripped[valid]
+    return result.infer_objects()
 
 
 def upload_csv_to_postgres():
     """Upload CSV files to PostgreSQL (only insert data, do not create tables)"""
-    print(f"📁 CSV folder path: {CSV_FOLDER}\n")
+    print_source()
     
     # Check database connection and if tables exist
     inspector = inspect(engine)
@@ -155,23 +267,15 @@ def upload_csv_to_postgres():
     # Debug: display all existing tables
     print(f"📋 Existing tables in database: {existing_tables}\n")
     
-    # Define insertion order: insert employee_master (main table) first, then other tables (dependent tables)
-    insertion_order = [
-        "Employee Master.csv",  # Must be inserted first
-        "Remuneration.csv",
-        "Position Details.csv",
-        "Performance.csv"
-    ]
-    
     # Process files in defined order
-    for csv_file in insertion_order:
+    loaded_tables = []
+    for csv_file in INSERTION_ORDER:
         if csv_file not in CSV_TABLE_MAPPING:
             continue
             
         config = CSV_TABLE_MAPPING[csv_file]
         csv_path = os.path.join(CSV_FOLDER, csv_file)
         table_name = config["table"]
-        column_mapping = config["column_mapping"]
         
         if not os.path.exists(csv_path):
             print(f" File does not exist: {csv_file}")
@@ -180,7 +284,7 @@ def upload_csv_to_postgres():
         # Check if table exists
         if table_name not in existing_tables:
             print(f" Table does not exist: {table_name}")
-            print(f"   Please run create_db.py first to create tables")
+            print("   Please run create_db.py first to create tables")
             continue
         
         print(f"📄 Processing: {csv_file}")
@@ -191,80 +295,22 @@ def upload_csv_to_postgres():
             df = pd.read_csv(csv_path)
             print(f"    Read successfully, {len(df)} rows of data")
             
-            # Rename columns to match database table
-            df = df.rename(columns=column_mapping)
-            
-            # Keep only mapped columns (remove extra columns)
-            df = df[[col for col in column_mapping.values() if col in df.columns]]
-            
-            # Process data types
-            df = process_dataframe(df, table_name)
+            df = prepare_dataframe(df, config)
             
             # Special handling: manager_id foreign key constraint for employee_master table
             if table_name == "employee_master" and "manager_id" in df.columns:
-                # Create mapping from employee_id to job_title and department
-                employee_info = {}
-                for _, row in df.iterrows():
-                    employee_info[row["employee_id"]] = {
-                        "job_title": row.get("job_title", ""),
-                        "department": row.get("department", "")
-                    }
-                
-                # Intelligently infer Manager relationship
-                def infer_manager(employee_id, manager_value, job_title, department):
-                    # If already a valid employee_id, return directly
-                    if pd.notna(manager_value) and str(manager_value).strip() in employee_info:
-                        return str(manager_value).strip()
-                    
-                    # CEO has no Manager
-                    if job_title == "CEO":
-                        return None
-                    
-                    # Executive Assistant's Manager is CEO
-                    if job_title == "Executive Assistant":
-                        return "E001"
-                    
-                    # CFO's Manager is CEO
-                    if job_title == "Chief Financial Officer":
-                        return "E001"
-                    
-                    # Finance department employees, Manager is CFO
-                    if department == "Finance" and job_title != "Chief Financial Officer":
-                        return "E003"
-                    
-                    # Sales Manager's Manager is CEO
-                    if job_title == "Sales Manager":
-                        return "E001"
-                    
-                    # Sales Team Leader's Manager is Sales Manager
-                    if job_title == "Sales Team Leader":
-                        return "E007"
-                    
-                    # Sales Rep's Manager is the first Sales Team Leader
-                    if job_title == "Sales Rep":
-                        return "E008"  # Or can choose E009 based on other rules
-                    
-                    # Operations Manager's Manager is CEO
-                    if job_title == "Operations Manager":
-                        return "E001"
-                    
-                    # Operations Staff's Manager is Operations Manager
-                    if department == "Operations" and job_title == "Operations Staff":
-                        return "E016"
-                    
-                    # Other cases return NULL
-                    return None
-                
-                # Apply inference logic
-                df["manager_id"] = df.apply(
-                    lambda row: infer_manager(
-                        row["employee_id"],
-                        row["manager_id"],
-                        row.get("job_title", ""),
-                        row.get("department", "")
-                    ),
-                    axis=1
-                )
+                df["manager_id"] = infer_manager_ids(df, set(df["employee_id"]))
+            
+            # Partitioned history tables need a partition for every year loaded
+            partition_column = schema.TABLES[table_name]["partition_by"]
+            if partition_column:
+                conn = engine.raw_connection()
+                try:
+                    cursor = conn.cursor()
+                    create_partitions(cursor, table_name, df[partition_column].dropna().dt.year)
+                    conn.commit()
+                finally:
+                    conn.close()
             
             # Only insert data, do not create table (use append mode, table must exist)
             df.to_sql(
@@ -275,20 +321,695 @@ def upload_csv_to_postgres():
                 method='multi'  # Batch insert for better performance
             )
             
+            conn = engine.raw_connection()
+            try:
+                cursor = conn.cursor()
+                notify_tables_changed(cursor, [table_name])
+                conn.commit()
+                analyze_tables(conn, [table_name])
+            finally:
+                conn.close()
+            
+            loaded_tables.append(table_name)
             print(f"    Successfully inserted {len(df)} rows into table {table_name}\n")
             
         except Exception as e:
             print(f"    Upload failed: {str(e)}\n")
             import traceback
             traceback.print_exc()
+    
+    if loaded_tables:
+        conn = engine.raw_connection()
+        try:
+            refresh_views(conn, loaded_tables)
+        finally:
+            conn.close()
+
+
+def print_source():
+    if XLSX_FILE:
+        print(f"📗 Workbook: {XLSX_FILE} (one sheet per dataset)\n")
+    else:
+        print(f"📁 CSV folder path: {CSV_FOLDER}\n")
+
+
+def dataset_source(csv_file, csv_folder, workbook_path=None):
+    """Path a dataset is read from: the workbook (its sheet) or its CSV file"""
+    return workbook_path or os.path.join(csv_folder, csv_file)
+
+
+def is_workbook(path):
+    return path.lower().endswith(WORKBOOK_EXTENSIONS)
+
+
+@functools.lru_cache(maxsize=None)
+def workbook_sheets(workbook_path):
+    """Sheet names of a workbook (read from its index, without loading any sheet)"""
+    workbook = openpyxl.load_workbook(workbook_path, read_only=True)
+    try:
+        return frozenset(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def source_exists(source, config):
+    if is_workbook(source):
+        return os.path.exists(source) and config["sheet"] in workbook_sheets(source)
+    return os.path.exists(source)
+
+
+def source_label(source, config):
+    """File (and sheet) name shown in progress output"""
+    if is_workbook(source):
+        return f"{os.path.basename(source)} [{config['sheet']}]"
+    return os.path.basename(source)
+
+
+def sheet_value(value):
+    """A cell value as the sheet's CSV export would hold it"""
+    if isinstance(value, datetime):
+        if value.time() == time_of_day(0):
+            return value.date().isoformat()
+        return value.isoformat(sep=" ", timespec="milliseconds" if value.microsecond else "seconds")
+    if isinstance(value, (date, time_of_day)):
+        return value.isoformat()
+    if isinstance(value, str) and (value in SHEET_NA_VALUES or not value.strip()):
+        return None
+    return value
+
+
+def read_sheet_chunks(workbook_path, sheet, chunksize, usecols=None):
+    """Yield raw dataframe chunks of one worksheet, like pd.read_csv(chunksize=...)
+    
+    The workbook is opened read-only, so rows are parsed from the sheet's XML
+    as they are consumed and memory use does not grow with the sheet size.
+    Empty rows (often only formatted in Excel) are skipped.
+    """
+    workbook = openpyxl.load_workbook(workbook_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+        positions = [i for i, h in enumerate(header) if usecols is None or h in usecols]
+        columns = [header[i] for i in positions]
+        batch = []
+        for row in rows:
+            values = [sheet_value(row[i]) if i < len(row) else None for i in positions]
+            if all(v is None for v in values):
+                continue
+            batch.append(values)
+            if len(batch) == chunksize:
+                yield pd.DataFrame(batch, columns=columns, dtype=object)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns, dtype=object)
+    finally:
+        workbook.close()
+
+
+def read_chunks(source, config, chunksize, usecols=None):
+    """Raw dataframe chunks of a dataset from its CSV file or its workbook sheet"""
+    if is_workbook(source):
+        return read_sheet_chunks(source, config["sheet"], chunksize, usecols)
+    return pd.read_csv(source, chunksize=chunksize, usecols=usecols)
+
+
+def iter_prepared_chunks(source, config, chunksize):
+    """Yield prepared (renamed, type-coerced, manager-resolved) chunks of a CSV file or sheet"""
+    # Manager inference needs every employee_id in the file, not just the current chunk
+    known_employee_ids = None
+    if config["table"] == "employee_master":
+        reverse_mapping = {v: k for k, v in config["column_mapping"].items()}
+        known_employee_ids = set()
+        for ids in read_chunks(source, config, chunksize, usecols=[reverse_mapping["employee_id"]]):
+            known_employee_ids.update(ids.iloc[:, 0])
+    
+    for chunk in read_chunks(source, config, chunksize):
+        chunk = prepare_dataframe(chunk, config)
+        if known_employee_ids is not None and "manager_id" in chunk.columns:
+            chunk["manager_id"] = infer_manager_ids(chunk, known_employee_ids)
+        yield chunk
+
+
+def copy_dataframe(cursor, df, table_name):
+    """Stream one dataframe into a table with COPY FROM STDIN"""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, date_format="%Y-%m-%d")
+    buffer.seek(0)
+    columns = ", ".join(df.columns)
+    cursor.copy_expert(
+        f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+
+def upload_csv_with_copy(chunksize=CHUNK_SIZE):
+    """Upload CSV files to PostgreSQL by streaming chunks through COPY
+    
+    Each file is read `chunksize` rows at a time, so memory use does not grow
+    with the file size. Chunks are copied into a temporary staging table and
+    moved into the target table with a single INSERT ... SELECT, which keeps
+    each table load atomic and lets self-referencing foreign keys
+    (employee_master.manager_id) point at rows from later chunks.
+    """
+    print_source()
+    
+    existing_tables = inspect(engine).get_table_names()
+    print(f"📋 Existing tables in database: {existing_tables}\n")
+    
+    conn = engine.raw_connection()
+    loaded_tables = []
+    try:
+        for csv_file in INSERTION_ORDER:
+            if csv_file not in CSV_TABLE_MAPPING:
+                continue
+            
+            config = CSV_TABLE_MAPPING[csv_file]
+            csv_path = dataset_source(csv_file, CSV_FOLDER, XLSX_FILE)
+            table_name = config["table"]
+            
+            if not source_exists(csv_path, config):
+                print(f" File does not exist: {source_label(csv_path, config)}")
+                continue
+            
+            if table_name not in existing_tables:
+                print(f" Table does not exist: {table_name}")
+                print("   Please run create_db.py first to create tables")
+                continue
+            
+            print(f"📄 Processing: {source_label(csv_path, config)} (COPY, {chunksize} rows per chunk)")
+            print(f"   → Target table: {table_name} (exists)")
+            
+            try:
+                started = time.perf_counter()
+                
+                staging_table = f"stage_{table_name}"
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"CREATE TEMP TABLE {staging_table} (LIKE {table_name}) ON COMMIT DROP"
+                )
+                
+                total_rows = 0
+                columns = None
+                for chunk in iter_prepared_chunks(csv_path, config, chunksize):
+                    copy_dataframe(cursor, chunk, staging_table)
+                    columns = list(chunk.columns)
+                    total_rows += len(chunk)
+                    print(f"    Copied {total_rows} rows...", end="\r")
+                
+                if columns:
+                    column_list = ", ".join(columns)
+                    create_staged_partitions(cursor, table_name, staging_table)
+                    cursor.execute(
+                        f"INSERT INTO {table_name} ({column_list}) "
+                        f"SELECT {column_list} FROM {staging_table}"
+                    )
+                    notify_tables_changed(cursor, [table_name])
+                conn.commit()
+                cursor.close()
+                analyze_tables(conn, [table_name])
+                loaded_tables.append(table_name)
+                
+                elapsed = time.perf_counter() - started
+                rate = total_rows / elapsed if elapsed > 0 else 0
+                print(f"    Successfully copied {total_rows} rows into table {table_name} "
+                      f"in {elapsed:.2f}s ({rate:,.0f} rows/sec)\n")
+                
+            except Exception as e:
+                conn.rollback()
+                print(f"    Upload failed: {str(e)}\n")
+                import traceback
+                traceback.print_exc()
+        
+        refresh_views(conn, loaded_tables)
+    finally:
+        conn.close()
+
+
+def table_dependencies(inspector, tables):
+    """Map each table to the tables it references through foreign keys
+    
+    Only tables inside `tables` count, and self-references
+    (employee_master.manager_id) are ignored: a table never waits on itself.
+    """
+    dependencies = {}
+    for table_name in tables:
+        referenced = {fk["referred_table"] for fk in inspector.get_foreign_keys(table_name)}
+        dependencies[table_name] = (referenced & set(tables)) - {table_name}
+    return dependencies
+
+
+def topological_order(dependencies):
+    """Order tables so every table comes after the tables it references"""
+    remaining = {table: set(deps) for table, deps in dependencies.items()}
+    ordered = []
+    while remaining:
+        ready = sorted(table for table, deps in remaining.items() if not deps)
+        if not ready:
+            raise ValueError(f"Foreign key cycle between tables: {sorted(remaining)}")
+        for table in ready:
+            del remaining[table]
+            ordered.append(table)
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return ordered
+
+
+def stage_csv_file(csv_file, staging_table, chunksize, csv_folder=CSV_FOLDER, workbook_path=None):
+    """Worker: COPY one CSV file (or workbook sheet) into its own staging table on its own connection"""
+    config = CSV_TABLE_MAPPING[csv_file]
+    csv_path = dataset_source(csv_file, csv_folder, workbook_path)
+    started = time.perf_counter()
+    conn = connect_raw()
+    try:
+        cursor = conn.cursor()
+        total_rows = 0
+        columns = []
+        for chunk in iter_prepared_chunks(csv_path, config, chunksize):
+            copy_dataframe(cursor, chunk, staging_table)
+            columns = list(chunk.columns)
+            total_rows += len(chunk)
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return columns, total_rows, time.perf_counter() - started
+
+
+def upload_csv_parallel(workers=PARALLEL_WORKERS, chunksize=CHUNK_SIZE):
+    """Load all mapped CSV files concurrently, committing all or nothing
+    
+    The load order is derived from the foreign keys in the database schema.
+    Each file is parsed and streamed with COPY by a worker process, on its own
+    connection, into an unlogged staging table; staging tables have no
+    constraints, so files load concurrently regardless of their
+    dependencies. Once every worker has succeeded, a single transaction moves
+    the staged rows into the real tables, parents before children, so foreign
+    keys are satisfied and either the whole batch is published or none of it.
+    """
+    print_source()
+    
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+    print(f"📋 Existing tables in database: {existing_tables}\n")
+    
+    files_by_table = {}
+    for csv_file, config in CSV_TABLE_MAPPING.items():
+        table_name = config["table"]
+        source = dataset_source(csv_file, CSV_FOLDER, XLSX_FILE)
+        if not source_exists(source, config):
+            print(f" File does not exist: {source_label(source, config)}")
+            continue
+        if table_name not in existing_tables:
+            print(f" Table does not exist: {table_name}")
+            print("   Please run create_db.py first to create tables")
+            continue
+        files_by_table[table_name] = csv_file
+    
+    load_order = topological_order(table_dependencies(inspector, list(files_by_table)))
+    print(f"🔗 Publish order (from foreign keys): {' → '.join(load_order)}")
+    print(f"⚙️  Staging {len(load_order)} tables with {workers} workers\n")
+    
+    staging = {table: f"load_stage_{os.getpid()}_{table}" for table in load_order}
+    conn = connect_raw()
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    try:
+        for table_name, staging_table in staging.items():
+            cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+            cursor.execute(f"CREATE UNLOGGED TABLE {staging_table} (LIKE {table_name})")
+        conn.commit()
+        
+        # Stage every file concurrently
+        staged = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(
+                    stage_csv_file, files_by_table[table], staging[table], chunksize, CSV_FOLDER, XLSX_FILE
+                ): table
+                for table in load_order
+            }
+            for future in as_completed(futures):
+                table_name = futures[future]
+                columns, total_rows, elapsed = future.result()
+                staged[table_name] = (columns, total_rows)
+                rate = total_rows / elapsed if elapsed > 0 else 0
+                print(f"    Staged {total_rows} rows for {table_name} "
+                      f"in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+        
+        # Publish in dependency order, in one transaction
+        for table_name in load_order:
+            columns, total_rows = staged[table_name]
+            if not columns:
+                continue
+            column_list = ", ".join(columns)
+            create_staged_partitions(cursor, table_name, staging[table_name])
+            cursor.execute(
+                f"INSERT INTO {table_name} ({column_list}) "
+                f"SELECT {column_list} FROM {staging[table_name]}"
+            )
+        published = [t for t in load_order if staged[t][0]]
+        notify_tables_changed(cursor, published)
+        conn.commit()
+        analyze_tables(conn, published)
+        
+        elapsed = time.perf_counter() - started
+        total = sum(rows for _, rows in staged.values())
+        print(f"\n Published {total} rows across {len(staged)} tables in {elapsed:.2f}s\n")
+        refresh_views(conn, published)
+    except Exception as e:
+        conn.rollback()
+        print(f"\n    Parallel load failed, nothing was published: {str(e)}\n")
+        import traceback
+        traceback.print_exc()
+    finally:
+        for staging_table in staging.values():
+            cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_keys(df, key_columns):
+    """Natural key of each row as one string (stored in load_manifest_rows.row_key)"""
+    parts = []
+    for col in key_columns:
+        values = df[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            values = values.dt.strftime("%Y-%m-%d")
+        parts.append(values.astype(str))
+    keys = parts[0]
+    for part in parts[1:]:
+        keys = keys + ROW_KEY_SEPARATOR + part
+    return keys
+
+
+def varchar_text(value):
+    """A text column value as canonical text: 5.0 (a chunk read as float) is "5" """
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def canonical_text(values, column_type):
+    """One column as canonical text, independent of the dtype its chunk was read with
+    
+    pandas infers dtypes per chunk: a column that is all NaN in one chunk is
+    float64 there and object elsewhere, integers read as int64 or float64.
+    Values are rendered by their schema type instead, missing ones as
+    ROW_HASH_NA.
+    """
+    if column_type == "date":
+        text = pd.to_datetime(values, errors="coerce").dt.strftime("%Y-%m-%d")
+    elif column_type in ("numeric", "percent", "integer"):
+        text = pd.to_numeric(values, errors="coerce").astype("float64").map(repr)
+    elif column_type == "boolean":
+        text = values.map({True: "t", False: "f"})
+    else:
+        text = values.map(varchar_text, na_action="ignore")
+    return text.astype(object).where(values.notna(), ROW_HASH_NA)
+
+
+def row_hashes(df, table_name):
+    """64-bit content hash of each row: sha256 of its canonical text, first 8 bytes
+    
+    A row hashes the same whichever chunk it is read in, so only rows whose
+    values changed are written by an incremental load.
+    """
+    column_types = schema.column_types(table_name)
+    if df.empty:
+        return pd.Series([], index=df.index, dtype="int64")
+    columns = [canonical_text(df[c], column_types.get(c, "varchar")) for c in df.columns]
+    rows = columns[0].str.cat(columns[1:], sep=ROW_KEY_SEPARATOR) if len(columns) > 1 else columns[0]
+    return rows.map(
+        lambda row: int.from_bytes(hashlib.sha256(row.encode("utf-8")).digest()[:8], "big", signed=True)
+    ).astype("int64")
+
+
+def read_row_manifest(cursor, table_name):
+    """Row hashes recorded by the last incremental load, indexed by row key"""
+    buffer = io.StringIO()
+    cursor.copy_expert(
+        cursor.mogrify(
+            "COPY (SELECT row_key, row_hash FROM load_manifest_rows WHERE table_name = %s) "
+            "TO STDOUT WITH (FORMAT csv)",
+            (table_name,)
+        ).decode(),
+        buffer
+    )
+    buffer.seek(0)
+    manifest = pd.read_csv(
+        buffer, names=["row_key", "row_hash"], dtype={"row_key": str, "row_hash": "int64"}
+    )
+    return manifest.set_index("row_key")["row_hash"]
+
+
+def upload_csv_incremental(chunksize=CHUNK_SIZE):
+    """Apply only the rows that changed since the last incremental load
+    
+    Each file is compared against load_manifest_files (whole-file hash) and,
+    if it changed, row by row against load_manifest_rows (per-row hash keyed
+    by the table's natural key). New and modified rows are staged with COPY
+    and upserted with INSERT ... ON CONFLICT; rows that disappeared from the
+    file are deleted. All tables are applied in one transaction, together
+    with the manifest, so a failed refresh leaves the previous load intact.
+    """
+    print_source()
+    
+    existing_tables = inspect(engine).get_table_names()
+    missing = [t for t in ("load_manifest_files", "load_manifest_rows") if t not in existing_tables]
+    if missing:
+        print(f" Manifest tables do not exist: {missing}")
+        print("   Please run create_db.py first to create tables")
+        return
+    
+    conn = engine.raw_connection()
+    cursor = conn.cursor()
+    pending_deletes = []  # (config, deleted keys), applied children-first
+    changed_tables = set()
+    try:
+        for csv_file in INSERTION_ORDER:
+            if csv_file not in CSV_TABLE_MAPPING:
+                continue
+            
+            config = CSV_TABLE_MAPPING[csv_file]
+            csv_path = dataset_source(csv_file, CSV_FOLDER, XLSX_FILE)
+            table_name = config["table"]
+            key_columns = config["natural_key"]
+            
+            if not source_exists(csv_path, config):
+                print(f" File does not exist: {source_label(csv_path, config)}")
+                continue
+            
+            if table_name not in existing_tables:
+                print(f" Table does not exist: {table_name}")
+                print("   Please run create_db.py first to create tables")
+                continue
+            
+            print(f"📄 Processing: {source_label(csv_path, config)} (incremental)")
+            print(f"   → Target table: {table_name} (exists)")
+            started = time.perf_counter()
+            
+            current_hash = file_hash(csv_path)
+            cursor.execute(
+                "SELECT file_hash FROM load_manifest_files WHERE file_name = %s", (csv_file,)
+            )
+            previous = cursor.fetchone()
+            if previous and previous[0] == current_hash:
+                print("    Unchanged since last load, skipped\n")
+                continue
+            
+            old_hashes = read_row_manifest(cursor, table_name)
+            seen_keys = set()
+            total_rows = inserted = updated = skipped = 0
+            
+            staging_table = f"stage_{table_name}"
+            manifest_stage = f"stage_manifest_{table_name}"
+            cursor.execute(f"CREATE TEMP TABLE {staging_table} (LIKE {table_name}) ON COMMIT DROP")
+            cursor.execute(
+                f"CREATE TEMP TABLE {manifest_stage} (row_key VARCHAR, row_hash BIGINT) ON COMMIT DROP"
+            )
+            
+            columns = None
+            for chunk in iter_prepared_chunks(csv_path, config, chunksize):
+                total_rows += len(chunk)
+                columns = list(chunk.columns)
+                
+                # Rows without a complete natural key cannot be tracked or upserted
+                keyed = chunk.dropna(subset=key_columns)
+                skipped += len(chunk) - len(keyed)
+                chunk = keyed
+                keys = row_keys(chunk, key_columns)
+                # Duplicate keys (within the file): the first occurrence wins
+                fresh = ~keys.duplicated() & ~keys.isin(seen_keys)
+                skipped += int((~fresh).sum())
+                chunk, keys = chunk[fresh.values], keys[fresh]
+                seen_keys.update(keys)
+                
+                hashes = row_hashes(chunk, table_name)
+                previous_hashes = keys.map(old_hashes)
+                changed = (previous_hashes != hashes.values).values
+                if not changed.any():
+                    continue
+                inserted += int(previous_hashes[changed].isna().sum())
+                updated += int(previous_hashes[changed].notna().sum())
+                
+                copy_dataframe(cursor, chunk[changed], staging_table)
+                copy_dataframe(
+                    cursor,
+                    pd.DataFrame({"row_key": keys[changed].values, "row_hash": hashes[changed].values}),
+                    manifest_stage
+                )
+            
+            if columns and (inserted or updated):
+                column_list = ", ".join(columns)
+                key_list = ", ".join(key_columns)
+                updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in columns if c not in key_columns)
+                conflict_action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+                create_staged_partitions(cursor, table_name, staging_table)
+                cursor.execute(
+                    f"INSERT INTO {table_name} ({column_list}) "
+                    f"SELECT {column_list} FROM {staging_table} "
+                    f"ON CONFLICT ({key_list}) {conflict_action}"
+                )
+                cursor.execute(
+                    f"INSERT INTO load_manifest_rows (table_name, row_key, row_hash) "
+                    f"SELECT %s, row_key, row_hash FROM {manifest_stage} "
+                    f"ON CONFLICT (table_name, row_key) DO UPDATE SET row_hash = EXCLUDED.row_hash",
+                    (table_name,)
+                )
+            
+            deleted_keys = old_hashes.index.difference(pd.Index(list(seen_keys)))
+            if len(deleted_keys):
+                pending_deletes.append((config, list(deleted_keys)))
+            if inserted or updated or len(deleted_keys):
+                changed_tables.add(table_name)
+            
+            cursor.execute(
+                "INSERT INTO load_manifest_files (file_name, table_name, file_hash, row_count, loaded_at) "
+                "VALUES (%s, %s, %s, %s, now()) "
+                "ON CONFLICT (file_name) DO UPDATE SET table_name = EXCLUDED.table_name, "
+                "file_hash = EXCLUDED.file_hash, row_count = EXCLUDED.row_count, loaded_at = now()",
+                (csv_file, table_name, current_hash, len(seen_keys))
+            )
+            
+            elapsed = time.perf_counter() - started
+            print(f"    {total_rows} rows read: {inserted} inserted, {updated} updated, "
+                  f"{len(deleted_keys)} to delete, {skipped} skipped (missing/duplicate key) "
+                  f"in {elapsed:.2f}s\n")
+        
+        # Delete dependent rows before the rows they reference
+        for config, deleted_keys in reversed(pending_deletes):
+            table_name = config["table"]
+            key_columns = config["natural_key"]
+            delete_stage = f"stage_delete_{table_name}"
+            cursor.execute(f"CREATE TEMP TABLE {delete_stage} (LIKE {table_name}) ON COMMIT DROP")
+            key_frame = pd.DataFrame(
+                [key.split(ROW_KEY_SEPARATOR) for key in deleted_keys], columns=key_columns
+            )
+            copy_dataframe(cursor, key_frame, delete_stage)
+            match = " AND ".join(f"t.{c} = d.{c}" for c in key_columns)
+            cursor.execute(f"DELETE FROM {table_name} t USING {delete_stage} d WHERE {match}")
+            print(f"🗑️  Deleted {cursor.rowcount} rows from {table_name}")
+            cursor.execute(
+                "DELETE FROM load_manifest_rows WHERE table_name = %s AND row_key = ANY(%s)",
+                (table_name, deleted_keys)
+            )
+        
+        notify_tables_changed(cursor, sorted(changed_tables))
+        conn.commit()
+        analyze_tables(conn, sorted(changed_tables))
+        print(" Incremental load committed\n")
+        refresh_views(conn, sorted(changed_tables))
+    except Exception as e:
+        conn.rollback()
+        print(f"    Incremental load failed, nothing was changed: {str(e)}\n")
+        import traceback
+        traceback.print_exc()
+    finally:
+        cursor.close()
+        conn.close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload HR CSV files to PostgreSQL")
+    parser.add_argument(
+        "--copy",
+        action="store_true",
+        help="Stream each CSV in chunks through COPY FROM STDIN instead of batched INSERTs"
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=CHUNK_SIZE,
+        help=f"Rows per chunk in --copy/--incremental mode (default {CHUNK_SIZE})"
+    )
+    parser.add_argument(
+        "--parallel",
+        type=int,
+        metavar="WORKERS",
+        help="Load all tables concurrently with WORKERS processes (COPY, all-or-nothing commit)"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Upsert only rows that changed since the last incremental load and delete removed rows"
+    )
+    parser.add_argument(
+        "--data-dir",
+        help=f"Folder holding the CSV files (default {CSV_FOLDER})"
+    )
+    parser.add_argument(
+        "--xlsx",
+        metavar="WORKBOOK",
+        help="Read every dataset from the sheet of the same name in this workbook instead of the "
+             "CSV files (streamed; works with --copy, --parallel and --incremental, "
+             f"default --parallel {PARALLEL_WORKERS})"
+    )
+    parser.add_argument(
+        "--snapshot",
+        nargs="?",
+        const=snapshot.DEFAULT_SNAPSHOT_FILE,
+        metavar="PATH",
+        help=f"After the load, also write a SQLite snapshot for server.py --snapshot "
+             f"(default {snapshot.DEFAULT_SNAPSHOT_FILE})"
+    )
+    args = parser.parse_args()
+    if args.data_dir:
+        CSV_FOLDER = os.path.abspath(args.data_dir)
+    if args.xlsx:
+        if not os.path.exists(args.xlsx) or not is_workbook(args.xlsx):
+            parser.error(f"--xlsx needs an existing {'/'.join(WORKBOOK_EXTENSIONS)} workbook")
+        XLSX_FILE = os.path.abspath(args.xlsx)
+        if not (args.incremental or args.parallel or args.copy):
+            args.parallel = PARALLEL_WORKERS
+    
     print("=" * 60)
     print("Start uploading CSV data to PostgreSQL")
     print("=" * 60 + "\n")
     
-    upload_csv_to_postgres()
+    if args.incremental:
+        upload_csv_incremental(chunksize=args.chunksize)
+    elif args.parallel:
+        upload_csv_parallel(workers=args.parallel, chunksize=args.chunksize)
+    elif args.copy:
+        upload_csv_with_copy(chunksize=args.chunksize)
+    else:
+        upload_csv_to_postgres()
+    
+    if args.snapshot:
+        export_snapshot(args.snapshot)
     
     print("=" * 60)
     print(" All CSV files processed!")